@@ -0,0 +1,71 @@
+"""
+Folds a guest's cart and wishlist into the account they log in to.
+
+Each side is loaded with one query and matched in memory (cart lines by product and
+variation signature, wishlist items by product); the result is written back with a
+handful of bulk statements, so the cost does not grow with the size of the guest cart.
+"""
+from django.db import transaction
+
+from carts.models import CartItem
+from wishlist.models import WishlistItem
+
+
+@transaction.atomic
+def merge_guest_cart(session_key, user):
+    guest_items = list(
+        CartItem.objects.filter(cart__cart_id=session_key, user=None)
+        .only('id', 'product_id', 'variation_signature', 'quantity')
+    )
+    if not guest_items:
+        return
+    user_lines = {
+        (item.product_id, item.variation_signature): item
+        for item in CartItem.objects.filter(user=user, product_id__in={item.product_id for item in guest_items})
+        .only('id', 'product_id', 'variation_signature', 'quantity')
+    }
+
+    moved, merged, merged_away = [], {}, []
+    for item in guest_items:
+        line = user_lines.get((item.product_id, item.variation_signature))
+        if line is None:
+            # Later guest lines for the same product and variations (duplicate guest carts) fold into this one
+            user_lines[(item.product_id, item.variation_signature)] = item
+            moved.append(item)
+        else:
+            line.quantity += item.quantity
+            merged[line.id] = line
+            merged_away.append(item.id)
+
+    if merged_away:
+        CartItem.objects.filter(id__in=merged_away).delete()
+    if moved:
+        CartItem.objects.filter(id__in=[item.id for item in moved]).update(user=user, cart=None)
+    if merged:
+        CartItem.objects.bulk_update(merged.values(), ['quantity'])
+
+
+@transaction.atomic
+def merge_guest_wishlist(wishlist_id, user):
+    guest_items = list(
+        WishlistItem.objects.filter(wishlist__wishlist_id=wishlist_id, user=None).only('id', 'product_id')
+    )
+    if not guest_items:
+        return
+    wished = set(
+        WishlistItem.objects.filter(user=user, product_id__in={item.product_id for item in guest_items})
+        .values_list('product_id', flat=True)
+    )
+
+    moved, duplicates = [], []
+    for item in guest_items:
+        if item.product_id in wished:
+            duplicates.append(item.id)
+        else:
+            wished.add(item.product_id)
+            moved.append(item.id)
+
+    if duplicates:
+        WishlistItem.objects.filter(id__in=duplicates).delete()
+    if moved:
+        WishlistItem.objects.filter(id__in=moved).update(user=user, wishlist=None)
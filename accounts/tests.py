@@ -1,3 +1,99 @@
+from decimal import Decimal
+
 from django.test import TestCase
 
+from carts.models import Cart, CartItem
+from category.models import Category
+from store.models import Product
+from wishlist.models import Wishlist, WishlistItem
+from .merge import merge_guest_cart, merge_guest_wishlist
+from .models import Account
+
 # Create your tests here.
+
+SESSION_KEY = 'guest-session'
+
+
+class MergeTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = Account.objects.create_user(
+            email='shopper@example.com', username='shopper', first_name='Sam', last_name='Shopper', password='secret'
+        )
+        category = Category.objects.create(category_name='Shirts', slug='shirts')
+        cls.products = [
+            Product.objects.create(
+                product_name=f'Shirt {i}', slug=f'shirt-{i}', product_price=Decimal('100.00'), stock=50,
+                category=category, product_image='photos/products/test.jpg',
+            )
+            for i in range(10)
+        ]
+
+
+class MergeGuestCartTests(MergeTestCase):
+    def guest_line(self, product, quantity, signature='', cart=None):
+        cart = cart or Cart.objects.get_or_create(cart_id=SESSION_KEY)[0]
+        return CartItem.objects.create(cart=cart, product=product, quantity=quantity, variation_signature=signature)
+
+    def user_lines(self):
+        return {
+            (item.product_id, item.variation_signature): item.quantity
+            for item in CartItem.objects.filter(user=self.user)
+        }
+
+    def test_matching_lines_are_summed_and_the_rest_moved(self):
+        shirt, tee = self.products[:2]
+        CartItem.objects.create(user=self.user, product=shirt, quantity=1, variation_signature='xl')
+        self.guest_line(shirt, 2, 'xl')
+        self.guest_line(shirt, 1, 's')
+        self.guest_line(tee, 3)
+
+        merge_guest_cart(SESSION_KEY, self.user)
+
+        self.assertEqual(self.user_lines(), {(shirt.id, 'xl'): 3, (shirt.id, 's'): 1, (tee.id, ''): 3})
+        self.assertFalse(CartItem.objects.filter(user=None).exists())
+
+    def test_duplicate_guest_carts_fold_into_one_line(self):
+        shirt = self.products[0]
+        self.guest_line(shirt, 1, cart=Cart.objects.create(cart_id=SESSION_KEY))
+        self.guest_line(shirt, 2, cart=Cart.objects.create(cart_id=SESSION_KEY))
+
+        merge_guest_cart(SESSION_KEY, self.user)
+
+        self.assertEqual(self.user_lines(), {(shirt.id, ''): 3})
+        self.assertEqual(CartItem.objects.count(), 1)
+
+    def test_query_count_does_not_grow_with_the_guest_cart(self):
+        # Savepoint, two reads, the delete (with its collector read and variation rows), move, bulk update, release
+        for size in (2, 10):
+            with self.subTest(size=size):
+                CartItem.objects.all().delete()
+                for product in self.products[:size]:
+                    self.guest_line(product, 1)
+                    if product.id % 2:
+                        CartItem.objects.create(user=self.user, product=product, quantity=1)
+                with self.assertNumQueries(9):
+                    merge_guest_cart(SESSION_KEY, self.user)
+                self.assertEqual(sum(self.user_lines().values()), size + size // 2)
+
+    def test_an_empty_guest_cart_is_a_single_read(self):
+        with self.assertNumQueries(3):
+            merge_guest_cart(SESSION_KEY, self.user)
+
+
+class MergeGuestWishlistTests(MergeTestCase):
+    def test_wished_products_are_moved_once(self):
+        shirt, tee, cap = self.products[:3]
+        WishlistItem.objects.create(user=self.user, product=shirt)
+        wishlist = Wishlist.objects.create(wishlist_id=SESSION_KEY)
+        for product in (shirt, tee, cap):
+            WishlistItem.objects.create(wishlist=wishlist, product=product)
+
+        with self.assertNumQueries(6):
+            merge_guest_wishlist(SESSION_KEY, self.user)
+
+        self.assertEqual(
+            sorted(WishlistItem.objects.filter(user=self.user).values_list('product_id', flat=True)),
+            [shirt.id, tee.id, cap.id],
+        )
+        self.assertFalse(WishlistItem.objects.filter(user=None).exists())
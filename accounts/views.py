@@ -1,17 +1,16 @@
 from django.shortcuts import render, redirect
 from accounts.models import Account, UserProfile
-from carts.models import Cart, CartItem
-from carts.views import _cart_id
+from carts.backends import get_cart
+from carts.summary import invalidate_cart_summary
 from orders.models import Order
-from wishlist.models import Wishlist, WishlistItem
-from wishlist.views import _wishlist_id
+from outbox.mail import enqueue
+from .merge import merge_guest_wishlist
 from .forms import RegistrationForm, EditProfileForm, UserProfileForm
 from django.contrib import messages, auth
 from django.contrib.auth.decorators import login_required
 import requests
 from django.core.paginator import Paginator
 
-from django.core.mail import EmailMessage
 from django.template.loader import render_to_string
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes
@@ -52,10 +51,7 @@ def register(request):
                 'uid': urlsafe_base64_encode(force_bytes(user.pk)),
                 'token': default_token_generator.make_token(user),
             })
-            to_email = email
-            send_email = EmailMessage(mail_subject, message, to=[to_email])
-            send_email.content_subtype = "html"  # Main content is now text/html
-            send_email.send()
+            enqueue(mail_subject, message, [email], html=True)
 
             messages.success(request, "Thank you for registering. A confirmation email has been sent to your email address.")
             return redirect('/accounts/login/?command=verification&email=' + email)
@@ -80,58 +76,25 @@ def login(request):
         user = authenticate(email=email, password=password)
 
         if user is not None:
-            # Merge Guest Cart → User Cart
-            try:
-                session_cart = Cart.objects.filter(cart_id=_cart_id(request)).first()
-                if session_cart:
-                    session_cart_items = CartItem.objects.filter(cart=session_cart, user=None)
-                    for item in session_cart_items:
-                        matching_items = CartItem.objects.filter(user=user, product=item.product)
-
-                        same_variation_item = None
-                        item_variations_ids = sorted([v.id for v in item.variations.all()])
-
-                        for user_item in matching_items:
-                            user_item_variations_ids = sorted([v.id for v in user_item.variations.all()])
-                            if item_variations_ids == user_item_variations_ids:
-                                same_variation_item = user_item
-                                break
-
-                        if same_variation_item:
-                            same_variation_item.quantity += item.quantity
-                            same_variation_item.save()
-                            item.delete()
-                        else:
-                            item.user = user
-                            item.cart = None
-                            item.save()
-            except Cart.DoesNotExist:
-                pass
-
-            # Merge Guest Wishlist → User Wishlist
-            try:
-                guest_wishlist = Wishlist.objects.filter(wishlist_id=_wishlist_id(request)).first()
-                if guest_wishlist:
-                    guest_items = WishlistItem.objects.filter(wishlist=guest_wishlist, user=None)
-                    for item in guest_items:
-                        # Avoid duplicate products in wishlist
-                        if not WishlistItem.objects.filter(user=user, product=item.product).exists():
-                            item.user = user
-                            item.wishlist = None
-                            item.save()
-                        else:
-                            item.delete()
-            except Wishlist.DoesNotExist:
-                pass
+            # ✅ Merge the guest cart (cookie or rows) and wishlist into the account with a few bulk statements
+            guest_cart = get_cart(request)
+            guest_cart.merge_into(user)
+            session_key = request.session.session_key
+            if session_key:
+                merge_guest_wishlist(session_key, user)
+
+            # Both carts changed hands; their cached summaries are rebuilt on the next page
+            invalidate_cart_summary(session_key=request.session.session_key)
+            invalidate_cart_summary(user_id=user.pk)
 
             # Log the user in
             auth_login(request, user)
             messages.success(request, "Login successful.")
             next_url = request.GET.get('next')
             if next_url:
-                return redirect(next_url)
+                return guest_cart.save(redirect(next_url))
             else:
-                return redirect('dashboard')
+                return guest_cart.save(redirect('dashboard'))
         else:
             messages.error(request, "Invalid email or password.")
             return redirect('login')
@@ -178,9 +141,7 @@ def forgotPassword(request):
                 'uid': urlsafe_base64_encode(force_bytes(user.pk)),
                 'token': default_token_generator.make_token(user),
             })
-            to_email = email
-            send_email = EmailMessage(mail_subject, message, to=[to_email])
-            send_email.send()
+            enqueue(mail_subject, message, [email])
 
             messages.success(request, 'Link sent')
             return redirect('login')
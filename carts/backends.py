@@ -0,0 +1,337 @@
+"""
+Cart storage backends behind one interface, so the views never care where a cart lives.
+
+DatabaseCart keeps CartItem rows (always used for logged-in shoppers). CookieCart keeps an
+anonymous shopper's cart in a signed, compressed cookie, so guests can browse and fill a
+cart without a single database write; it is turned into CartItem rows at login. Which one
+guests get is chosen by settings.CART_BACKEND ('cookie' or 'db').
+
+Both backends offer:
+    add(product, variations)   -> error message or None
+    change(line_id, action)    -> (line or None, error or None); raises Http404 for unknown lines
+    quote()                    -> carts.pricing.CartQuote for the cart page
+    summary() / count()        -> totals for JSON responses / the navbar badge
+    contains(product)          -> bool
+    merge_into(user)           -> moves a guest cart to the account being logged in to
+    save(response)             -> persists pending changes on the response (cookie only)
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.core import signing
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.http import Http404
+
+from accounts.merge import merge_guest_cart
+from store.models import Product, Variation
+from store.variations import variation_signature
+from .models import Cart, CartItem
+from .pricing import CartQuote, quote_cart
+from .summary import get_cart_summary, set_cart_summary, update_cart_summary
+
+COOKIE_NAME = 'cart'
+COOKIE_SALT = 'carts.cookie'
+COOKIE_MAX_AGE = 60 * 60 * 24 * 30
+# Keeps the signed cookie well under the 4 KB browsers accept
+MAX_COOKIE_LINES = 40
+
+
+def _session_key(request, create=False):
+    """ The guest cart id (session key). Only writes create a session; reads get None without one. """
+    key = request.session.session_key
+    if not key and create:
+        request.session.create()
+        key = request.session.session_key
+    return key
+
+
+def _stock_error(product):
+    return f"Only {product.stock} units of {product.product_name} available."
+
+
+class DatabaseCart:
+    def __init__(self, request):
+        self.request = request
+
+    def _lines(self):
+        if self.request.user.is_authenticated:
+            return CartItem.objects.filter(user=self.request.user)
+        key = _session_key(self.request)
+        return CartItem.objects.filter(cart__cart_id=key, user=None) if key else CartItem.objects.none()
+
+    def add(self, product, variations):
+        # Lines are unique per (owner, product, variation signature), so adding is a single upsert
+        signature = variation_signature(v.id for v in variations)
+        if self.request.user.is_authenticated:
+            owner = {'user': self.request.user}
+        else:
+            cart, _ = Cart.objects.get_or_create(cart_id=_session_key(self.request, create=True))
+            owner = {'cart': cart, 'user': None}
+        line = CartItem.objects.filter(product=product, variation_signature=signature, **owner)
+
+        new_line = 0
+        if not line.update(quantity=F('quantity') + 1):
+            try:
+                with transaction.atomic():
+                    new_item = CartItem.objects.create(
+                        product=product, quantity=1, variation_signature=signature, **owner
+                    )
+                    if variations:
+                        new_item.variations.add(*variations)
+                new_line = 1
+            except IntegrityError:
+                # The same line was created by a concurrent request
+                line.update(quantity=F('quantity') + 1)
+        update_cart_summary(self.request, items=new_line, quantity=1, subtotal=product.product_price)
+
+    def change(self, line_id, action):
+        """
+        The line is read once for its price and stock; the change itself is a single UPDATE or
+        DELETE whose WHERE clause repeats the owner check (and `quantity < stock` for increments),
+        so concurrent clicks can never push a line past the stock.
+        """
+        if not str(line_id).isdigit():
+            raise Http404("Cart item not found")
+        lines = self._lines().filter(id=line_id)
+        line = lines.select_related('product').only(
+            'quantity', 'product__product_name', 'product__product_price', 'product__stock'
+        ).first()
+        if line is None:
+            raise Http404("Cart item not found")
+        price = line.product.product_price
+
+        if action == 'increment':
+            if not lines.filter(quantity__lt=F('product__stock')).update(quantity=F('quantity') + 1):
+                return line, _stock_error(line.product)
+            line.quantity += 1
+            update_cart_summary(self.request, quantity=1, subtotal=price)
+        elif action == 'decrement' and lines.filter(quantity__gt=1).update(quantity=F('quantity') - 1):
+            line.quantity -= 1
+            update_cart_summary(self.request, quantity=-1, subtotal=-price)
+        elif action in ('decrement', 'remove'):
+            lines.delete()
+            update_cart_summary(self.request, items=-1, quantity=-line.quantity, subtotal=-line.sub_total())
+            line = None
+        return line, None
+
+    def quote(self):
+        if not self.request.user.is_authenticated and not _session_key(self.request):
+            return CartQuote(lines=())
+        # ✅ Lines, totals and weight priced in one query; variations prefetched for display
+        quote = quote_cart(self._lines().filter(is_active=True).prefetch_related('variations__category'))
+        # The full cart was just loaded, so refresh the cached summary from it
+        set_cart_summary(self.request, len(quote.lines), quote.quantity, quote.subtotal)
+        return quote
+
+    def summary(self):
+        return get_cart_summary(self.request)
+
+    def count(self):
+        return get_cart_summary(self.request)['quantity']
+
+    def contains(self, product):
+        return self._lines().filter(product=product).exists()
+
+    def merge_into(self, user):
+        key = _session_key(self.request)
+        if key:
+            merge_guest_cart(key, user)
+
+    def save(self, response):
+        return response
+
+
+class _VariationList(tuple):
+    """ Lets templates call `line.variations.all` on cookie lines as they do on CartItems. """
+
+    def all(self):
+        return self
+
+
+class CookieCartLine:
+    """ A priced cookie cart line, shaped like an annotated CartItem for the templates. """
+
+    def __init__(self, product, variations, quantity):
+        self.product = product
+        self.variations = _VariationList(variations)
+        self.variation_signature = variation_signature(v.id for v in variations)
+        self.id = CookieCart.line_id(product.id, self.variation_signature)
+        self.quantity = quantity
+
+    @property
+    def line_total(self):
+        return self.product.product_price * self.quantity
+
+    @property
+    def line_weight(self):
+        return self.product.weight * self.quantity
+
+    def sub_total(self):
+        return self.line_total
+
+
+class CookieCart:
+    """
+    The cookie holds [[product_id, [variation ids], quantity], ...]; it is signed, so it
+    cannot be tampered with, and zlib-compressed by django.core.signing. Variation ids are
+    kept rather than just their signature because the variations must be restored when the
+    cart becomes CartItem rows.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.modified = False
+        try:
+            raw = signing.loads(request.COOKIES.get(COOKIE_NAME, ''), salt=COOKIE_SALT)
+            self.lines = [[int(pid), sorted(map(int, vids)), int(qty)] for pid, vids, qty in raw]
+        except (signing.BadSignature, TypeError, ValueError):
+            self.lines = []
+
+    @staticmethod
+    def line_id(product_id, signature):
+        return f'{product_id}-{signature}' if signature else str(product_id)
+
+    def _find(self, line_id):
+        for line in self.lines:
+            if self.line_id(line[0], variation_signature(line[1])) == line_id:
+                return line
+        raise Http404("Cart item not found")
+
+    def add(self, product, variations):
+        variation_ids = sorted(v.id for v in variations)
+        for line in self.lines:
+            if line[0] == product.id and line[1] == variation_ids:
+                line[2] += 1
+                break
+        else:
+            if len(self.lines) >= MAX_COOKIE_LINES:
+                return "Your cart is full. Please log in to add more items."
+            self.lines.append([product.id, variation_ids, 1])
+        self.modified = True
+
+    def change(self, line_id, action):
+        line = self._find(str(line_id))
+        product = Product.objects.only('product_name', 'product_price', 'weight', 'stock').get(id=line[0])
+        if action == 'increment' and line[2] >= product.stock:
+            return self._priced_line(product, line), _stock_error(product)
+        if action == 'increment':
+            line[2] += 1
+        elif action == 'decrement' and line[2] > 1:
+            line[2] -= 1
+        elif action in ('decrement', 'remove'):
+            self.lines.remove(line)
+            self.modified = True
+            return None, None
+        self.modified = True
+        return self._priced_line(product, line), None
+
+    @staticmethod
+    def _priced_line(product, line):
+        # Keeps the line's id (derived from its variations) the same as on the cart page
+        variations = Variation.objects.select_related('category').filter(id__in=line[1]).order_by('id')
+        return CookieCartLine(product, list(variations), line[2])
+
+    def quote(self):
+        """ Prices the cookie lines with one product query and one variation query. """
+        if not self.lines:
+            return CartQuote(lines=())
+        products = Product.objects.in_bulk({pid for pid, _, _ in self.lines})
+        variations = Variation.objects.select_related('category').in_bulk(
+            {vid for _, vids, _ in self.lines for vid in vids}
+        )
+        lines = tuple(
+            CookieCartLine(products[pid], [variations[vid] for vid in vids if vid in variations], qty)
+            for pid, vids, qty in self.lines
+            if pid in products
+        )
+        return CartQuote(
+            lines=lines,
+            quantity=sum(line.quantity for line in lines),
+            subtotal=sum((line.line_total for line in lines), Decimal('0.00')),
+            total_weight=sum((line.line_weight for line in lines), Decimal('0.00')),
+        )
+
+    def summary(self):
+        quote = self.quote()
+        return {'items': len(quote.lines), 'quantity': quote.quantity, 'subtotal': quote.subtotal}
+
+    def count(self):
+        # Read straight from the cookie: the navbar badge costs no query at all
+        return sum(qty for _, _, qty in self.lines)
+
+    def contains(self, product):
+        return any(pid == product.id for pid, _, _ in self.lines)
+
+    @transaction.atomic
+    def merge_into(self, user):
+        """ Turns the cookie lines into the user's CartItems: two reads and three bulk writes. """
+        if not self.lines:
+            return
+        products = set(Product.objects.filter(id__in={pid for pid, _, _ in self.lines}).values_list('id', flat=True))
+        valid_variations = set(
+            Variation.objects.filter(id__in={vid for _, vids, _ in self.lines for vid in vids})
+            .values_list('id', 'product_id')
+        )
+        user_lines = {
+            (item.product_id, item.variation_signature): item
+            for item in CartItem.objects.filter(user=user, product_id__in=products)
+            .only('id', 'product_id', 'variation_signature', 'quantity')
+        }
+
+        new_items, new_variations, merged = [], [], {}
+        for pid, vids, qty in self.lines:
+            if pid not in products:
+                continue
+            vids = [vid for vid in vids if (vid, pid) in valid_variations]
+            signature = variation_signature(vids)
+            item = user_lines.get((pid, signature))
+            if item is None:
+                item = CartItem(user=user, product_id=pid, quantity=qty, variation_signature=signature)
+                user_lines[(pid, signature)] = item
+                new_items.append(item)
+                new_variations.append(vids)
+            elif item.pk is None:
+                item.quantity += qty
+            else:
+                item.quantity += qty
+                merged[item.pk] = item
+
+        if merged:
+            CartItem.objects.bulk_update(merged.values(), ['quantity'])
+        if new_items:
+            CartItem.objects.bulk_create(new_items)
+            Through = CartItem.variations.through
+            Through.objects.bulk_create([
+                Through(cartitem_id=item.pk, variation_id=vid)
+                for item, vids in zip(new_items, new_variations)
+                for vid in vids
+            ])
+        self.lines = []
+        self.modified = True
+
+    def save(self, response):
+        if not self.modified:
+            return response
+        if self.lines:
+            response.set_cookie(
+                COOKIE_NAME,
+                signing.dumps(self.lines, salt=COOKIE_SALT, compress=True),
+                max_age=COOKIE_MAX_AGE,
+                secure=settings.SESSION_COOKIE_SECURE,
+                httponly=True,
+                samesite='Lax',
+            )
+        else:
+            response.delete_cookie(COOKIE_NAME, samesite='Lax')
+        return response
+
+
+def get_cart(request):
+    """ The cart of the current shopper; cached on the request so views and context processors share it. """
+    if not hasattr(request, '_cart'):
+        if request.user.is_authenticated or settings.CART_BACKEND == 'db':
+            request._cart = DatabaseCart(request)
+        else:
+            request._cart = CookieCart(request)
+    return request._cart
@@ -1,20 +0,0 @@
-from .models import Cart, CartItem
-from .views import _cart_id
-
-def counter(request):
-    cart_count = 0
-    if 'admin' in request.path:
-        return {}
-    
-    try:
-        if request.user.is_authenticated:
-            cart_items = CartItem.objects.filter(user=request.user)
-        else:
-            cart = Cart.objects.filter(cart_id=_cart_id(request)).first()
-            cart_items = CartItem.objects.filter(cart=cart) if cart else []
-        
-        cart_count = sum(item.quantity for item in cart_items)
-    except:
-        cart_count = 0
-    
-    return dict(cart_count=cart_count)
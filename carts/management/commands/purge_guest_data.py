@@ -0,0 +1,91 @@
+import time
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from carts.models import Cart, CartItem
+from wishlist.models import Wishlist, WishlistItem
+
+BATCH_SIZE = 1000
+
+
+class Command(BaseCommand):
+    help = (
+        'Deletes guest carts and wishlists (with their items) whose session has expired, '
+        'then the expired sessions, in small batches that are safe to run alongside live traffic.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Rows deleted per transaction.')
+        parser.add_argument('--pause', type=float, default=0, help='Seconds to sleep between batches.')
+
+    def handle(self, *args, **options):
+        if settings.SESSION_ENGINE not in ('django.contrib.sessions.backends.db', 'django.contrib.sessions.backends.cached_db'):
+            raise CommandError('Guest carts can only be matched to sessions stored in the database.')
+        self.batch_size, self.pause = options['batch_size'], options['pause']
+
+        self.purge('guest carts', Cart, 'cart_id', self.delete_carts)
+        self.purge('guest wishlists', Wishlist, 'wishlist_id', self.delete_wishlists)
+        self.purge_sessions()
+
+    def purge(self, label, model, session_field, delete_batch):
+        # Guest containers are keyed by session key; a container is dead once no live session has its key.
+        # The session is always created before its container, so a fresh guest is never matched here.
+        live_session = Session.objects.filter(session_key=OuterRef(session_field), expire_date__gt=timezone.now())
+        orphans = model.objects.filter(~Exists(live_session)).order_by('id').values_list('id', flat=True)
+        # Each batch resumes after the last id seen instead of rescanning the live containers before it
+        last_id = 0
+
+        def next_batch():
+            nonlocal last_id
+            ids = list(orphans.filter(id__gt=last_id)[:self.batch_size])
+            if ids:
+                last_id = ids[-1]
+            return delete_batch(ids)
+
+        self.run_batches(label, next_batch)
+
+    def delete_carts(self, cart_ids):
+        if cart_ids:
+            with transaction.atomic():
+                # Lines that already belong to an account must survive their old guest cart
+                CartItem.objects.filter(cart_id__in=cart_ids, user__isnull=False).update(cart=None)
+                CartItem.objects.filter(cart_id__in=cart_ids).delete()
+                Cart.objects.filter(id__in=cart_ids).delete()
+        return len(cart_ids)
+
+    def delete_wishlists(self, wishlist_ids):
+        if wishlist_ids:
+            with transaction.atomic():
+                WishlistItem.objects.filter(wishlist_id__in=wishlist_ids, user__isnull=False).update(wishlist=None)
+                WishlistItem.objects.filter(wishlist_id__in=wishlist_ids).delete()
+                Wishlist.objects.filter(id__in=wishlist_ids).delete()
+        return len(wishlist_ids)
+
+    def purge_sessions(self):
+        expired = Session.objects.filter(expire_date__lte=timezone.now()).values_list('session_key', flat=True)
+
+        def delete_batch():
+            keys = list(expired[:self.batch_size])
+            return Session.objects.filter(session_key__in=keys).delete()[0] if keys else 0
+
+        self.run_batches('expired sessions', delete_batch)
+
+    def run_batches(self, label, delete_batch):
+        started, total = time.monotonic(), 0
+        while True:
+            deleted = delete_batch()
+            if not deleted:
+                break
+            total += deleted
+            elapsed = time.monotonic() - started
+            self.stdout.write(f'{label}: {total} deleted ({total / elapsed if elapsed else total:.0f}/s)')
+            if deleted < self.batch_size:
+                break
+            if self.pause:
+                time.sleep(self.pause)
+        self.stdout.write(self.style.SUCCESS(f'{total} {label} purged in {time.monotonic() - started:.1f}s.'))
@@ -0,0 +1,54 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:15
+
+import hashlib
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def _signature(variation_ids):
+    ids = sorted(set(variation_ids))
+    return hashlib.sha1(','.join(map(str, ids)).encode()).hexdigest() if ids else ''
+
+
+def sign_and_merge_cart_items(apps, schema_editor):
+    """ Fills the signatures and merges lines that the new unique constraints would reject. """
+    CartItem = apps.get_model('carts', 'CartItem')
+    lines = {}
+    for item in CartItem.objects.prefetch_related('variations').order_by('id'):
+        item.variation_signature = _signature(v.id for v in item.variations.all())
+        owner = ('user', item.user_id) if item.user_id else ('cart', item.cart_id)
+        key = (owner, item.product_id, item.variation_signature)
+        if key in lines:
+            lines[key].quantity += item.quantity
+            lines[key].save(update_fields=['quantity'])
+            item.delete()
+        else:
+            item.save(update_fields=['variation_signature'])
+            lines[key] = item
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('carts', '0001_initial'),
+        ('store', '0009_variationmatrix'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cartitem',
+            name='variation_signature',
+            field=models.CharField(blank=True, default='', max_length=40),
+        ),
+        migrations.RunPython(sign_and_merge_cart_items, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(condition=models.Q(('user__isnull', False)), fields=('user', 'product', 'variation_signature'), name='unique_user_cart_line'),
+        ),
+        migrations.AddConstraint(
+            model_name='cartitem',
+            constraint=models.UniqueConstraint(condition=models.Q(('user__isnull', True)), fields=('cart', 'product', 'variation_signature'), name='unique_guest_cart_line'),
+        ),
+    ]
@@ -6,7 +6,7 @@ from store.models import Product, Variation
 # Create your models here.
 
 class Cart(models.Model):
-    cart_id = models.CharField(max_length=250, blank=True)
+    cart_id = models.CharField(max_length=250, blank=True, db_index=True)
     date_added = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -18,8 +18,24 @@ class CartItem(models.Model):
     variations = models.ManyToManyField(Variation, blank=True)
     cart = models.ForeignKey(Cart, on_delete=models.CASCADE, null=True)
     quantity = models.IntegerField()
+    # store.variations.variation_signature() of the selected variations, see the constraints below
+    variation_signature = models.CharField(max_length=40, blank=True, default='')
     is_active = models.BooleanField(default=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'product', 'variation_signature'],
+                condition=models.Q(user__isnull=False),
+                name='unique_user_cart_line',
+            ),
+            models.UniqueConstraint(
+                fields=['cart', 'product', 'variation_signature'],
+                condition=models.Q(user__isnull=True),
+                name='unique_guest_cart_line',
+            ),
+        ]
+
     def sub_total(self):
         return self.product.product_price * self.quantity
 
@@ -0,0 +1,68 @@
+"""
+Cart pricing shared by the cart page, checkout, place_order and order creation.
+
+quote_cart() prices a cart with one query: every line is annotated with its total and
+weight, and window aggregates (SUM(...) OVER ()) add the cart-wide quantity, subtotal and
+weight to each row. The result is an immutable CartQuote; shipping is added with
+with_shipping() once the delivery state is known.
+"""
+from dataclasses import dataclass, replace
+from decimal import Decimal
+
+from django.db.models import DecimalField, ExpressionWrapper, F, IntegerField, Sum, Window
+
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+WEIGHT = DecimalField(max_digits=10, decimal_places=2)
+
+# Shipping per kilogram: within Tamil Nadu, and everywhere else.
+HOME_STATE = 'tamil nadu'
+HOME_STATE_SHIPPING_RATE = Decimal('60.00')
+SHIPPING_RATE = Decimal('100.00')
+
+
+def shipping_charge(total_weight, state):
+    rate = HOME_STATE_SHIPPING_RATE if state.strip().lower() == HOME_STATE else SHIPPING_RATE
+    return (total_weight * rate).quantize(Decimal('0.01'))
+
+
+@dataclass(frozen=True)
+class CartQuote:
+    lines: tuple
+    quantity: int = 0
+    subtotal: Decimal = Decimal('0.00')
+    total_weight: Decimal = Decimal('0.00')
+    shipping_charge: Decimal = Decimal('0.00')
+
+    @property
+    def grand_total(self):
+        return self.subtotal + self.shipping_charge
+
+    def with_shipping(self, state):
+        return replace(self, shipping_charge=shipping_charge(self.total_weight, state))
+
+
+def quote_cart(cart_items):
+    """
+    Prices the given CartItem queryset. Each line comes back with its product loaded and
+    `line_total` / `line_weight` annotated; prefetches on the queryset are kept.
+    """
+    line_total = ExpressionWrapper(F('quantity') * F('product__product_price'), output_field=MONEY)
+    line_weight = ExpressionWrapper(F('quantity') * F('product__weight'), output_field=WEIGHT)
+    lines = tuple(
+        cart_items.select_related('product').annotate(
+            line_total=line_total,
+            line_weight=line_weight,
+            cart_quantity=Window(Sum('quantity'), output_field=IntegerField()),
+            cart_subtotal=Window(Sum(line_total, output_field=MONEY)),
+            cart_weight=Window(Sum(line_weight, output_field=WEIGHT)),
+        ).order_by('id')
+    )
+    if not lines:
+        return CartQuote(lines=())
+    totals = lines[0]
+    return CartQuote(
+        lines=lines,
+        quantity=totals.cart_quantity,
+        subtotal=totals.cart_subtotal,
+        total_weight=totals.cart_weight,
+    )
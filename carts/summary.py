@@ -0,0 +1,87 @@
+"""
+Cached cart summary (line count, total quantity, subtotal) for the navbar badge.
+
+One entry per owner — the user id when logged in, the session key otherwise. Every cart
+mutation adjusts the cached entry in place; when it is missing it is rebuilt with a single
+aggregate query, so rendering a page never loads cart rows.
+"""
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from .models import CartItem
+
+# Long enough to outlive a shopping session; a lost entry is simply rebuilt.
+SUMMARY_TIMEOUT = 60 * 60 * 24
+EMPTY_SUMMARY = {'items': 0, 'quantity': 0, 'subtotal': Decimal('0')}
+
+
+def summary_key(user_id=None, session_key=None):
+    if user_id is not None:
+        return f'cart-summary:user:{user_id}'
+    return f'cart-summary:session:{session_key}'
+
+
+def _owner(request):
+    """ Returns (cache key, CartItem filter) for the request's cart, or None for a guest without a session. """
+    if request.user.is_authenticated:
+        return summary_key(user_id=request.user.pk), {'user': request.user}
+    session_key = request.session.session_key
+    if not session_key:
+        return None
+    return summary_key(session_key=session_key), {'cart__cart_id': session_key, 'user': None}
+
+
+def get_cart_summary(request):
+    owner = _owner(request)
+    if owner is None:
+        return dict(EMPTY_SUMMARY)
+    key, lookup = owner
+    summary = cache.get(key)
+    if summary is None:
+        totals = CartItem.objects.filter(is_active=True, **lookup).aggregate(
+            total_items=Count('id'),
+            total_quantity=Sum('quantity'),
+            total_subtotal=Sum(F('quantity') * F('product__product_price')),
+        )
+        summary = {name: totals[f'total_{name}'] or EMPTY_SUMMARY[name] for name in EMPTY_SUMMARY}
+        cache.set(key, summary, SUMMARY_TIMEOUT)
+    return summary
+
+
+def set_cart_summary(request, items, quantity, subtotal):
+    """ Stores totals that a view has already computed from the full cart. """
+    owner = _owner(request)
+    if owner is not None:
+        cache.set(owner[0], {'items': items, 'quantity': quantity, 'subtotal': subtotal}, SUMMARY_TIMEOUT)
+
+
+def update_cart_summary(request, items=0, quantity=0, subtotal=0):
+    """ Applies a mutation's delta to the cached summary; a missing entry is left to be rebuilt. """
+    owner = _owner(request)
+    if owner is None:
+        return
+    summary = cache.get(owner[0])
+    if summary is None:
+        return
+    summary = {
+        'items': summary['items'] + items,
+        'quantity': summary['quantity'] + quantity,
+        'subtotal': summary['subtotal'] + subtotal,
+    }
+    if summary['items'] < 0 or summary['quantity'] < 0:
+        # Drifted (e.g. a concurrent request on another worker); start over from the database
+        cache.delete(owner[0])
+    else:
+        cache.set(owner[0], summary, SUMMARY_TIMEOUT)
+
+
+def invalidate_cart_summary(user_id=None, session_key=None):
+    """
+    Drops the summary once the current transaction commits; deleting it earlier would let a
+    concurrent request cache the pre-commit cart again.
+    """
+    key = summary_key(user_id=user_id, session_key=session_key)
+    transaction.on_commit(lambda: cache.delete(key))
@@ -1,3 +1,325 @@
-from django.test import TestCase
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.sessions.backends.db import SessionStore
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from accounts.models import Account
+from category.models import Category
+from store.models import Product, Variation, VariationCategory
+from store.variations import resolve_posted_variations, variation_signature
+from wishlist.models import Wishlist, WishlistItem
+from .backends import COOKIE_NAME, CookieCart
+from .models import Cart, CartItem
+from .pricing import CartQuote, quote_cart, shipping_charge
+from .summary import get_cart_summary, invalidate_cart_summary, summary_key, update_cart_summary
 
 # Create your tests here.
+
+def make_product(category, name, price='100.00', stock=5):
+    return Product.objects.create(
+        product_name=name, slug=name.lower().replace(' ', '-'), product_price=Decimal(price), stock=stock,
+        category=category, product_image='photos/products/test.jpg',
+    )
+
+
+class CartTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = Account.objects.create_user(
+            email='shopper@example.com', username='shopper', first_name='Sam', last_name='Shopper', password='secret'
+        )
+        cls.user.is_active = True
+        cls.user.save()
+        cls.category = Category.objects.create(category_name='Shirts', slug='shirts')
+        cls.shirt = make_product(cls.category, 'Linen Shirt', price='100.00')
+        cls.tee = make_product(cls.category, 'Cotton Tee', price='50.00')
+
+    def setUp(self):
+        cache.clear()
+
+    def user_request(self):
+        request = RequestFactory().get('/')
+        request.user = self.user
+        request.session = SessionStore()
+        return request
+
+
+class CartSummaryTests(CartTestCase):
+    def test_summary_is_aggregated_once_then_cached(self):
+        CartItem.objects.create(user=self.user, product=self.shirt, quantity=2)
+        CartItem.objects.create(user=self.user, product=self.tee, quantity=1)
+        request = self.user_request()
+        expected = {'items': 2, 'quantity': 3, 'subtotal': Decimal('250.00')}
+        self.assertEqual(get_cart_summary(request), expected)
+        CartItem.objects.filter(user=self.user).delete()
+        self.assertEqual(get_cart_summary(request), expected)
+
+    def test_deltas_update_the_cached_summary(self):
+        request = self.user_request()
+        CartItem.objects.create(user=self.user, product=self.shirt, quantity=1)
+        get_cart_summary(request)
+        update_cart_summary(request, items=1, quantity=1, subtotal=self.tee.product_price)
+        self.assertEqual(get_cart_summary(request), {'items': 2, 'quantity': 2, 'subtotal': Decimal('150.00')})
+
+    def test_a_drifted_summary_is_rebuilt(self):
+        request = self.user_request()
+        get_cart_summary(request)
+        update_cart_summary(request, items=-1, quantity=-1, subtotal=-self.shirt.product_price)
+        self.assertIsNone(cache.get(summary_key(user_id=self.user.pk)))
+
+    def test_invalidation_waits_for_the_commit(self):
+        request = self.user_request()
+        get_cart_summary(request)
+        with self.captureOnCommitCallbacks() as callbacks:
+            invalidate_cart_summary(user_id=self.user.pk)
+        self.assertIsNotNone(cache.get(summary_key(user_id=self.user.pk)))
+        for callback in callbacks:
+            callback()
+        self.assertIsNone(cache.get(summary_key(user_id=self.user.pk)))
+
+
+class VariationSignatureTests(CartTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        size, colour = VariationCategory.objects.create(name='Size'), VariationCategory.objects.create(name='Colour')
+        cls.small = Variation.objects.create(product=cls.shirt, category=size, value='S')
+        cls.large = Variation.objects.create(product=cls.shirt, category=size, value='L')
+        cls.blue = Variation.objects.create(product=cls.shirt, category=colour, value='Blue')
+
+    def add(self, *variations):
+        data = {f'variation_{v.category.name.lower()}': v.value for v in variations}
+        return self.client.post(f'/cart/add_cart/{self.shirt.id}/', data)
+
+    def test_signature_ignores_order_and_duplicates(self):
+        self.assertEqual(variation_signature([3, 1, 3]), variation_signature(['1', 3]))
+        self.assertNotEqual(variation_signature([1, 3]), variation_signature([1]))
+        self.assertEqual(variation_signature([]), '')
+
+    def test_posted_variations_are_resolved_in_one_query(self):
+        with self.assertNumQueries(1):
+            variations = resolve_posted_variations(
+                self.shirt, {'variation_size': 'l', 'variation_COLOUR': 'BLUE', 'variation_fit': 'Slim', 'quantity': '1'}
+            )
+        self.assertEqual(variations, [self.large, self.blue])
+
+    def test_same_variations_add_to_one_line(self):
+        self.client.force_login(self.user)
+        self.add(self.small, self.blue)
+        self.add(self.blue, self.small)
+        self.add(self.large)
+
+        lines = CartItem.objects.filter(user=self.user).order_by('id')
+        self.assertEqual([line.quantity for line in lines], [2, 1])
+        self.assertEqual(lines[0].variation_signature, variation_signature([self.small.id, self.blue.id]))
+        self.assertEqual(set(lines[0].variations.all()), {self.small, self.blue})
+
+    @override_settings(CART_BACKEND='db')
+    def test_adding_costs_the_same_however_big_the_cart(self):
+        for login in (True, False):
+            with self.subTest(login=login):
+                self.client.logout()
+                if login:
+                    self.client.force_login(self.user)
+                self.add(self.small)
+                with CaptureQueriesContext(connection) as small_cart:
+                    self.add(self.small)
+                self.add(self.large)
+                self.add(self.blue)
+                self.client.post(f'/cart/add_cart/{self.tee.id}/')
+                with CaptureQueriesContext(connection) as big_cart:
+                    self.add(self.small)
+                self.assertEqual(len(big_cart), len(small_cart))
+                self.assertEqual(
+                    CartItem.objects.get(
+                        product=self.shirt, variation_signature=variation_signature([self.small.id]), user=self.user if login else None
+                    ).quantity,
+                    3,
+                )
+
+
+class UpdateCartItemTests(CartTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.user)
+        self.line = CartItem.objects.create(user=self.user, product=self.shirt, quantity=4)
+        CartItem.objects.create(user=self.user, product=self.tee, quantity=1)
+
+    def update(self, action, line=None):
+        return self.client.post(f'/cart/update_cart_item/{(line or self.line).id}/{action}/')
+
+    def test_increment_returns_the_line_and_totals(self):
+        response = self.update('increment')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['status'], 'success')
+        self.assertEqual(data['item'], {'id': str(self.line.id), 'quantity': 5, 'sub_total': '500.00'})
+        self.assertEqual((data['cart']['items'], data['cart']['quantity']), (2, 6))
+        self.assertEqual(Decimal(data['cart']['subtotal']), Decimal('550.00'))
+
+    def test_increment_past_the_stock_is_refused(self):
+        self.update('increment')
+        response = self.update('increment')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['error'], 'Only 5 units of Linen Shirt available.')
+        self.assertEqual(CartItem.objects.get(pk=self.line.pk).quantity, 5)
+
+    def test_removing_a_line_drops_it_from_the_totals(self):
+        response = self.update('remove')
+        cart = response.json()['cart']
+        self.assertIsNone(response.json()['item'])
+        self.assertEqual((cart['items'], cart['quantity'], Decimal(cart['subtotal'])), (1, 1, Decimal('50.00')))
+        self.assertFalse(CartItem.objects.filter(pk=self.line.pk).exists())
+
+    def test_only_posts_of_known_actions_on_own_lines_are_accepted(self):
+        self.assertEqual(self.client.get(f'/cart/update_cart_item/{self.line.id}/increment/').status_code, 405)
+        self.assertEqual(self.update('double').status_code, 404)
+        stranger = Account.objects.create_user(
+            email='other@example.com', username='other', first_name='O', last_name='Ther', password='secret'
+        )
+        self.assertEqual(self.update('remove', CartItem.objects.create(user=stranger, product=self.shirt, quantity=1)).status_code, 404)
+        self.assertEqual(CartItem.objects.count(), 3)
+
+
+class PurgeGuestDataTests(CartTestCase):
+    def guest(self, key, expires_in):
+        Session.objects.create(session_key=key, session_data='', expire_date=timezone.now() + expires_in)
+        cart = Cart.objects.create(cart_id=key)
+        CartItem.objects.create(cart=cart, product=self.shirt, quantity=1)
+        WishlistItem.objects.create(wishlist=Wishlist.objects.create(wishlist_id=key), product=self.shirt)
+        return cart
+
+    def purge(self, **options):
+        with CaptureQueriesContext(connection) as queries:
+            call_command('purge_guest_data', stdout=StringIO(), **options)
+        return [query['sql'] for query in queries]
+
+    def test_only_containers_of_expired_or_missing_sessions_are_purged(self):
+        for i in range(3):
+            self.guest(f'live-{i}', timedelta(days=1))
+            self.guest(f'expired-{i}', -timedelta(days=1))
+        Cart.objects.create(cart_id='no-session')
+        # Already moved to an account at login; must outlive its guest cart
+        merged = CartItem.objects.create(cart=Cart.objects.get(cart_id='expired-0'), user=self.user, product=self.tee, quantity=1)
+
+        self.purge(batch_size=2)
+
+        live = ['live-0', 'live-1', 'live-2']
+        self.assertEqual(sorted(Cart.objects.values_list('cart_id', flat=True)), live)
+        self.assertEqual(sorted(Wishlist.objects.values_list('wishlist_id', flat=True)), live)
+        self.assertEqual(sorted(Session.objects.values_list('session_key', flat=True)), live)
+        self.assertEqual(CartItem.objects.filter(cart__isnull=False).count(), 3)
+        merged.refresh_from_db()
+        self.assertIsNone(merged.cart_id)
+
+    def test_batches_resume_after_the_last_purged_id(self):
+        ids = [self.guest(f'expired-{i}', -timedelta(days=1)).id for i in range(3)]
+        scans = [sql for sql in self.purge(batch_size=1) if 'FROM "carts_cart"' in sql and 'NOT EXISTS' in sql]
+        self.assertEqual(len(scans), 4)
+        self.assertIn('"carts_cart"."id" > 0', scans[0])
+        for scan, last_id in zip(scans[1:], ids):
+            self.assertIn(f'"carts_cart"."id" > {last_id}', scan)
+        self.assertFalse(Cart.objects.exists())
+
+
+class QuoteCartTests(CartTestCase):
+    def setUp(self):
+        super().setUp()
+        CartItem.objects.create(user=self.user, product=self.shirt, quantity=2)
+        CartItem.objects.create(user=self.user, product=self.tee, quantity=3)
+        Product.objects.filter(pk=self.tee.pk).update(weight=Decimal('0.25'))
+
+    def test_lines_and_totals_come_from_one_query(self):
+        with self.assertNumQueries(1):
+            quote = quote_cart(CartItem.objects.filter(user=self.user))
+            lines = [(line.product.product_name, line.line_total, line.line_weight) for line in quote.lines]
+        self.assertEqual(lines, [
+            ('Linen Shirt', Decimal('200.00'), Decimal('1.00')), ('Cotton Tee', Decimal('150.00'), Decimal('0.75')),
+        ])
+        self.assertEqual(
+            (quote.quantity, quote.subtotal, quote.total_weight), (5, Decimal('350.00'), Decimal('1.75'))
+        )
+
+    def test_shipping_depends_on_weight_and_state(self):
+        quote = quote_cart(CartItem.objects.filter(user=self.user))
+        home = quote.with_shipping(' Tamil Nadu ')
+        self.assertEqual(home.shipping_charge, Decimal('105.00'))
+        self.assertEqual(home.grand_total, Decimal('455.00'))
+        self.assertEqual(quote.with_shipping('Kerala').shipping_charge, Decimal('175.00'))
+        # Quotes are immutable; with_shipping returns a copy
+        self.assertEqual(quote.shipping_charge, Decimal('0.00'))
+        self.assertEqual(shipping_charge(Decimal('0.333'), 'Kerala'), Decimal('33.30'))
+
+    def test_an_empty_cart_is_an_empty_quote(self):
+        self.assertEqual(quote_cart(CartItem.objects.none()), CartQuote(lines=()))
+
+    def test_checkout_reads_the_cart_once(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/cart/checkout/')
+        self.assertEqual(response.context['total'], Decimal('350.00'))
+        self.assertEqual(len([query for query in queries if 'FROM "carts_cartitem"' in query['sql']]), 1)
+
+
+@override_settings(CART_BACKEND='cookie')
+class CookieCartTests(CartTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.large = Variation.objects.create(product=cls.shirt, category=VariationCategory.objects.create(name='Size'), value='L')
+
+    def add_large_shirt(self):
+        return self.client.post(f'/cart/add_cart/{self.shirt.id}/', {'variation_size': 'L'})
+
+    def test_guest_carts_write_nothing_to_the_database(self):
+        self.add_large_shirt()
+        self.add_large_shirt()
+        self.client.post(f'/cart/add_cart/{self.tee.id}/')
+
+        self.assertIn(COOKIE_NAME, self.client.cookies)
+        self.assertFalse(Session.objects.exists())
+        self.assertFalse(CartItem.objects.exists())
+        lines = self.client.get('/cart/').context['cart_items']
+        self.assertEqual([(line.product, list(line.variations.all()), line.quantity) for line in lines], [
+            (self.shirt, [self.large], 2), (self.tee, [], 1),
+        ])
+
+    def test_changing_a_line_keeps_its_id_and_variations(self):
+        self.add_large_shirt()
+        line_id = self.client.get('/cart/').context['cart_items'][0].id
+
+        response = self.client.post(f'/cart/update_cart_item/{line_id}/increment/')
+        self.assertEqual(response.json()['item']['quantity'], 2)
+        cart = CookieCart(RequestFactory().get('/', HTTP_COOKIE=f'{COOKIE_NAME}={self.client.cookies[COOKIE_NAME].value}'))
+        line, error = cart.change(line_id, 'decrement')
+        self.assertIsNone(error)
+        self.assertEqual((line.id, list(line.variations.all()), line.quantity), (line_id, [self.large], 1))
+
+    def test_a_tampered_cookie_is_an_empty_cart(self):
+        self.add_large_shirt()
+        self.client.cookies[COOKIE_NAME] = self.client.cookies[COOKIE_NAME].value + 'x'
+        self.assertEqual(list(self.client.get('/cart/').context['cart_items']), [])
+
+    def test_logging_in_moves_the_cookie_cart_to_the_account(self):
+        CartItem.objects.create(
+            user=self.user, product=self.shirt, quantity=1, variation_signature=variation_signature([self.large.id])
+        ).variations.add(self.large)
+        self.add_large_shirt()
+        self.client.post(f'/cart/add_cart/{self.tee.id}/')
+
+        self.client.post('/accounts/login/', {'email': self.user.email, 'password': 'secret'})
+
+        self.assertEqual(self.client.cookies[COOKIE_NAME].value, '')
+        self.assertEqual(
+            sorted(CartItem.objects.filter(user=self.user).values_list('product__product_name', 'quantity')),
+            [('Cotton Tee', 1), ('Linen Shirt', 2)],
+        )
+
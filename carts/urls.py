@@ -5,8 +5,9 @@ from . import views
 urlpatterns = [
     path('', views.cart, name='cart'),
     path('add_cart/<int:product_id>/', views.add_cart, name='add_cart'), #Adds item to cart
-    path('increment_cart_item/<int:cart_item_id>/', views.increment_cart_item, name='increment_cart_item'), #Increments quantity
-    path('remove_cart/<int:cart_item_id>/', views.remove_cart, name='remove_cart'), #Decrements quantity 
-    path('remove_cart_item/<int:cart_item_id>/', views.remove_cart_item, name='remove_cart_item'), #Removes item completely
+    path('increment_cart_item/<str:cart_item_id>/', views.increment_cart_item, name='increment_cart_item'), #Increments quantity
+    path('remove_cart/<str:cart_item_id>/', views.remove_cart, name='remove_cart'), #Decrements quantity 
+    path('remove_cart_item/<str:cart_item_id>/', views.remove_cart_item, name='remove_cart_item'), #Removes item completely
+    path('update_cart_item/<str:cart_item_id>/<str:action>/', views.update_cart_item, name='update_cart_item'), #JSON quantity update
     path('checkout/', views.checkout, name='checkout'),
 ]
\ No newline at end of file
@@ -4,9 +4,10 @@ from .models import Category
 # Register your models here.
 
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ('category_name', 'slug', 'description', 'category_image')
+    list_display = ('category_name', 'slug', 'parent', 'depth', 'description', 'category_image')
     prepopulated_fields = {'slug': ('category_name',)}
     search_fields = ('category_name', 'slug')
-    list_filter = ('category_name',)
+    list_filter = ('depth', 'parent')
+    ordering = ('path',)
 
 admin.site.register(Category, CategoryAdmin)
\ No newline at end of file
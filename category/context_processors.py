@@ -1,6 +0,0 @@
-from .models import Category
-
-def menu_links(request):
-    
-    links = Category.objects.all()
-    return {'links': links}
\ No newline at end of file
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from category.menu import bump_menu_version
+from category.models import rebuild_paths
+from store.listing_cache import bump_catalog_version
+
+
+class Command(BaseCommand):
+    help = 'Recomputes the materialized path and depth of every category from the parent links.'
+
+    def handle(self, *args, **options):
+        count = rebuild_paths()
+        # bulk_update sends no signals, so invalidate the menu and listings here
+        bump_menu_version()
+        bump_catalog_version()
+        self.stdout.write(self.style.SUCCESS(f'{count} category paths rebuilt.'))
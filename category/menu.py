@@ -0,0 +1,80 @@
+"""
+Category navigation menu, cached inside each worker process.
+
+The menu (the category tree flattened depth-first, with precomputed URLs and per-subtree
+available-product counts) is rebuilt with one query only when the shared menu version
+changes; category.signals bumps that version after any Category or Product change is
+committed. In the steady state a page costs one cache read for the version and no
+database query at all. Templates indent each entry by `depth` rem.
+"""
+import threading
+from dataclasses import dataclass
+
+from django.db.models import Count, Q
+
+from smkpro.cache import bump_version, get_version
+from .models import Category
+
+MENU_VERSION_KEY = 'category:menu-version'
+
+
+@dataclass(frozen=True)
+class MenuEntry:
+    category_name: str
+    slug: str
+    url: str
+    # Available products in this category and all its subcategories
+    product_count: int
+    depth: int
+
+
+_lock = threading.Lock()
+_menu = (None, ())
+
+
+def menu_version():
+    return get_version(MENU_VERSION_KEY)
+
+
+def bump_menu_version():
+    return bump_version(MENU_VERSION_KEY)
+
+
+def _build_menu():
+    """ The whole tree in one query, flattened depth-first with siblings sorted by name. """
+    categories = Category.objects.annotate(
+        own_count=Count('product', filter=Q(product__is_available=True))
+    ).only('category_name', 'slug', 'parent_id', 'depth')
+    children = {}
+    for category in categories:
+        children.setdefault(category.parent_id, []).append(category)
+
+    counts = {}
+
+    def subtree_count(category):
+        if category.id not in counts:
+            counts[category.id] = category.own_count + sum(subtree_count(child) for child in children.get(category.id, ()))
+        return counts[category.id]
+
+    entries = []
+
+    def walk(parent_id):
+        for category in sorted(children.get(parent_id, ()), key=lambda category: category.category_name):
+            entries.append(MenuEntry(
+                category.category_name, category.slug, category.get_url(), subtree_count(category), category.depth,
+            ))
+            walk(category.id)
+
+    walk(None)
+    return tuple(entries)
+
+
+def get_menu():
+    global _menu
+    # Read the version before building, so a change made mid-build is picked up on the next request
+    version = menu_version()
+    if _menu[0] != version:
+        with _lock:
+            if _menu[0] != version:
+                _menu = (version, _build_menu())
+    return _menu[1]
@@ -1,4 +1,7 @@
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Concat, Substr
 
 # Create your models here.
 
@@ -7,6 +10,11 @@ class Category(models.Model):
     slug = models.SlugField(max_length=100, unique=True)
     description = models.TextField(max_length=255, blank=True, null=True)
     category_image = models.ImageField(upload_to='photos/categories', blank=True, null=True)
+    parent = models.ForeignKey('self', on_delete=models.PROTECT, null=True, blank=True, related_name='children')
+    # Materialized path of ancestor ids ending with our own, e.g. '/3/17/'. A whole department
+    # is one indexed prefix match (path LIKE '/3/%'); maintained by save().
+    path = models.CharField(max_length=255, db_index=True, editable=False, default='')
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
 
     class Meta:
         verbose_name = 'category'
@@ -16,6 +24,68 @@ class Category(models.Model):
     def get_url(self):
         from django.urls import reverse
         return reverse('products_by_category', args=[self.slug])
-    
+
+    def get_descendants(self, include_self=True):
+        descendants = Category.objects.filter(path__startswith=self.path)
+        return descendants if include_self else descendants.exclude(pk=self.pk)
+
+    def _is_own_subtree(self, category):
+        return bool(self.path) and category is not None and category.path.startswith(self.path)
+
+    def clean(self):
+        if self._is_own_subtree(self.parent):
+            raise ValidationError({'parent': 'A category cannot be moved under itself or one of its subcategories.'})
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if update_fields is None or 'parent' in update_fields:
+                self._move_subtree()
+
+    def _move_subtree(self):
+        """ Rewrites the path of this category and all its descendants with a single UPDATE. """
+        # Read fresh: this category or its parent may have moved since they were loaded
+        current = {
+            pk: (path, depth)
+            for pk, path, depth in Category.objects.filter(pk__in=[self.pk, self.parent_id]).values_list('id', 'path', 'depth')
+        }
+        old_path, old_depth = current[self.pk]
+        parent_path, parent_depth = current[self.parent_id] if self.parent_id else ('/', -1)
+        if old_path and parent_path.startswith(old_path):
+            # Raised inside save()'s transaction, so the new parent is rolled back too
+            raise ValueError('A category cannot be moved under itself or one of its subcategories.')
+        path, depth = f'{parent_path}{self.pk}/', parent_depth + 1
+        if path != old_path:
+            if old_path:
+                Category.objects.filter(path__startswith=old_path).update(
+                    path=Concat(Value(path), Substr('path', len(old_path) + 1), output_field=models.CharField()),
+                    depth=F('depth') + (depth - old_depth),
+                )
+            else:
+                Category.objects.filter(pk=self.pk).update(path=path, depth=depth)
+        self.path, self.depth = path, depth
+
     def __str__(self):
-        return self.category_name
\ No newline at end of file
+        return self.category_name
+
+
+def rebuild_paths():
+    """ Recomputes every path and depth from the parent links (e.g. after a raw import); two queries. """
+    parents = dict(Category.objects.values_list('id', 'parent_id'))
+    paths = {}
+
+    def path_of(category_id, seen=()):
+        if category_id in seen:
+            raise ValueError(f'Category {category_id} is its own ancestor.')
+        if category_id not in paths:
+            parent_id = parents[category_id]
+            paths[category_id] = f'{path_of(parent_id, seen + (category_id,)) if parent_id else "/"}{category_id}/'
+        return paths[category_id]
+
+    categories = [
+        Category(id=category_id, path=path_of(category_id), depth=path_of(category_id).count('/') - 2)
+        for category_id in parents
+    ]
+    Category.objects.bulk_update(categories, ['path', 'depth'], batch_size=500)
+    return len(categories)
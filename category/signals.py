@@ -0,0 +1,27 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from store.models import Product
+from .menu import bump_menu_version
+from .models import Category
+
+# Product fields the menu depends on (its category and whether it counts as available)
+MENU_PRODUCT_FIELDS = {'category', 'category_id', 'is_available'}
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def category_changed(sender, **kwargs):
+    transaction.on_commit(bump_menu_version)
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, update_fields=None, **kwargs):
+    if update_fields is None or MENU_PRODUCT_FIELDS & set(update_fields):
+        transaction.on_commit(bump_menu_version)
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, **kwargs):
+    transaction.on_commit(bump_menu_version)
@@ -1,3 +1,116 @@
+from decimal import Decimal
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.db.models import F
 from django.test import TestCase
 
+from store.models import Counter, Product
+from . import menu
+from .models import Category, rebuild_paths
+
 # Create your tests here.
+
+
+class MenuTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.men = Category.objects.create(category_name='Men', slug='men')
+        cls.shirts = Category.objects.create(category_name='Shirts', slug='shirts', parent=cls.men)
+        cls.bags = Category.objects.create(category_name='Bags', slug='bags')
+        cls.shirt = Product.objects.create(
+            product_name='Linen Shirt', slug='linen-shirt', product_price=Decimal('100.00'), stock=5,
+            category=cls.shirts, product_image='photos/products/test.jpg',
+        )
+
+    def setUp(self):
+        cache.clear()
+        menu._menu = (None, ())
+
+    def test_tree_is_flattened_with_subtree_counts(self):
+        self.assertEqual(
+            [(entry.category_name, entry.depth, entry.product_count) for entry in menu.get_menu()],
+            [('Bags', 0, 0), ('Men', 0, 1), ('Shirts', 1, 1)],
+        )
+        self.assertEqual(menu.get_menu()[2].url, self.shirts.get_url())
+
+    def test_menu_is_rebuilt_only_when_the_version_moves(self):
+        menu.get_menu()
+        # Only the shared version is read (the database cache is one query)
+        with self.assertNumQueries(1):
+            menu.get_menu()
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(category_name='Caps', slug='caps')
+        self.assertIn('Caps', [entry.category_name for entry in menu.get_menu()])
+
+    def test_a_bump_from_another_worker_is_seen(self):
+        menu.get_menu()
+        # Another process bumps the shared counter row, not this module's memo
+        Counter.objects.filter(key=menu.MENU_VERSION_KEY).update(value=F('value') + 1)
+        Category.objects.filter(pk=self.bags.pk).update(category_name='Backpacks')
+        self.assertEqual(menu.get_menu()[0].category_name, 'Backpacks')
+
+    def test_only_menu_fields_of_products_bump_the_version(self):
+        version = menu.menu_version()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.shirt.save(update_fields=['product_price'])
+        self.assertEqual(menu.menu_version(), version)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.shirt.is_available = False
+            self.shirt.save(update_fields=['is_available'])
+        self.assertEqual(menu.menu_version(), version + 1)
+
+
+class CategoryTreeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.men = Category.objects.create(category_name='Men', slug='men')
+        cls.women = Category.objects.create(category_name='Women', slug='women')
+        cls.tops = Category.objects.create(category_name='Tops', slug='tops', parent=cls.men)
+        cls.shirts = Category.objects.create(category_name='Shirts', slug='shirts', parent=cls.tops)
+
+    def paths(self):
+        return dict(Category.objects.values_list('slug', 'path'))
+
+    def test_paths_and_depths_follow_the_parents(self):
+        self.assertEqual(self.shirts.path, f'/{self.men.id}/{self.tops.id}/{self.shirts.id}/')
+        self.assertEqual(self.shirts.depth, 2)
+        self.assertEqual(list(self.men.get_descendants()), [self.men, self.shirts, self.tops])
+        self.assertEqual(list(self.men.get_descendants(include_self=False)), [self.shirts, self.tops])
+
+    def test_moving_a_category_moves_its_subtree_in_one_update(self):
+        self.tops.parent = self.women
+        # Savepoint, row UPDATE, the product card refresh, both paths read, one subtree UPDATE, release
+        with self.assertNumQueries(6):
+            self.tops.save(update_fields=['parent'])
+        shirts = Category.objects.get(pk=self.shirts.pk)
+        self.assertEqual(shirts.path, f'/{self.women.id}/{self.tops.id}/{self.shirts.id}/')
+        self.assertEqual(shirts.depth, 2)
+
+        self.tops.parent = None
+        self.tops.save()
+        self.assertEqual(Category.objects.get(pk=self.shirts.pk).depth, 1)
+
+    def test_a_category_cannot_move_under_its_own_subtree(self):
+        before = self.paths()
+        self.men.parent = self.shirts
+        with self.assertRaises(ValidationError):
+            self.men.clean()
+        with self.assertRaises(ValueError):
+            self.men.save()
+        self.assertEqual(self.paths(), before)
+        self.assertIsNone(Category.objects.get(pk=self.men.pk).parent_id)
+
+    def test_rebuild_paths_repairs_raw_imports_and_rejects_cycles(self):
+        expected = self.paths()
+        Category.objects.update(path='', depth=0)
+        out = StringIO()
+        call_command('rebuild_category_paths', stdout=out)
+        self.assertEqual(self.paths(), expected)
+        self.assertIn('4 category paths rebuilt', out.getvalue())
+
+        Category.objects.filter(pk=self.men.pk).update(parent=self.shirts)
+        with self.assertRaises(ValueError):
+            rebuild_paths()
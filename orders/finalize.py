@@ -0,0 +1,51 @@
+"""
+Turns a paid order's cart into OrderProducts.
+
+finalize_order() runs a fixed number of queries however many lines the cart has: the cart
+is priced with one query and its variations read with another, stock is reserved with one
+UPDATE (store.inventory.reserve_stock), and the OrderProducts and their variation rows are
+written with one bulk_create each before the cart is emptied.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+
+from carts.models import CartItem
+from carts.pricing import quote_cart
+from carts.summary import invalidate_cart_summary
+from store.inventory import reserve_stock
+from .models import OrderProduct
+
+
+@transaction.atomic
+def finalize_order(order, payment):
+    """ Raises store.inventory.InsufficientStock, changing nothing, if any line can't be fulfilled. """
+    cart_items = CartItem.objects.filter(user_id=order.user_id)
+    lines = quote_cart(cart_items).lines
+    # ✅ One conditional UPDATE for every line; nothing is decremented if any product is short
+    reserve_stock((line.product_id, line.quantity) for line in lines)
+
+    line_variations = defaultdict(list)
+    for cart_item_id, variation_id in CartItem.variations.through.objects.filter(
+        cartitem__user_id=order.user_id
+    ).values_list('cartitem_id', 'variation_id'):
+        line_variations[cart_item_id].append(variation_id)
+
+    order_products = OrderProduct.objects.bulk_create([
+        OrderProduct(
+            order=order, payment=payment, user_id=order.user_id, product_id=line.product_id,
+            variation_signature=line.variation_signature, quantity=line.quantity,
+            product_unit_price=line.product.product_price, product_line_price=line.line_total, ordered=True,
+        )
+        for line in lines
+    ])
+    Through = OrderProduct.variations.through
+    Through.objects.bulk_create([
+        Through(orderproduct_id=order_product.pk, variation_id=variation_id)
+        for line, order_product in zip(lines, order_products)
+        for variation_id in line_variations[line.id]
+    ])
+
+    cart_items.delete()
+    invalidate_cart_summary(user_id=order.user_id)
+    return order_products
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:15
+
+import hashlib
+
+from django.db import migrations, models
+
+
+def sign_order_products(apps, schema_editor):
+    OrderProduct = apps.get_model('orders', 'OrderProduct')
+    for order_product in OrderProduct.objects.prefetch_related('variations').iterator(chunk_size=500):
+        ids = sorted({v.id for v in order_product.variations.all()})
+        if ids:
+            order_product.variation_signature = hashlib.sha1(','.join(map(str, ids)).encode()).hexdigest()
+            order_product.save(update_fields=['variation_signature'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_alter_order_order_total_alter_order_shipping_charge_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='orderproduct',
+            name='variation_signature',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=40),
+        ),
+        migrations.RunPython(sign_order_products, migrations.RunPython.noop),
+    ]
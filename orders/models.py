@@ -63,6 +63,7 @@ class OrderProduct(models.Model):
     user = models.ForeignKey(Account, on_delete=models. CASCADE)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
     variations = models.ManyToManyField(Variation, blank=True)
+    variation_signature = models.CharField(max_length=40, blank=True, default='', db_index=True)
     quantity = models.IntegerField()
     product_unit_price = models.DecimalField(max_digits=10, decimal_places=2)
     product_line_price = models.DecimalField(max_digits=10, decimal_places=2)
@@ -1,8 +1,24 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, pre_save
 from django.dispatch import receiver
-from django.core.mail import EmailMessage
 from django.template.loader import render_to_string
-from .models import Order
+from outbox.mail import enqueue
+from store.inventory import release_stock
+from .models import Order, OrderProduct
+
+@receiver(pre_save, sender=Order)
+def remember_order_status(sender, instance, **kwargs):
+    instance._previous_status = (
+        Order.objects.filter(pk=instance.pk).values_list('status', flat=True).first() if instance.pk else None
+    )
+
+@receiver(post_save, sender=Order)
+def restock_cancelled_order(sender, instance, created, **kwargs):
+    """
+    Puts the stock of a paid order back when it gets cancelled.
+    """
+    previous_status = getattr(instance, '_previous_status', None)
+    if instance.is_ordered and instance.status == 'Cancelled' and previous_status not in (None, 'Cancelled'):
+        release_stock(OrderProduct.objects.filter(order=instance).values_list('product_id', 'quantity'))
 
 @receiver(post_save, sender=Order)
 def send_order_status_email(sender, instance, created, **kwargs):
@@ -10,15 +26,12 @@ def send_order_status_email(sender, instance, created, **kwargs):
     Triggered whenever an Order is updated.
     """
     if not created:  # Only when updating an existing order
-        # If status is Paid, send confirmation email
-        if instance.status == "Paid":
+        # If status just became Paid, send confirmation email
+        if instance.status == "Paid" and getattr(instance, '_previous_status', None) != "Paid":
             mail_subject = f"Payment Verified for Order #{instance.order_number}"
             message = render_to_string("orders/order_received_email.html", {
                 "user": instance.user,
                 "order": instance,
                 "payment_confirmed": True,  # Tells template to show "payment verified" section
             })
-            to_email = instance.user.email
-            send_email = EmailMessage(mail_subject, message, to=[to_email])
-            send_email.content_subtype = "html"
-            send_email.send()
+            enqueue(mail_subject, message, [instance.user.email], html=True)
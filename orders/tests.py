@@ -1,3 +1,145 @@
+import json
+from decimal import Decimal
+
 from django.test import TestCase
 
+from accounts.models import Account
+from carts.models import CartItem
+from category.models import Category
+from outbox.models import OutboxEmail
+from store.inventory import InsufficientStock
+from store.models import Product, Variation, VariationCategory
+from store.variations import variation_signature
+from .finalize import finalize_order
+from .models import Order, OrderProduct, Payment
+
 # Create your tests here.
+
+# Savepoints included; the same for a one-line cart and a ten-line one
+FINALIZE_QUERY_BUDGET = 13
+
+
+class OrderTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = Account.objects.create_user(
+            email='shopper@example.com', username='shopper', first_name='Sam', last_name='Shopper', password='secret'
+        )
+        cls.user.is_active = True
+        cls.user.save()
+        category = Category.objects.create(category_name='Shirts', slug='shirts')
+        size = VariationCategory.objects.create(name='Size')
+        cls.lines = []
+        for i in range(10):
+            product = Product.objects.create(
+                product_name=f'Shirt {i}', slug=f'shirt-{i}', product_price=Decimal('100.00') + i, stock=5,
+                category=category, product_image='photos/products/shirt.jpg',
+            )
+            cls.lines.append((product, Variation.objects.create(product=product, category=size, value='XL')))
+
+    def fill_cart(self, line_count, quantity=2):
+        for product, variation in self.lines[:line_count]:
+            item = CartItem.objects.create(
+                user=self.user, product=product, quantity=quantity, variation_signature=variation_signature([variation.id])
+            )
+            item.variations.add(variation)
+        payment = Payment.objects.create(
+            user=self.user, payment_id='COD-1', payment_method='COD', amount_paid=0, status='Pending'
+        )
+        order = Order.objects.create(
+            user=self.user, payment=payment, order_number='1', first_name='Sam', last_name='Shopper', phone='1',
+            email=self.user.email, address_line_1='1 Main St', country='India', state='Kerala', city='Kochi',
+            order_total=0, is_ordered=True,
+        )
+        return order, payment
+
+
+class FinalizeOrderTests(OrderTestCase):
+    def test_query_count_does_not_grow_with_the_cart(self):
+        for line_count in (1, 10):
+            with self.subTest(line_count=line_count):
+                order, payment = self.fill_cart(line_count)
+                with self.assertNumQueries(FINALIZE_QUERY_BUDGET):
+                    finalize_order(order, payment)
+
+    def test_lines_are_copied_and_stock_reserved(self):
+        order, payment = self.fill_cart(3)
+        finalize_order(order, payment)
+
+        order_products = OrderProduct.objects.filter(order=order).order_by('product_id')
+        self.assertEqual(
+            [(op.product_id, op.quantity, op.product_line_price, [v.id for v in op.variations.all()]) for op in order_products],
+            [(product.id, 2, product.product_price * 2, [variation.id]) for product, variation in self.lines[:3]],
+        )
+        self.assertTrue(all(op.payment_id == payment.id and op.ordered for op in order_products))
+        self.assertEqual(
+            list(Product.objects.filter(id__in=[p.id for p, _ in self.lines[:3]]).values_list('stock', flat=True)),
+            [3, 3, 3],
+        )
+        self.assertFalse(CartItem.objects.filter(user=self.user).exists())
+
+    def test_short_stock_changes_nothing(self):
+        order, payment = self.fill_cart(2, quantity=6)
+        with self.assertRaises(InsufficientStock):
+            finalize_order(order, payment)
+
+        self.assertFalse(OrderProduct.objects.filter(order=order).exists())
+        self.assertEqual(CartItem.objects.filter(user=self.user).count(), 2)
+        self.assertEqual(Product.objects.get(id=self.lines[0][0].id).stock, 5)
+
+
+class PaymentsViewTests(OrderTestCase):
+    def pay(self, order):
+        self.client.force_login(self.user)
+        return self.client.post('/orders/payments/', json.dumps({
+            'orderID': order.order_number, 'transID': 'COD-2', 'payment_method': 'COD', 'status': 'Pending',
+        }), content_type='application/json')
+
+    def test_losing_a_stock_race_answers_409_and_changes_nothing(self):
+        order, _ = self.fill_cart(2, quantity=6)
+        Order.objects.filter(pk=order.pk).update(is_ordered=False)
+        response = self.pay(order)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['error'], (
+            'Some items are no longer available in the requested quantity: Shirt 0 (only 5 left), Shirt 1 (only 5 left)'
+        ))
+        self.assertFalse(Order.objects.get(pk=order.pk).is_ordered)
+        self.assertEqual(CartItem.objects.filter(user=self.user).count(), 2)
+        self.assertFalse(Payment.objects.filter(payment_id='COD-2').exists())
+
+    def test_paying_finalizes_the_order(self):
+        order, _ = self.fill_cart(2)
+        Order.objects.filter(pk=order.pk).update(is_ordered=False)
+        response = self.pay(order)
+
+        self.assertEqual(response.json()['status'], 'success')
+        self.assertEqual(OrderProduct.objects.filter(order=order).count(), 2)
+        self.assertFalse(CartItem.objects.filter(user=self.user).exists())
+
+
+class OrderStatusSignalTests(OrderTestCase):
+    def setUp(self):
+        self.order, payment = self.fill_cart(1)
+        finalize_order(self.order, payment)
+
+    def set_status(self, status):
+        self.order.status = status
+        self.order.save()
+
+    def test_the_paid_mail_is_queued_once(self):
+        self.set_status('Paid')
+        self.set_status('Paid')
+        self.set_status('Processing')
+
+        self.assertEqual(
+            list(OutboxEmail.objects.values_list('subject', 'to')),
+            [(f'Payment Verified for Order #{self.order.order_number}', [self.user.email])],
+        )
+
+    def test_cancelling_restocks_once(self):
+        product = self.lines[0][0]
+        self.set_status('Cancelled')
+        self.set_status('Cancelled')
+        self.assertEqual(Product.objects.get(pk=product.pk).stock, 5)
+        self.assertFalse(OutboxEmail.objects.exists())
@@ -1,9 +1,7 @@
 import datetime
 import json
-from decimal import Decimal
 from django.http import JsonResponse
 from django.shortcuts import redirect, render
-from django.core.mail import EmailMessage
 from django.template.loader import render_to_string
 from django.contrib import messages
 from django.db import transaction
@@ -11,22 +9,24 @@ from django.conf import settings
 from django.contrib.auth.decorators import login_required
 
 from carts.models import CartItem
+from carts.pricing import quote_cart
+from store.inventory import InsufficientStock
+from outbox.mail import enqueue
+from .finalize import finalize_order
 from .forms import OrderForm
 from .models import Order, OrderProduct, Payment
 
 SHOP_OWNER_EMAIL = settings.SHOP_OWNER_EMAIL
 
 def send_order_emails(order, payment):
-    """ Sends customized HTML emails to the customer and owner based on the payment method. """
+    """ Queues customized HTML emails to the customer and owner based on the payment method. """
     # --- Send Confirmation to Customer ---
     customer_subject = 'Thank You For Your Order!'
     customer_template = 'orders/order_received_email.html'
     subtotal = order.order_total - order.shipping_charge
     customer_context = {'user': order.user, 'order': order, 'payment': payment, 'subtotal': subtotal}
     customer_message = render_to_string(customer_template, customer_context)
-    customer_email = EmailMessage(customer_subject, customer_message, to=[order.email])
-    customer_email.content_subtype = "html"
-    customer_email.send()
+    enqueue(customer_subject, customer_message, [order.email], html=True)
 
     # --- Send Notification to Shop Owner ---
     if payment.payment_method == 'UPI' and payment.status == 'Pending':
@@ -38,9 +38,7 @@ def send_order_emails(order, payment):
     
     owner_context = {'order': order, 'payment': payment}
     owner_message = render_to_string(owner_template, owner_context)
-    owner_email = EmailMessage(owner_subject, owner_message, to=[SHOP_OWNER_EMAIL])
-    owner_email.content_subtype = "html"
-    owner_email.send()
+    enqueue(owner_subject, owner_message, [SHOP_OWNER_EMAIL], html=True)
 
 @transaction.atomic
 def payments(request):
@@ -58,23 +56,17 @@ def payments(request):
         order.is_ordered = True
         order.save()
 
-        cart_items = CartItem.objects.filter(user=request.user).select_related('product').prefetch_related('variations')
-        for item in cart_items:
-            order_product = OrderProduct(
-                order=order, payment=payment, user=request.user, product=item.product,
-                quantity=item.quantity, product_unit_price=item.product.product_price,
-                product_line_price=item.sub_total(), ordered=True
-            )
-            order_product.save()
-            order_product.variations.set(item.variations.all())
-            item.product.stock -= item.quantity
-            item.product.save()
-
-        CartItem.objects.filter(user=request.user).delete()
+        finalize_order(order, payment)
         send_order_emails(order, payment)
         data = {'order_number': order.order_number, 'trans_ID': payment.payment_id, 'status': 'success'}
         return JsonResponse(data)
     
+    except InsufficientStock as e:
+        # No queries after this: the transaction is only good for rolling back
+        transaction.set_rollback(True)
+        error_message = "Some items are no longer available in the requested quantity: " + e.describe()
+        return JsonResponse({'status': 'failed', 'error': error_message}, status=409)
+
     # ✅ This block will handle the specific error if the order is not found
     except Order.DoesNotExist:
         error_message = "Order not found. It might have already been processed or does not exist."
@@ -88,26 +80,21 @@ def payments(request):
 
 def place_order(request):
     current_user = request.user
-    cart_items = CartItem.objects.filter(user=current_user).select_related('product')
+    # ✅ One query prices the whole cart (lines, subtotal, weight)
+    quote = quote_cart(CartItem.objects.filter(user=current_user).prefetch_related('variations__category'))
     
-    if not cart_items.exists():
+    if not quote.lines:
         return redirect('store')
 
-    total = sum(item.sub_total() for item in cart_items)
-    total_weight = sum(item.product.weight * item.quantity for item in cart_items)
-    
     if request.method == "POST":
         form = OrderForm(request.POST)
         if form.is_valid():
-            state_from_form = form.cleaned_data['state']
-            shipping_rate = Decimal('60.00') if state_from_form.strip().lower() == 'tamil nadu' else Decimal('100.00')
-            shipping_charge = (total_weight * shipping_rate).quantize(Decimal('0.01'))
-            grand_total = total + shipping_charge
+            quote = quote.with_shipping(form.cleaned_data['state'])
             
             data = form.save(commit=False)
             data.user = current_user
-            data.order_total = grand_total
-            data.shipping_charge = shipping_charge
+            data.order_total = quote.grand_total
+            data.shipping_charge = quote.shipping_charge
             data.ip = request.META.get('REMOTE_ADDR')
             data.is_ordered = False
             data.save()
@@ -118,8 +105,8 @@ def place_order(request):
             data.save()
 
             context = {
-                'order': data, 'cart_items': cart_items, 'total': total,
-                'delivery_charge': shipping_charge, 'grand_total': grand_total,
+                'order': data, 'cart_items': quote.lines, 'total': quote.subtotal,
+                'delivery_charge': quote.shipping_charge, 'grand_total': quote.grand_total,
                 'UPI_ID': settings.UPI_ID, 'UPI_NAME': settings.UPI_NAME,
             }
             return render(request, 'orders/payments.html', context)
@@ -0,0 +1,13 @@
+from django.contrib import admin
+
+from .models import OutboxEmail
+
+# Register your models here.
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ['subject', 'to', 'status', 'attempts', 'next_attempt_at', 'sent_at']
+    list_filter = ['status']
+    search_fields = ['subject', 'to']
+    readonly_fields = ['created_at', 'sent_at', 'last_error']
+    list_per_page = 20
+
+admin.site.register(OutboxEmail, OutboxEmailAdmin)
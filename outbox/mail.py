@@ -0,0 +1,95 @@
+"""
+Outgoing mail goes through the OutboxEmail table instead of straight to the mail server.
+
+enqueue() only inserts a row, so it joins the caller's transaction: an order that rolls
+back takes its mails with it, and a slow or failing mail server can no longer hold a
+request (or its transaction) open. The send_outbox command drains the table.
+
+send_batch() claims due rows with SELECT ... FOR UPDATE SKIP LOCKED and moves their
+next_attempt_at one lease ahead before committing, so several workers can run side by side
+without sending a mail twice, and the rows of a worker that dies mid-batch simply come due
+again. The batch is then sent over one connection, outside any transaction; failed mails
+are retried with exponential backoff until MAX_ATTEMPTS.
+"""
+from datetime import timedelta
+
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import OutboxEmail
+
+BATCH_SIZE = 50
+MAX_ATTEMPTS = 8
+# How long a claimed row is hidden from other workers while it is being sent
+LEASE = timedelta(minutes=10)
+# Wait 1, 2, 4, ... minutes between attempts, capped at RETRY_MAX
+RETRY_BASE = timedelta(minutes=1)
+RETRY_MAX = timedelta(hours=6)
+
+
+def enqueue(subject, body, to, html=False):
+    """ Queues a mail for the send_outbox worker; it is sent only if the current transaction commits. """
+    return OutboxEmail.objects.create(
+        subject=subject, body=body, to=list(to), content_subtype='html' if html else 'plain'
+    )
+
+
+def _claim(batch_size):
+    now = timezone.now()
+    with transaction.atomic():
+        emails = list(
+            OutboxEmail.objects.select_for_update(skip_locked=True)
+            .filter(status='Pending', next_attempt_at__lte=now)
+            .order_by('next_attempt_at')[:batch_size]
+        )
+        if emails:
+            OutboxEmail.objects.filter(id__in=[email.id for email in emails]).update(
+                attempts=F('attempts') + 1, next_attempt_at=now + LEASE
+            )
+    for email in emails:
+        email.attempts += 1
+    return emails
+
+
+def _retry_delay(attempts):
+    return min(RETRY_BASE * 2 ** (attempts - 1), RETRY_MAX)
+
+
+def send_batch(batch_size=BATCH_SIZE):
+    """ Sends up to batch_size due mails over a single connection; returns (claimed, sent). """
+    emails = _claim(batch_size)
+    if not emails:
+        return 0, 0
+
+    sent, failed = [], {}
+    try:
+        with get_connection() as connection:
+            for email in emails:
+                message = EmailMessage(email.subject, email.body, to=email.to, connection=connection)
+                message.content_subtype = email.content_subtype
+                try:
+                    message.send()
+                except Exception as e:
+                    failed[email.id] = e
+                else:
+                    sent.append(email.id)
+    except Exception as e:
+        # Could not connect (or the connection broke): whatever was not attempted is retried
+        for email in emails:
+            if email.id not in sent:
+                failed.setdefault(email.id, e)
+
+    now = timezone.now()
+    if sent:
+        OutboxEmail.objects.filter(id__in=sent).update(status='Sent', sent_at=now, last_error='')
+    retries = [email for email in emails if email.id in failed]
+    for email in retries:
+        if email.attempts >= MAX_ATTEMPTS:
+            email.status = 'Failed'
+        email.next_attempt_at = now + _retry_delay(email.attempts)
+        email.last_error = f'{type(failed[email.id]).__name__}: {failed[email.id]}'
+    if retries:
+        OutboxEmail.objects.bulk_update(retries, ['status', 'next_attempt_at', 'last_error'])
+    return len(emails), len(sent)
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from outbox.mail import BATCH_SIZE, send_batch
+
+
+class Command(BaseCommand):
+    help = (
+        'Sends queued mail from the outbox in batches, one mail server connection per batch. '
+        'Several workers can run at once; each claims its own rows.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='Mails sent per connection.')
+        parser.add_argument('--loop', action='store_true', help='Keep running and poll for new mail.')
+        parser.add_argument('--interval', type=float, default=5, help='Seconds to wait when the outbox is empty (with --loop).')
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        while True:
+            total_claimed = total_sent = 0
+            while True:
+                claimed, sent = send_batch(batch_size)
+                total_claimed += claimed
+                total_sent += sent
+                # A short batch means nothing else is due right now
+                if claimed < batch_size:
+                    break
+            if total_claimed:
+                self.stdout.write(f'{total_sent} sent, {total_claimed - total_sent} failed.')
+            if not options['loop']:
+                break
+            close_old_connections()
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS('Outbox drained.'))
@@ -0,0 +1,31 @@
+from django.db import models
+from django.utils import timezone
+
+# Create your models here.
+class OutboxEmail(models.Model):
+    STATUS = (
+        ('Pending', 'Pending'),  # Waiting for (another) delivery attempt
+        ('Sent', 'Sent'),
+        ('Failed', 'Failed'),    # Gave up after MAX_ATTEMPTS
+    )
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    to = models.JSONField(default=list)
+    content_subtype = models.CharField(max_length=20, default='plain')
+    status = models.CharField(max_length=20, choices=STATUS, default='Pending')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['next_attempt_at']
+        indexes = [
+            # The sender's only query: due rows of one status, oldest first
+            models.Index(fields=['status', 'next_attempt_at']),
+        ]
+
+    def __str__(self):
+        return f'{self.subject} -> {", ".join(self.to)}'
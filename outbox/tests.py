@@ -0,0 +1,122 @@
+from datetime import timedelta
+from io import StringIO
+from smtplib import SMTPException
+from unittest import mock
+
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.core.management import call_command
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from .mail import LEASE, MAX_ATTEMPTS, RETRY_MAX, _claim, enqueue, send_batch
+from .models import OutboxEmail
+
+# Create your tests here.
+
+
+class FlakyBackend(EmailBackend):
+    """ locmem backend that refuses mail to REFUSED and can fail to connect; counts its connections. """
+    REFUSED = 'refused@example.com'
+    connections = 0
+    down = False
+
+    def open(self):
+        if FlakyBackend.down:
+            raise SMTPException('connection refused')
+        FlakyBackend.connections += 1
+        return True
+
+    def send_messages(self, messages):
+        if any(self.REFUSED in message.to for message in messages):
+            raise SMTPException('recipient refused')
+        return super().send_messages(messages)
+
+
+@override_settings(EMAIL_BACKEND='outbox.tests.FlakyBackend')
+class SendBatchTests(TestCase):
+    def setUp(self):
+        FlakyBackend.connections, FlakyBackend.down = 0, False
+        # Just after the mails each test queues with the real clock
+        self.now = timezone.now() + timedelta(seconds=1)
+
+    def at(self, when):
+        return mock.patch('outbox.mail.timezone.now', return_value=when)
+
+    def test_mail_is_sent_only_if_the_transaction_commits(self):
+        try:
+            with transaction.atomic():
+                enqueue('Lost', 'body', ['shopper@example.com'])
+                raise RuntimeError('order failed')
+        except RuntimeError:
+            pass
+        enqueue('Order received', '<p>Thanks</p>', ['shopper@example.com'], html=True)
+
+        self.assertEqual(send_batch(), (1, 1))
+        self.assertEqual([(m.subject, m.to, m.content_subtype) for m in mail.outbox], [
+            ('Order received', ['shopper@example.com'], 'html'),
+        ])
+        email = OutboxEmail.objects.get()
+        self.assertEqual((email.status, email.attempts, email.last_error), ('Sent', 1, ''))
+        self.assertIsNotNone(email.sent_at)
+
+    def test_a_batch_uses_one_connection(self):
+        for i in range(5):
+            enqueue(f'Mail {i}', 'body', [f'shopper{i}@example.com'])
+        self.assertEqual(send_batch(batch_size=3), (3, 3))
+        self.assertEqual(send_batch(batch_size=3), (2, 2))
+        self.assertEqual(FlakyBackend.connections, 2)
+        self.assertEqual(len(mail.outbox), 5)
+
+    def test_claimed_mail_is_leased_until_its_worker_is_presumed_dead(self):
+        email = enqueue('Order received', 'body', ['shopper@example.com'])
+        with self.at(self.now):
+            self.assertEqual(_claim(10), [email])
+        email.refresh_from_db()
+        self.assertEqual((email.attempts, email.next_attempt_at), (1, self.now + LEASE))
+
+        # Another worker sees nothing while the lease holds...
+        with self.at(self.now + LEASE - timedelta(seconds=1)):
+            self.assertEqual(send_batch(), (0, 0))
+        # ...and picks the mail up again once it has run out
+        with self.at(self.now + LEASE):
+            self.assertEqual(send_batch(), (1, 1))
+        self.assertEqual(OutboxEmail.objects.get().attempts, 2)
+
+    def test_failures_back_off_exponentially_until_they_give_up(self):
+        refused = enqueue('Refused', 'body', [FlakyBackend.REFUSED])
+        enqueue('Delivered', 'body', ['shopper@example.com'])
+        when, delays = self.now, []
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            with self.at(when):
+                send_batch()
+            refused.refresh_from_db()
+            self.assertEqual(refused.attempts, attempt)
+            delays.append(refused.next_attempt_at - when)
+            when = refused.next_attempt_at
+
+        self.assertEqual(delays, [min(timedelta(minutes=2 ** n), RETRY_MAX) for n in range(MAX_ATTEMPTS)])
+        self.assertEqual(refused.status, 'Failed')
+        self.assertEqual(refused.last_error, 'SMTPException: recipient refused')
+        self.assertEqual([m.subject for m in mail.outbox], ['Delivered'])
+        with self.at(when + RETRY_MAX):
+            self.assertEqual(send_batch(), (0, 0))
+
+    def test_an_unreachable_server_retries_the_whole_batch(self):
+        enqueue('First', 'body', ['a@example.com'])
+        enqueue('Second', 'body', ['b@example.com'])
+        FlakyBackend.down = True
+        with self.at(self.now):
+            self.assertEqual(send_batch(), (2, 0))
+        self.assertEqual(
+            set(OutboxEmail.objects.values_list('status', 'next_attempt_at')),
+            {('Pending', self.now + timedelta(minutes=1))},
+        )
+
+        FlakyBackend.down = False
+        call_command('send_outbox', stdout=StringIO())
+        self.assertEqual(OutboxEmail.objects.filter(status='Pending').count(), 2)
+        with self.at(self.now + timedelta(minutes=1)):
+            call_command('send_outbox', stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 2)
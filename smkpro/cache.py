@@ -0,0 +1,126 @@
+"""
+Cache-aside helper with single-flight recomputation.
+
+Entries are stored as an envelope {value, expires, delta, version}. When an entry is
+missing, expired, built for another version, or picked for probabilistic early refresh
+(XFetch), exactly one worker takes a short lock and recomputes it. The others keep serving
+the old value if it was built for the same version and has merely expired; otherwise (cold
+miss or new version) they wait briefly for the winner. Only cache.add/get/set/delete
+are used, so it works with the local-memory and file-based backends as well as Redis/Memcached.
+
+get_version()/bump_version() keep the version counters that such entries are built for. They
+live in a database table (store.Counter) rather than in the cache: a cache may evict them or,
+like the database backend, implement incr() as a non-atomic get-then-set that also resets
+the key's timeout, losing bumps and restarting counters.
+"""
+import math
+import random
+import time
+import uuid
+
+from django.core.cache import cache
+from django.db.models import F
+
+DEFAULT_TIMEOUT = 300
+# How long an expired value may still be served while someone else recomputes it.
+DEFAULT_STALE_TTL = 300
+LOCK_TIMEOUT = 30
+POLL_INTERVAL = 0.05
+
+
+def _lock_key(key):
+    return f'{key}:lock'
+
+
+def _acquire(key, lock_timeout):
+    token = uuid.uuid4().hex
+    return token if cache.add(_lock_key(key), token, lock_timeout) else None
+
+
+def _release(key, token):
+    if cache.get(_lock_key(key)) == token:
+        cache.delete(_lock_key(key))
+
+
+def _is_fresh(entry, version, beta, now):
+    if entry['version'] != version:
+        return False
+    # XFetch: refresh early with a probability that grows as expiry approaches,
+    # scaled by how long the value took to compute.
+    return now - entry['delta'] * beta * math.log(1.0 - random.random()) < entry['expires']
+
+
+def _compute_and_store(key, compute, timeout, stale_ttl, version):
+    started = time.monotonic()
+    value = compute()
+    delta = time.monotonic() - started
+    entry = {'value': value, 'expires': time.time() + timeout, 'delta': delta, 'version': version}
+    cache.set(key, entry, timeout + stale_ttl)
+    return value
+
+
+def get_or_compute(key, compute, timeout=DEFAULT_TIMEOUT, version=None, stale_ttl=DEFAULT_STALE_TTL,
+                   lock_timeout=LOCK_TIMEOUT, wait=2.0, beta=1.0):
+    """
+    Returns the cached value for `key`, calling `compute()` in at most one worker at a time.
+
+    `version` (e.g. the catalog version) invalidates entries without changing the key, which
+    lets other workers serve the previous value while the new one is being built.
+    """
+    entry = cache.get(key)
+    if entry is not None and _is_fresh(entry, version, beta, time.time()):
+        return entry['value']
+
+    token = _acquire(key, lock_timeout)
+    if token:
+        try:
+            return _compute_and_store(key, compute, timeout, stale_ttl, version)
+        finally:
+            _release(key, token)
+
+    if entry is not None and entry['version'] == version:
+        # Somebody else is already recomputing; the expired value is good enough meanwhile.
+        return entry['value']
+
+    deadline = time.monotonic() + wait
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None and entry['version'] == version:
+            return entry['value']
+    # The lock holder is slow or died: compute without storing over its result.
+    return compute()
+
+
+def _counters():
+    from store.models import Counter
+    return Counter.objects
+
+
+def read_counter(key, default=0):
+    """ Current value of a shared counter, or `default` if it was never written. """
+    value = _counters().filter(key=key).values_list('value', flat=True).first()
+    return default if value is None else value
+
+
+def add_to_counter(key, amount=1, initial=0):
+    """ Atomically adds `amount` to a shared counter, creating it at `initial` first if needed. """
+    if not _counters().filter(key=key).update(value=F('value') + amount):
+        _counters().get_or_create(key=key, defaults={'value': initial})
+        _counters().filter(key=key).update(value=F('value') + amount)
+
+
+def get_version(key):
+    """ Current value of a shared version counter, created on first use. """
+    version = read_counter(key, None)
+    if version is None:
+        # Seed from the clock, never from 1: a recreated counter must not reuse an old version
+        # that entries still sitting in the cache were built for.
+        version = _counters().get_or_create(key=key, defaults={'value': int(time.time())})[0].value
+    return version
+
+
+def bump_version(key):
+    """ Moves a version counter on, invalidating everything built for the old one without touching it. """
+    add_to_counter(key, 1, initial=int(time.time()))
+    return read_counter(key)
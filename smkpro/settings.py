@@ -5,6 +5,7 @@ Generated by 'django-admin startproject' using Django 3.1.
 
 from pathlib import Path
 from decouple import config
+from django.core.exceptions import ImproperlyConfigured
 import dj_database_url
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -29,12 +30,14 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'category',
     'accounts.apps.AccountsConfig',
     'store',
     'carts',
     'wishlist',
     'orders.apps.OrdersConfig',
+    'outbox.apps.OutboxConfig',
 ]
 
 MIDDLEWARE = [
@@ -61,10 +64,8 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
-                'category.context_processors.menu_links',
-                'carts.context_processors.counter',
-                'wishlist.context_processors.wishlist_counter',
-                'wishlist.context_processors.wishlist_products_ids',
+                # Lazy menu, cart count and wishlist for the navbar and product cards
+                'smkpro.shopper.shopper',
             ],
         },
     },
@@ -93,6 +94,31 @@ else:
         'PORT': config('DB_PORT', default='5432'),
     }
 
+# Cache
+# Shared by every worker: it holds the catalog and menu version counters that invalidate the
+# cached listings and menus, and the cart summaries. The default database cache works out of
+# the box (its table is created by `migrate`, see store/migrations/0010_cache_table.py); set
+# CACHE_BACKEND to a Redis or Memcached backend to take the load off the database.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': config('CACHE_LOCATION', default='smkpro_cache'),
+    }
+}
+# The database cache needs its table: run `python manage.py createcachetable` on every deploy,
+# next to `migrate` (it only creates what is missing).
+if CACHES['default']['BACKEND'] in (
+    'django.core.cache.backends.db.DatabaseCache',
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.filebased.FileBasedCache',
+):
+    # Past MAX_ENTRIES these backends cull a third of all keys, so size it for every listing,
+    # lock and cart summary in use rather than the default of 300.
+    CACHES['default']['OPTIONS'] = {'MAX_ENTRIES': config('CACHE_MAX_ENTRIES', default=100000, cast=int)}
+# A per-process cache would let workers serve stale listings and menus after an admin change
+if not DEBUG and CACHES['default']['BACKEND'] == 'django.core.cache.backends.locmem.LocMemCache':
+    raise ImproperlyConfigured('LocMemCache is not shared between workers; only use it with DJANGO_DEBUG=True.')
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -119,6 +145,8 @@ STATICFILES_DIRS = [
 # Media files
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+# Processes used to generate responsive image derivatives after uploads (0 = inline)
+IMAGE_DERIVATIVE_WORKERS = config('IMAGE_DERIVATIVE_WORKERS', default=2, cast=int)
 
 # Messages
 from django.contrib.messages import constants as messages
@@ -127,7 +155,10 @@ MESSAGE_TAGS = {
 }
 
 # Email settings
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# Mail is queued in the outbox and sent by `manage.py send_outbox`. Set EMAIL_BACKEND to
+# django.core.mail.backends.filebased.EmailBackend (or locmem) to try it without a mail server.
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.smtp.EmailBackend')
+EMAIL_FILE_PATH = config('EMAIL_FILE_PATH', default=str(BASE_DIR / 'sent_emails'))
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587 # Use 587 for TLS
 EMAIL_HOST_USER = config("EMAIL_HOST_USER")
@@ -138,4 +169,14 @@ EMAIL_USE_SSL = False # TLS and SSL are mutually exclusive
 # Custom settings
 SHOP_OWNER_EMAIL = config("SHOP_OWNER_EMAIL")
 UPI_ID = config("UPI_ID")
-UPI_NAME = config("UPI_NAME")
\ No newline at end of file
+UPI_NAME = config("UPI_NAME")
+
+# Store listing pagination: 'cursor' (keyset, no COUNT/OFFSET) or 'offset' (numbered pages)
+STORE_PAGINATION = config('STORE_PAGINATION', default='cursor')
+# Show an estimated "items found" total in cursor mode (planner estimate on PostgreSQL)
+STORE_APPROXIMATE_COUNT = config('STORE_APPROXIMATE_COUNT', default=True, cast=bool)
+
+# Where anonymous shoppers' carts live: 'db' (session-keyed Cart rows) or 'cookie' (signed
+# cookie, no database writes until login). Logged-in carts are always stored in the database.
+# Switching to 'cookie' hides the guest carts already stored in the database.
+CART_BACKEND = config('CART_BACKEND', default='db')
@@ -0,0 +1,54 @@
+"""
+Per-request shopper state shared by every template and view.
+
+One `shopper` object replaces the old menu, cart and wishlist context processors. Nothing
+is loaded when it is created: each attribute is computed on first access and memoized for
+the rest of the request, so a page that never shows the navbar (admin, JSON) pays nothing,
+and a view that needs the wishlist ids reuses the very query the navbar triggers.
+"""
+from django.utils.functional import cached_property
+
+from carts.backends import get_cart
+from category.menu import get_menu
+from wishlist.models import WishlistItem
+
+
+class ShopperState:
+    def __init__(self, request):
+        self.request = request
+
+    @cached_property
+    def menu(self):
+        return get_menu()
+
+    @cached_property
+    def cart_count(self):
+        return get_cart(self.request).count()
+
+    @cached_property
+    def wishlist_ids(self):
+        """ Product ids on the shopper's wishlist: one query, or none for a guest without a session. """
+        if self.request.user.is_authenticated:
+            items = WishlistItem.objects.filter(user=self.request.user, is_active=True)
+        elif self.request.session.session_key:
+            # Guest wishlists are keyed by session key (see wishlist.views._wishlist_id)
+            items = WishlistItem.objects.filter(
+                wishlist__wishlist_id=self.request.session.session_key, user=None, is_active=True
+            )
+        else:
+            return frozenset()
+        return frozenset(items.values_list('product_id', flat=True))
+
+    @cached_property
+    def wishlist_count(self):
+        return len(self.wishlist_ids)
+
+
+def get_shopper(request):
+    if not hasattr(request, '_shopper'):
+        request._shopper = ShopperState(request)
+    return request._shopper
+
+
+def shopper(request):
+    return {'shopper': get_shopper(request)}
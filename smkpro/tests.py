@@ -0,0 +1,188 @@
+import time
+from unittest import mock
+
+from decimal import Decimal
+
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.sessions.backends.db import SessionStore
+from django.db import connection
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from accounts.models import Account
+from carts.models import Cart, CartItem
+from category.models import Category
+from store.models import Product
+from wishlist.models import Wishlist, WishlistItem
+from .cache import _lock_key, bump_version, get_or_compute, get_version
+from .shopper import get_shopper
+
+LOCMEM = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'smkpro-tests'}}
+
+
+@override_settings(CACHES=LOCMEM)
+class GetOrComputeTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return f'value {self.calls}'
+
+    def test_computes_once_then_serves_the_cache(self):
+        self.assertEqual(get_or_compute('key', self.compute), 'value 1')
+        self.assertEqual(get_or_compute('key', self.compute), 'value 1')
+        self.assertEqual(self.calls, 1)
+
+    def test_a_new_version_recomputes(self):
+        get_or_compute('key', self.compute, version=1)
+        self.assertEqual(get_or_compute('key', self.compute, version=2), 'value 2')
+        self.assertEqual(get_or_compute('key', self.compute, version=2), 'value 2')
+
+    def test_expired_value_is_served_while_another_worker_recomputes(self):
+        get_or_compute('key', self.compute, version=1, timeout=-1)
+        cache.add(_lock_key('key'), 'other-worker', 30)
+        self.assertEqual(get_or_compute('key', self.compute, version=1), 'value 1')
+        self.assertEqual(self.calls, 1)
+
+    def test_another_versions_value_is_never_served(self):
+        get_or_compute('key', self.compute, version=1)
+        cache.add(_lock_key('key'), 'other-worker', 30)
+
+        def winner_stores(seconds):
+            cache.set('key', {'value': 'theirs', 'expires': time.time() + 60, 'delta': 0, 'version': 2}, 60)
+
+        with mock.patch('smkpro.cache.time.sleep', side_effect=winner_stores):
+            self.assertEqual(get_or_compute('key', self.compute, version=2), 'theirs')
+        # Nobody stores the new version in time: compute it rather than serve version 1
+        self.assertEqual(get_or_compute('key', self.compute, version=3, wait=0.1), 'value 2')
+
+    def test_cold_miss_waits_for_the_lock_holder(self):
+        cache.add(_lock_key('key'), 'other-worker', 30)
+
+        def winner_stores(seconds):
+            cache.set('key', {'value': 'theirs', 'expires': 0, 'delta': 0, 'version': None}, 60)
+
+        with mock.patch('smkpro.cache.time.sleep', side_effect=winner_stores):
+            self.assertEqual(get_or_compute('key', self.compute), 'theirs')
+        self.assertEqual(self.calls, 0)
+
+    def test_gives_up_waiting_without_overwriting_the_lock_holder(self):
+        cache.add(_lock_key('key'), 'other-worker', 30)
+        self.assertEqual(get_or_compute('key', self.compute, wait=0.1), 'value 1')
+        self.assertIsNone(cache.get('key'))
+
+    def test_lock_is_released_when_compute_fails(self):
+        def fail():
+            raise RuntimeError
+
+        with self.assertRaises(RuntimeError):
+            get_or_compute('key', fail)
+        self.assertIsNone(cache.get(_lock_key('key')))
+
+    def test_expired_entries_are_recomputed(self):
+        get_or_compute('key', self.compute, timeout=-1)
+        self.assertEqual(get_or_compute('key', self.compute), 'value 2')
+
+
+
+class VersionCounterTests(TestCase):
+    def test_counters_are_independent_and_seeded_from_the_clock(self):
+        with mock.patch('smkpro.cache.time.time', return_value=1000):
+            self.assertEqual(get_version('a'), 1000)
+            self.assertEqual(bump_version('a'), 1001)
+            self.assertEqual(get_version('b'), 1000)
+        self.assertEqual(get_version('a'), 1001)
+
+    def test_bumping_a_missing_counter_seeds_it(self):
+        self.assertEqual(bump_version('a'), get_version('a'))
+
+    def test_counters_survive_a_cache_flush_and_every_bump_counts(self):
+        version = get_version('a')
+        cache.clear()
+        for _ in range(3):
+            bump_version('a')
+        self.assertEqual(get_version('a'), version + 3)
+
+
+@override_settings(CART_BACKEND='db')
+class GuestSessionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(category_name='Shirts', slug='shirts')
+        cls.shirt = Product.objects.create(
+            product_name='Linen Shirt', slug='linen-shirt', product_price=Decimal('100.00'), stock=5,
+            category=category, product_image='photos/products/test.jpg',
+        )
+
+    def test_browsing_writes_no_session_or_guest_rows(self):
+        for url in ('/', '/store/', '/store/category/shirts/', '/store/category/shirts/linen-shirt/', '/cart/', '/wishlist/'):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotIn('sessionid', response.cookies)
+        self.assertFalse(Session.objects.exists())
+        self.assertFalse(Cart.objects.exists())
+        self.assertFalse(Wishlist.objects.exists())
+
+    def test_the_first_write_creates_one_session_for_cart_and_wishlist(self):
+        self.client.post(f'/cart/add_cart/{self.shirt.id}/')
+        self.client.post(f'/wishlist/toggle/{self.shirt.id}/')
+        session_key = self.client.cookies['sessionid'].value
+
+        self.assertEqual(list(Session.objects.values_list('session_key', flat=True)), [session_key])
+        self.assertTrue(CartItem.objects.filter(cart__cart_id=session_key, product=self.shirt).exists())
+        self.assertTrue(WishlistItem.objects.filter(wishlist__wishlist_id=session_key, product=self.shirt).exists())
+        # Later reads find the guest's rows through the session
+        self.assertEqual(self.client.get('/cart/').context['quantity'], 1)
+        self.assertEqual(self.client.get('/wishlist/').context['wishlist_count'], 1)
+
+
+class ShopperStateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = Account.objects.create_user(
+            email='shopper@example.com', username='shopper', first_name='Sam', last_name='Shopper', password='secret'
+        )
+        cls.user.is_active = True
+        cls.user.save()
+        category = Category.objects.create(category_name='Shirts', slug='shirts')
+        cls.shirt, cls.tee = (
+            Product.objects.create(
+                product_name=name, slug=name.lower().replace(' ', '-'), product_price=Decimal('100.00'), stock=5,
+                category=category, product_image='photos/products/test.jpg',
+            )
+            for name in ('Linen Shirt', 'Cotton Tee')
+        )
+        WishlistItem.objects.create(user=cls.user, product=cls.shirt)
+        WishlistItem.objects.create(user=cls.user, product=cls.tee, is_active=False)
+
+    def request(self, user):
+        request = RequestFactory().get('/')
+        request.user = user
+        request.session = SessionStore()
+        return request
+
+    def test_wishlist_is_read_once_on_first_use(self):
+        request = self.request(self.user)
+        with self.assertNumQueries(0):
+            shopper = get_shopper(request)
+        with self.assertNumQueries(1):
+            self.assertEqual(shopper.wishlist_ids, {self.shirt.id})
+            self.assertEqual(shopper.wishlist_count, 1)
+        self.assertIs(get_shopper(request), shopper)
+
+    def test_a_guest_without_a_session_costs_nothing(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(get_shopper(self.request(AnonymousUser())).wishlist_ids, frozenset())
+
+    def test_store_page_shares_one_wishlist_query(self):
+        self.client.force_login(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/store/')
+        self.assertEqual(len([query for query in queries if 'FROM "wishlist_wishlistitem"' in query['sql']]), 1)
+        self.assertContains(response, '<i class="fas fa-heart text-red-600">', count=1)
+        self.assertNotContains(response, 'wishlist_products')
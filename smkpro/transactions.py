@@ -0,0 +1,46 @@
+"""
+After-commit work batched per transaction.
+
+Signal handlers fire once per saved row, so saving ten inline variations of a product (or
+cascade-deleting a VariationCategory) would otherwise schedule the same rebuild ten times.
+collect_on_commit() gathers the items of one kind of work in a set attached to the current
+atomic block and registers a single on_commit callback that receives all of them, so the
+items of a rolled-back savepoint are dropped with it. Outside a transaction the callback
+runs immediately, as with transaction.on_commit().
+"""
+from django.db import transaction
+
+
+class _Batch:
+    def __init__(self, key, callback, batches):
+        self.key = key
+        self.callback = callback
+        self.batches = batches
+        self.items = set()
+
+    def __call__(self):
+        if self.batches.get(self.key) is self:
+            del self.batches[self.key]
+        self.callback(self.items)
+
+
+def _is_pending(connection, batch):
+    # Gone from the hook list when its savepoint was rolled back (or it already ran)
+    return any(func is batch for _, func, _ in connection.run_on_commit)
+
+
+def collect_on_commit(name, items, callback, using=None):
+    """ Adds `items` to the `name` batch of the current atomic block; callback(items) runs once on commit. """
+    connection = transaction.get_connection(using)
+    batches = connection.__dict__.setdefault('_on_commit_batches', {})
+    if not connection.run_on_commit:
+        # Nothing pending: forget batches whose savepoint or transaction was rolled back
+        batches.clear()
+    key = (name, tuple(connection.savepoint_ids))
+    batch = batches.get(key)
+    if batch is not None and _is_pending(connection, batch):
+        batch.items.update(items)
+        return
+    batch = batches[key] = _Batch(key, callback, batches)
+    batch.items.update(items)
+    transaction.on_commit(batch, using=using)
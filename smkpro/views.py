@@ -1,21 +1,16 @@
 from django.http import HttpResponse
 from django.shortcuts import render
-from store.models import Product
-from wishlist.models import Wishlist, WishlistItem
-from wishlist.views import _wishlist_id
+from smkpro.cache import get_or_compute
+from store.listing_cache import catalog_version
+from store.models import ProductCard
 
 def home(request):
-    latest_products = Product.objects.order_by('-created_date')[:6]
-    wishlist_ids = []
-    if request.user.is_authenticated:
-        wishlist_items = WishlistItem.objects.filter(user=request.user, is_active=True)
-    else:
-        wishlist_obj, _ = Wishlist.objects.get_or_create(wishlist_id=_wishlist_id(request))
-        wishlist_items = WishlistItem.objects.filter(wishlist=wishlist_obj, is_active=True)
-
-    wishlist_ids = list(wishlist_items.values_list('product_id', flat=True))
+    latest_products = get_or_compute(
+        'home:latest-products',
+        lambda: list(ProductCard.objects.order_by('-created_date')[:6]),
+        version=catalog_version(),
+    )
     context = {
         'products': latest_products,
-        'wishlist_products': wishlist_ids,
     }
     return render(request, 'home.html', context)
\ No newline at end of file
@@ -1,4 +1,5 @@
 from django.contrib import admin
+from .inventory import adjust_stock
 from .models import Product, ProductGallery, Variation, VariationCategory
 import admin_thumbnails
 # Register your models here.
@@ -19,6 +20,18 @@ class ProductAdmin(admin.ModelAdmin):
     search_fields = ('product_name', 'description')
     inlines = [VariationInline, ProductGalleryInline]
 
+    def save_model(self, request, obj, form, change):
+        if not change:
+            return super().save_model(request, obj, form, change)
+        # Never write the stock column back: checkouts may have changed it since the form was
+        # loaded. The admin's edit is applied as a relative adjustment instead, and the row's
+        # stock read back so the listing card is refreshed from it, not from the form.
+        adjust_stock(obj.pk, obj.stock - form.initial['stock'])
+        obj.refresh_from_db(fields=['stock'])
+        fields = [name for name in form.changed_data if name != 'stock']
+        if fields:
+            obj.save(update_fields=fields + ['modified_date'])
+
 admin.site.register(Product, ProductAdmin)
 admin.site.register(Variation)
 admin.site.register(VariationCategory)
@@ -0,0 +1,64 @@
+from django.urls import reverse
+
+from . import images
+from .models import Product, ProductCard
+
+# The srcsets are left out: they are recorded by refresh_card_images() once the derivatives exist.
+CARD_FIELDS = [
+    'product_name', 'url', 'image_url', 'product_price', 'in_stock', 'is_available', 'category_slug', 'created_date',
+]
+
+
+def build_card(product):
+    category_slug = product.category.slug
+    return ProductCard(
+        product_id=product.pk,
+        product_name=product.product_name,
+        url=reverse('product_detail', args=[category_slug, product.slug]),
+        image_url=product.product_image.url if product.product_image else '',
+        product_price=product.product_price,
+        in_stock=product.stock > 0,
+        is_available=product.is_available,
+        category_slug=category_slug,
+        created_date=product.created_date,
+    )
+
+
+def refresh_cards(products):
+    """ Upserts the cards of the given products in one statement. """
+    ProductCard.objects.bulk_create(
+        [build_card(product) for product in products],
+        update_conflicts=True,
+        unique_fields=['product'],
+        update_fields=CARD_FIELDS,
+    )
+
+
+def refresh_category_cards(category):
+    refresh_cards(Product.objects.filter(category=category).select_related('category'))
+
+
+def refresh_all_cards(batch_size=500):
+    products = Product.objects.select_related('category').order_by('id')
+    batch = []
+    for product in products.iterator(chunk_size=batch_size):
+        batch.append(product)
+        if len(batch) == batch_size:
+            refresh_cards(batch)
+            batch = []
+    if batch:
+        refresh_cards(batch)
+
+
+def refresh_card_images(name, widths, product_id=None):
+    """
+    Records the srcsets once the derivatives of the image `name` have been generated, on the
+    cards of every product (or just `product_id`) still using that image.
+    """
+    cards = ProductCard.objects.filter(product__product_image=name)
+    if product_id is not None:
+        cards = cards.filter(product_id=product_id)
+    cards.update(
+        image_srcset=images.srcset(name, widths),
+        image_webp_srcset=images.srcset(name, widths, 'webp'),
+    )
@@ -0,0 +1,92 @@
+from django.db import transaction
+from django.db.models import Count, F, Sum
+
+from smkpro.transactions import collect_on_commit
+from .models import Product, ProductFacet, Variation
+
+
+def rebuild_facets(category_id):
+    """ Recomputes the facet rows of one category with a single aggregate query. """
+    rows = (
+        Variation.objects
+        .filter(product__category_id=category_id, product__is_available=True)
+        .values('category_id', 'value')
+        .annotate(product_count=Count('product', distinct=True))
+        .order_by()
+    )
+    facets = [
+        ProductFacet(
+            category_id=category_id,
+            variation_category_id=row['category_id'],
+            value=row['value'],
+            product_count=row['product_count'],
+        )
+        for row in rows
+    ]
+    with transaction.atomic():
+        ProductFacet.objects.filter(category_id=category_id).delete()
+        ProductFacet.objects.bulk_create(facets)
+
+
+def rebuild_all_facets():
+    category_ids = Product.objects.values_list('category_id', flat=True).distinct().order_by()
+    ProductFacet.objects.exclude(category_id__in=category_ids).delete()
+    for category_id in category_ids:
+        rebuild_facets(category_id)
+
+
+def _rebuild_pending(items):
+    category_ids = {pk for kind, pk in items if kind == 'category'}
+    product_ids = {pk for kind, pk in items if kind == 'product'}
+    if product_ids:
+        # Deleted products are gone by now; their category was scheduled by the product signal
+        category_ids.update(Product.objects.filter(id__in=product_ids).values_list('category_id', flat=True).distinct())
+    for category_id in category_ids:
+        rebuild_facets(category_id)
+
+
+def schedule_facet_rebuild(*category_ids):
+    """ Rebuilds the given categories once the surrounding transaction commits, each one once. """
+    collect_on_commit('store.facets', {('category', pk) for pk in category_ids if pk}, _rebuild_pending)
+
+
+def schedule_product_facet_rebuild(*product_ids):
+    """ Same, for the categories of the given products; they are looked up with one query at commit time. """
+    collect_on_commit('store.facets', {('product', pk) for pk in product_ids if pk}, _rebuild_pending)
+
+
+def _group(rows):
+    filters = {}
+    for row in rows:
+        filters.setdefault(row['name'].lower(), []).append((row['value'], row['count']))
+    return filters
+
+
+def get_facets(category=None):
+    """
+    Reads the facet index: {variation category name (lower case): [(value, product count), ...]}.
+    Per-category counts are summed over the category's subtree (or the whole catalog); a product
+    only belongs to one category, so nothing is counted twice.
+    """
+    facets = ProductFacet.objects.all()
+    if category is not None:
+        facets = facets.filter(category__path__startswith=category.path)
+    rows = (
+        facets
+        .values('value', name=F('variation_category__name'))
+        .annotate(count=Sum('product_count'))
+        .order_by('name', 'value')
+    )
+    return _group(rows)
+
+
+def live_facets(products):
+    """ Same shape as get_facets() but computed from an arbitrary product queryset (e.g. search results). """
+    rows = (
+        Variation.objects
+        .filter(product__in=products.order_by().values('id'))
+        .values('value', name=F('category__name'))
+        .annotate(count=Count('product', distinct=True))
+        .order_by('name', 'value')
+    )
+    return _group(rows)
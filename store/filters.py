@@ -0,0 +1,27 @@
+from django.db.models import Exists, OuterRef
+
+from .models import Variation
+
+
+def filter_by_variations(products, selected_filters):
+    """
+    ANDs the selected facets ({'color': ['Red', 'Blue'], 'size': ['XL']}) with one correlated
+    EXISTS per facet and ORs the values inside a facet. Products are never joined to their
+    variations, so rows don't multiply and no DISTINCT is needed.
+    """
+    for category_name, values in selected_filters.items():
+        products = products.filter(Exists(
+            Variation.objects.filter(
+                product=OuterRef('pk'),
+                category__name__iexact=category_name,
+                value__in=values,
+            )
+        ))
+    return products
+
+
+def legacy_filter_by_variations(products, selected_filters, distinct=True):
+    """ The previous join-per-facet + DISTINCT approach, kept for the benchmark command. """
+    for category_name, values in selected_filters.items():
+        products = products.filter(variations__category__name__iexact=category_name, variations__value__in=values)
+    return products.distinct() if distinct else products
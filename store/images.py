@@ -0,0 +1,145 @@
+import io
+import logging
+import posixpath
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from PIL import Image, ImageOps
+
+# Responsive widths generated for every uploaded product and gallery image.
+DERIVATIVE_WIDTHS = (320, 640, 1024)
+DERIVATIVE_FORMATS = {'webp': 'WEBP', 'jpg': 'JPEG'}
+DERIVATIVE_QUALITY = 80
+ORIENTATION_TAG = 0x0112
+
+logger = logging.getLogger(__name__)
+_executor = None
+
+
+def derivative_name(name, width, ext):
+    """ photos/products/shoe.png -> photos/products/derivatives/shoe-640w.webp """
+    folder, filename = posixpath.split(name)
+    stem = posixpath.splitext(filename)[0]
+    return posixpath.join(folder, 'derivatives', f'{stem}-{width}w.{ext}')
+
+
+def _is_up_to_date(name, derivative, storage):
+    if not storage.exists(derivative):
+        return False
+    try:
+        return storage.get_modified_time(derivative) >= storage.get_modified_time(name)
+    except NotImplementedError:
+        return True
+
+
+def generate_derivatives(name, force=False, storage=None):
+    """
+    Writes the resized WebP/JPEG derivatives of one stored image. Derivatives newer than the
+    source are skipped, and widths larger than the original are never upscaled, which also
+    counts as up to date (only the header is read to tell). Returns
+    (files written, widths available in every format), the latter to be recorded by the
+    caller and passed to srcset(). Safe to run in a worker process: it only touches storage.
+    """
+    storage = storage or default_storage
+    targets = [
+        (width, ext, fmt, derivative_name(name, width, ext))
+        for width in DERIVATIVE_WIDTHS
+        for ext, fmt in DERIVATIVE_FORMATS.items()
+    ]
+    available = {(width, ext) for width, ext, _, _ in targets}
+    if not force:
+        targets = [target for target in targets if not _is_up_to_date(name, target[3], storage)]
+    if not targets:
+        return 0, _complete_widths(available)
+
+    with storage.open(name, 'rb') as source:
+        image = Image.open(source)
+        source_width = _oriented_width(image)
+        available -= {(width, ext) for width, ext in available if width >= source_width}
+        targets = [target for target in targets if target[0] < source_width]
+        if not targets:
+            return 0, _complete_widths(available)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+    generated = 0
+    for width, ext, fmt, target in targets:
+        resized = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+        if fmt == 'JPEG' and resized.mode != 'RGB':
+            resized = resized.convert('RGB')
+        buffer = io.BytesIO()
+        resized.save(buffer, fmt, quality=DERIVATIVE_QUALITY, optimize=True)
+        if storage.exists(target):
+            storage.delete(target)
+        storage.save(target, ContentFile(buffer.getvalue()))
+        generated += 1
+    return generated, _complete_widths(available)
+
+
+def _oriented_width(image):
+    # Width once exif_transpose() has applied the EXIF orientation (5-8 rotate by 90 degrees).
+    return image.height if image.getexif().get(ORIENTATION_TAG) in (5, 6, 7, 8) else image.width
+
+
+def _complete_widths(available):
+    return tuple(width for width in DERIVATIVE_WIDTHS if all((width, ext) in available for ext in DERIVATIVE_FORMATS))
+
+
+def srcset(name, widths, ext='jpg', storage=None):
+    """ `srcset` attribute value for the recorded derivative `widths` of `name`, or '' if there are none. """
+    if not name or not widths:
+        return ''
+    storage = storage or default_storage
+    return ', '.join(f'{storage.url(derivative_name(name, width, ext))} {width}w' for width in sorted(widths))
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.IMAGE_DERIVATIVE_WORKERS)
+    return _executor
+
+
+def schedule_derivatives(name, on_done=None):
+    """
+    Generates derivatives for `name` after the current transaction commits, in the process
+    pool so admin saves don't wait on Pillow. With IMAGE_DERIVATIVE_WORKERS = 0 it runs inline.
+    `on_done(widths)` is called once the files exist. A missing or unreadable upload is
+    logged; it never fails the save that scheduled it.
+    """
+    if not name:
+        return
+
+    def submit():
+        if not settings.IMAGE_DERIVATIVE_WORKERS:
+            try:
+                _, widths = generate_derivatives(name)
+                if on_done:
+                    on_done(widths)
+            except Exception:
+                logger.exception('Could not generate the derivatives of %s', name)
+            return
+        future = _get_executor().submit(generate_derivatives, name)
+        future.add_done_callback(lambda future: _run_callback(future, name, on_done))
+
+    transaction.on_commit(submit)
+
+
+def _run_callback(future, name, on_done):
+    # Runs on the executor's result thread, which gets its own DB connection.
+    if future.exception() is not None:
+        logger.error('Could not generate the derivatives of %s', name, exc_info=future.exception())
+        return
+    if on_done is None:
+        return
+    try:
+        on_done(future.result()[1])
+    except Exception:
+        logger.exception('Could not record the derivatives of %s', name)
+    finally:
+        connection.close()
@@ -0,0 +1,107 @@
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, Exists, F, IntegerField, OuterRef, Q, Value, When
+
+from .listing_cache import bump_catalog_version
+from .models import Product, ProductCard
+
+
+class InsufficientStock(Exception):
+    """
+    Raised when some lines can't be fulfilled; `shortages` maps product id -> (requested, available)
+    and `names` product id -> product name, so callers can report it without another query.
+    """
+
+    def __init__(self, shortages, names=None):
+        self.shortages = shortages
+        self.names = names or {}
+        super().__init__(f'Insufficient stock for products {sorted(shortages)}')
+
+    def describe(self):
+        return ", ".join(
+            f"{self.names.get(product_id, product_id)} (only {available} left)"
+            for product_id, (_, available) in sorted(self.shortages.items())
+        )
+
+
+def _totals(lines):
+    """ Sums (product_id, quantity) lines per product, a product can appear once per variation. """
+    totals = Counter()
+    for product_id, quantity in lines:
+        totals[product_id] += quantity
+    return {product_id: quantity for product_id, quantity in totals.items() if quantity}
+
+
+def _quantity_case(totals):
+    return Case(
+        *[When(pk=product_id, then=Value(quantity)) for product_id, quantity in totals.items()],
+        output_field=IntegerField(),
+    )
+
+
+def _stock_changed(product_ids):
+    """
+    Keeps the listing cards' stock flag in sync. Only a product selling out or coming back in
+    stock changes what the cached pages show, so most sales leave the catalog version alone.
+    """
+    flipped = (
+        ProductCard.objects
+        .filter(product_id__in=product_ids)
+        .filter(Q(in_stock=True, product__stock__lte=0) | Q(in_stock=False, product__stock__gt=0))
+        .update(in_stock=Exists(Product.objects.filter(pk=OuterRef('product_id'), stock__gt=0)))
+    )
+    if flipped:
+        transaction.on_commit(bump_catalog_version)
+
+
+def reserve_stock(lines):
+    """
+    Decrements stock for all (product_id, quantity) lines with a single
+    UPDATE ... SET stock = stock - qty WHERE stock >= qty. All-or-nothing: if any product is
+    short nothing is changed and InsufficientStock reports every short product.
+    """
+    totals = _totals(lines)
+    if not totals:
+        return
+    quantity = _quantity_case(totals)
+    with transaction.atomic():
+        updated = (
+            Product.objects
+            .filter(pk__in=totals, stock__gte=quantity)
+            .update(stock=F('stock') - quantity)
+        )
+        if updated == len(totals):
+            _stock_changed(totals)
+            return
+        transaction.set_rollback(True)
+
+    # Names are read here, while queries are still allowed: callers roll their transaction back
+    names, available = {}, {}
+    for product_id, name, stock in Product.objects.filter(pk__in=totals).values_list('id', 'product_name', 'stock'):
+        names[product_id], available[product_id] = name, stock
+    raise InsufficientStock(
+        {
+            product_id: (requested, available.get(product_id, 0))
+            for product_id, requested in totals.items()
+            if available.get(product_id, 0) < requested
+        },
+        names,
+    )
+
+
+def release_stock(lines):
+    """ Puts stock back (e.g. a cancelled order) with a single UPDATE. """
+    totals = _totals(lines)
+    if not totals:
+        return
+    Product.objects.filter(pk__in=totals).update(stock=F('stock') + _quantity_case(totals))
+    _stock_changed(totals)
+
+
+def adjust_stock(product_id, delta):
+    """ Relative correction (admin edits) that doesn't overwrite concurrent checkouts. """
+    if not delta:
+        return
+    Product.objects.filter(pk=product_id).update(stock=F('stock') + delta)
+    _stock_changed([product_id])
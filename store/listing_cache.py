@@ -0,0 +1,87 @@
+import hashlib
+import random
+
+from smkpro.cache import add_to_counter, bump_version, get_or_compute, get_version, read_counter
+from .models import Counter
+
+CATALOG_VERSION_KEY = 'store:catalog-version'
+STATS_KEY = 'store:listing-cache:{}'
+LISTING_CACHE_TIMEOUT = 60 * 15
+# Larger result sets are not cached; the view pages them straight from the database instead.
+MAX_CACHED_IDS = 5000
+# Hits and misses are counted for about one request in STATS_SAMPLE (weighted back up), so
+# a listing served from the cache does not pay for a write.
+STATS_SAMPLE = 100
+TOO_LARGE = 'too-large'
+
+
+def catalog_version():
+    return get_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    """ Invalidates every cached listing at once without scanning or deleting keys. """
+    return bump_version(CATALOG_VERSION_KEY)
+
+
+def listing_key(category_slug=None, filters=None, min_price=None, max_price=None, keyword=None):
+    """ Cache key for a normalized listing query; entries carry the catalog version they were built for. """
+    normalized_filters = sorted(
+        (name.lower(), tuple(sorted(values))) for name, values in (filters or {}).items() if values
+    )
+    parts = repr((
+        category_slug or '',
+        normalized_filters,
+        min_price or '',
+        max_price or '',
+        (keyword or '').strip().lower(),
+    ))
+    digest = hashlib.md5(parts.encode()).hexdigest()
+    return f'store:listing:{digest}'
+
+
+def _record(outcome):
+    if random.randrange(STATS_SAMPLE) == 0:
+        add_to_counter(STATS_KEY.format(outcome), STATS_SAMPLE)
+
+
+def get_listing_ids(key, queryset, fallback=None):
+    """
+    Returns the ordered product ids for `queryset`, served from the cache when possible,
+    or None when the result set is too large to cache. One worker at a time rebuilds an entry;
+    the list of an older catalog version is never served while it does (smkpro.cache).
+
+    `fallback()` may return a queryset to list instead when `queryset` is empty (e.g. typo
+    matches); it only runs when the entry is rebuilt.
+    """
+    computed = []
+
+    def build():
+        computed.append(True)
+        ids = list(queryset.values_list('id', flat=True)[:MAX_CACHED_IDS + 1])
+        if not ids and fallback is not None:
+            alternative = fallback()
+            if alternative is not None:
+                ids = list(alternative.values_list('id', flat=True)[:MAX_CACHED_IDS + 1])
+        return TOO_LARGE if len(ids) > MAX_CACHED_IDS else ids
+
+    ids = get_or_compute(key, build, timeout=LISTING_CACHE_TIMEOUT, version=catalog_version())
+    _record('misses' if computed else 'hits')
+    return None if ids == TOO_LARGE else ids
+
+
+def cache_stats():
+    """ Estimated hit and miss counts (see STATS_SAMPLE). """
+    hits = read_counter(STATS_KEY.format('hits'))
+    misses = read_counter(STATS_KEY.format('misses'))
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': hits / total if total else 0.0,
+        'catalog_version': catalog_version(),
+    }
+
+
+def reset_cache_stats():
+    Counter.objects.filter(key__in=[STATS_KEY.format('hits'), STATS_KEY.format('misses')]).delete()
@@ -0,0 +1,52 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from store.cards import refresh_card_images
+from store.images import generate_derivatives
+from store.matrix import rebuild_matrix
+from store.models import Product, ProductGallery
+
+
+class Command(BaseCommand):
+    help = 'Generates missing or outdated responsive derivatives for all product and gallery images.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Number of worker processes.')
+        parser.add_argument('--force', action='store_true', help='Regenerate derivatives that are up to date.')
+
+    def handle(self, *args, **options):
+        names = set(Product.objects.exclude(product_image='').values_list('product_image', flat=True))
+        names |= set(ProductGallery.objects.exclude(image='').values_list('image', flat=True))
+        names = sorted(names)
+        self.stdout.write(f'Checking {len(names)} images with {options["workers"]} workers...')
+
+        started = time.monotonic()
+        generated = skipped = failed = 0
+        widths = {}
+        with ProcessPoolExecutor(max_workers=options['workers']) as executor:
+            futures = {name: executor.submit(generate_derivatives, name, options['force']) for name in names}
+            for name, future in futures.items():
+                try:
+                    count, widths[name] = future.result()
+                except Exception as exc:
+                    failed += 1
+                    self.stderr.write(f'{name}: {exc}')
+                    continue
+                if count:
+                    generated += count
+                else:
+                    skipped += 1
+
+        # Record what exists so the cards and product pages never have to ask the storage
+        for name, image_widths in widths.items():
+            refresh_card_images(name, image_widths)
+            ProductGallery.objects.filter(image=name).update(derivative_widths=list(image_widths))
+        for product_id in ProductGallery.objects.values_list('product_id', flat=True).distinct().order_by():
+            rebuild_matrix(product_id)
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'{generated} derivatives written, {skipped} images needed no work, '
+            f'{failed} failed in {elapsed:.1f}s.'
+        ))
@@ -0,0 +1,113 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from category.models import Category
+from store.filters import filter_by_variations, legacy_filter_by_variations
+from store.models import Product, Variation, VariationCategory
+
+FACETS = {
+    'Color': ['Red', 'Blue', 'Green', 'Black', 'White', 'Yellow', 'Pink', 'Grey', 'Brown', 'Purple'],
+    'Size': ['XS', 'S', 'M', 'L', 'XL', 'XXL'],
+    'Material': ['Cotton', 'Linen', 'Silk', 'Wool', 'Denim', 'Leather', 'Polyester', 'Nylon'],
+}
+
+SELECTIONS = [
+    {'color': ['Red', 'Blue']},
+    {'color': ['Red', 'Blue'], 'size': ['M', 'L']},
+    {'color': ['Red', 'Blue'], 'size': ['M', 'L'], 'material': ['Cotton', 'Linen']},
+]
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        'Compares the EXISTS variation filter with the legacy join + DISTINCT filter on a synthetic '
+        'catalog. Everything is created inside a transaction that is rolled back afterwards.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=50_000)
+        parser.add_argument('--variations', type=int, default=500_000, help='Total number of variations.')
+        parser.add_argument('--repeat', type=int, default=5, help='Timed runs per query (best is reported).')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self._build_catalog(options['products'], options['variations'], options['seed'])
+                self._run(options['repeat'])
+                raise _Rollback
+        except _Rollback:
+            self.stdout.write('Synthetic catalog rolled back.')
+
+    def _build_catalog(self, product_total, variation_total, seed):
+        rng = random.Random(seed)
+        started = time.monotonic()
+        category = Category.objects.create(category_name='Benchmark', slug='benchmark')
+        variation_categories = {
+            name: VariationCategory.objects.get_or_create(name=name)[0] for name in FACETS
+        }
+        Product.objects.bulk_create(
+            (
+                Product(
+                    product_name=f'Benchmark product {i}', slug=f'benchmark-product-{i}',
+                    product_price=rng.randint(100, 5000), stock=10, category=category,
+                    product_image='photos/products/benchmark.jpg',
+                )
+                for i in range(product_total)
+            ),
+            batch_size=2000,
+        )
+        product_ids = list(Product.objects.filter(category=category).values_list('id', flat=True))
+        per_product = max(variation_total // max(len(product_ids), 1), 1)
+
+        batch = []
+        for product_id in product_ids:
+            for _ in range(per_product):
+                name = rng.choice(list(FACETS))
+                batch.append(Variation(
+                    product_id=product_id,
+                    category=variation_categories[name],
+                    value=rng.choice(FACETS[name]),
+                ))
+            if len(batch) >= 10_000:
+                Variation.objects.bulk_create(batch, batch_size=5000)
+                batch = []
+        Variation.objects.bulk_create(batch, batch_size=5000)
+        self.stdout.write(
+            f'Built {len(product_ids)} products / {len(product_ids) * per_product} variations '
+            f'in {time.monotonic() - started:.1f}s.'
+        )
+        self.category = category
+
+    def _time(self, queryset, repeat):
+        best, ids = None, None
+        for _ in range(repeat):
+            started = time.perf_counter()
+            ids = list(queryset.values_list('id', flat=True))
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best, len(ids)
+
+    def _run(self, repeat):
+        base = Product.objects.filter(category=self.category, is_available=True).order_by('id')
+        self.stdout.write(f'{"facets":>6} {"legacy ms":>10} {"exists ms":>10} {"joined rows":>12} {"results":>8}')
+        for selection in SELECTIONS:
+            legacy = legacy_filter_by_variations(base, selection)
+            engine = filter_by_variations(base, selection)
+            legacy_time, legacy_count = self._time(legacy, repeat)
+            engine_time, engine_count = self._time(engine, repeat)
+            # Rows the legacy query produces before DISTINCT collapses them.
+            joined_rows = legacy_filter_by_variations(base, selection, distinct=False).order_by().count()
+            if legacy_count != engine_count:
+                self.stderr.write(f'Result mismatch for {selection}: {legacy_count} != {engine_count}')
+            self.stdout.write(
+                f'{len(selection):>6} {legacy_time * 1000:>10.1f} {engine_time * 1000:>10.1f} '
+                f'{joined_rows:>12} {engine_count:>8}'
+            )
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.recommendations import ORDERS_PER_BATCH, TOP_K, update_cooccurrence
+
+
+class Command(BaseCommand):
+    help = 'Updates the "frequently bought together" matrix from orders paid since the last run.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Discard the matrix and rebuild it from all orders.')
+        parser.add_argument('--top-k', type=int, default=TOP_K, help='Neighbours stored per product.')
+        parser.add_argument('--batch-size', type=int, default=ORDERS_PER_BATCH, help='Orders per database batch.')
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        orders, products = update_cooccurrence(
+            full=options['full'], top_k=options['top_k'], orders_per_batch=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'{orders} orders processed, {products} products re-ranked in {time.monotonic() - started:.1f}s.'
+        ))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from store.listing_cache import cache_stats, reset_cache_stats
+
+
+class Command(BaseCommand):
+    help = 'Shows (sampled) hit/miss counts of the store listing result cache.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reset', action='store_true', help='Reset the counters after printing them.')
+
+    def handle(self, *args, **options):
+        stats = cache_stats()
+        self.stdout.write(
+            f"hits={stats['hits']} misses={stats['misses']} "
+            f"hit_rate={stats['hit_rate']:.1%} catalog_version={stats['catalog_version']}"
+        )
+        if options['reset']:
+            reset_cache_stats()
+            self.stdout.write(self.style.SUCCESS('Counters reset.'))
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from store.facets import rebuild_all_facets
+from store.models import ProductFacet
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the store listing facet index from scratch.'
+
+    def handle(self, *args, **options):
+        rebuild_all_facets()
+        self.stdout.write(self.style.SUCCESS(f'Facet index rebuilt: {ProductFacet.objects.count()} rows.'))
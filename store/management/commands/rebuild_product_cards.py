@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from store.cards import refresh_all_cards
+from store.models import ProductCard
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the denormalized product cards used by the listings.'
+
+    def handle(self, *args, **options):
+        refresh_all_cards()
+        self.stdout.write(self.style.SUCCESS(f'{ProductCard.objects.count()} product cards rebuilt.'))
@@ -0,0 +1,63 @@
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from smkpro.transactions import collect_on_commit
+from . import images
+from .models import ProductGallery, Variation, VariationMatrix
+
+# Bump when the shape of VariationMatrix.data changes; outdated rows are rebuilt on first read.
+MATRIX_FORMAT = 1
+
+
+def build_matrix_data(product_id):
+    variations = {}
+    active = (
+        Variation.objects.filter(product_id=product_id, is_active=True)
+        .order_by('id')
+        .values_list('category__name', 'value')
+    )
+    for category, value in active:
+        variations.setdefault(category, []).append(value)
+
+    gallery = [
+        {'url': image.image.url, 'srcset': images.srcset(image.image.name, image.derivative_widths)}
+        for image in ProductGallery.objects.filter(product_id=product_id).order_by('id')
+    ]
+    # Pairs rather than a dict: jsonb does not keep key order.
+    return {'variations': [[category, values] for category, values in variations.items()], 'gallery': gallery}
+
+
+def rebuild_matrix(product_id):
+    """ Stores a fresh matrix for one product and bumps its version. """
+    data = build_matrix_data(product_id)
+    fields = {'data': data, 'format': MATRIX_FORMAT}
+    if VariationMatrix.objects.filter(product_id=product_id).update(version=F('version') + 1, **fields):
+        return data
+    try:
+        with transaction.atomic():
+            VariationMatrix.objects.create(product_id=product_id, **fields)
+    except IntegrityError:
+        # Created concurrently; ours is at least as fresh.
+        VariationMatrix.objects.filter(product_id=product_id).update(version=F('version') + 1, **fields)
+    return data
+
+
+def _rebuild_matrices(product_ids):
+    for product_id in product_ids:
+        rebuild_matrix(product_id)
+
+
+def schedule_matrix_rebuild(*product_ids):
+    """ Rebuilds the matrices of the given products once the surrounding transaction commits, each one once. """
+    collect_on_commit('store.matrix', {pk for pk in product_ids if pk}, _rebuild_matrices)
+
+
+def get_matrix(product):
+    """ Matrix of a product loaded with select_related('variation_matrix'); built on first use. """
+    try:
+        matrix = product.variation_matrix
+    except VariationMatrix.DoesNotExist:
+        matrix = None
+    if matrix is None or matrix.format != MATRIX_FORMAT:
+        return rebuild_matrix(product.pk)
+    return matrix.data
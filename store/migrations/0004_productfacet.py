@@ -0,0 +1,53 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def populate_facets(apps, schema_editor):
+    Variation = apps.get_model('store', 'Variation')
+    ProductFacet = apps.get_model('store', 'ProductFacet')
+    rows = (
+        Variation.objects
+        .filter(product__is_available=True)
+        .values('product__category_id', 'category_id', 'value')
+        .annotate(product_count=Count('product', distinct=True))
+        .order_by()
+    )
+    ProductFacet.objects.bulk_create([
+        ProductFacet(
+            category_id=row['product__category_id'],
+            variation_category_id=row['category_id'],
+            value=row['value'],
+            product_count=row['product_count'],
+        )
+        for row in rows
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('category', '0001_initial'),
+        ('store', '0003_alter_productgallery_options_product_weight'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductFacet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('value', models.CharField(max_length=100)),
+                ('product_count', models.PositiveIntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='facets', to='category.category')),
+                ('variation_category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='facets', to='store.variationcategory')),
+            ],
+            options={
+                'verbose_name': 'ProductFacet',
+                'verbose_name_plural': 'product_facets',
+                'constraints': [models.UniqueConstraint(fields=('category', 'variation_category', 'value'), name='unique_product_facet')],
+            },
+        ),
+        migrations.RunPython(populate_facets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:10
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def create_search_indexes(apps, schema_editor):
+    # GIN indexes and pg_trgm only exist on PostgreSQL; SQLite uses the fallback in store.search.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS store_product_search_vector_gin '
+        'ON store_product USING gin (search_vector)'
+    )
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS store_product_name_trgm '
+        'ON store_product USING gin (product_name gin_trgm_ops)'
+    )
+    schema_editor.execute(
+        "UPDATE store_product SET search_vector = "
+        "setweight(to_tsvector(COALESCE(product_name, '')), 'A') || "
+        "setweight(to_tsvector(COALESCE(description, '')), 'B')"
+    )
+
+
+def drop_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS store_product_search_vector_gin')
+    schema_editor.execute('DROP INDEX IF EXISTS store_product_name_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0004_productfacet'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.urls import reverse
+
+
+def populate_cards(apps, schema_editor):
+    Product = apps.get_model('store', 'Product')
+    ProductCard = apps.get_model('store', 'ProductCard')
+    cards = []
+    for product in Product.objects.select_related('category').iterator():
+        cards.append(ProductCard(
+            product_id=product.pk,
+            product_name=product.product_name,
+            url=reverse('product_detail', args=[product.category.slug, product.slug]),
+            image_url=product.product_image.url if product.product_image else '',
+            product_price=product.product_price,
+            in_stock=product.stock > 0,
+            is_available=product.is_available,
+            category_slug=product.category.slug,
+            created_date=product.created_date,
+        ))
+    ProductCard.objects.bulk_create(cards, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0005_product_search_vector'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductCard',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='card', serialize=False, to='store.product')),
+                ('product_name', models.CharField(max_length=100)),
+                ('url', models.CharField(max_length=255)),
+                ('image_url', models.CharField(max_length=255)),
+                ('product_price', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('in_stock', models.BooleanField(default=True)),
+                ('is_available', models.BooleanField(default=True)),
+                ('category_slug', models.SlugField(max_length=100)),
+                ('created_date', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'verbose_name': 'ProductCard',
+                'verbose_name_plural': 'product_cards',
+            },
+        ),
+        migrations.RunPython(populate_cards, migrations.RunPython.noop),
+    ]
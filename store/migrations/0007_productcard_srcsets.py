@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0006_productcard'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productcard',
+            name='image_srcset',
+            field=models.TextField(blank=True),
+        ),
+        migrations.AddField(
+            model_name='productcard',
+            name='image_webp_srcset',
+            field=models.TextField(blank=True),
+        ),
+    ]
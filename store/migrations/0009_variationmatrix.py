@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0008_recommendations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VariationMatrix',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='variation_matrix', serialize=False, to='store.product')),
+                ('data', models.JSONField(default=dict)),
+                ('version', models.PositiveIntegerField(default=1)),
+                ('format', models.PositiveSmallIntegerField(default=1)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'VariationMatrix',
+                'verbose_name_plural': 'variation_matrices',
+            },
+        ),
+    ]
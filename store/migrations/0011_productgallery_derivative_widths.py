@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0009_variationmatrix'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='productgallery',
+            name='derivative_widths',
+            field=models.JSONField(blank=True, default=list, editable=False),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:45
+
+from django.db import migrations, models
+
+
+def reset_matrix(apps, schema_editor):
+    # An order-line id can't be turned into a time watermark; the next run recounts from scratch
+    apps.get_model('store', 'ProductCooccurrence').objects.all().delete()
+    apps.get_model('store', 'RecommendationCheckpoint').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0011_productgallery_derivative_widths'),
+    ]
+
+    operations = [
+        migrations.RunPython(reset_matrix, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='recommendationcheckpoint',
+            name='last_order_product_id',
+        ),
+        migrations.AddField(
+            model_name='recommendationcheckpoint',
+            name='processed_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -1,3 +1,4 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 from category.models import Category
 
@@ -20,6 +21,8 @@ class Product(models.Model):
     category = models.ForeignKey(Category, on_delete=models.CASCADE)
     created_date = models.DateTimeField(auto_now_add=True)
     modified_date = models.DateTimeField(auto_now=True)
+    # Maintained by store.search on PostgreSQL; stays empty on other databases.
+    search_vector = SearchVectorField(null=True, editable=False)
 
     def get_url(self):
         from django.urls import reverse
@@ -53,6 +56,8 @@ class Variation(models.Model):
 class ProductGallery(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="gallery")
     image = models.ImageField(upload_to='store/products', max_length=255)
+    # Responsive widths generated for `image`, recorded by store.images.schedule_derivatives
+    derivative_widths = models.JSONField(default=list, blank=True, editable=False)
     created_date = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -60,4 +65,112 @@ class ProductGallery(models.Model):
         verbose_name_plural = 'product_gallery'
 
     def __str__(self):
-        return self.product.product_name
\ No newline at end of file
+        return self.product.product_name
+
+class ProductFacet(models.Model):
+    """ Precomputed product counts per (category, variation category, value), kept current by store.signals. """
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name="facets")
+    variation_category = models.ForeignKey(VariationCategory, on_delete=models.CASCADE, related_name="facets")
+    value = models.CharField(max_length=100)
+    product_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'ProductFacet'
+        verbose_name_plural = 'product_facets'
+        constraints = [
+            models.UniqueConstraint(fields=['category', 'variation_category', 'value'], name='unique_product_facet'),
+        ]
+
+    def __str__(self):
+        return f"{self.category_id} / {self.variation_category_id}: {self.value} ({self.product_count})"
+
+
+class ProductCard(models.Model):
+    """ Denormalized listing card (home, store, wishlist), refreshed by store.signals. """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name="card")
+    product_name = models.CharField(max_length=100)
+    url = models.CharField(max_length=255)
+    image_url = models.CharField(max_length=255)
+    image_srcset = models.TextField(blank=True)
+    image_webp_srcset = models.TextField(blank=True)
+    product_price = models.DecimalField(max_digits=10, decimal_places=2)
+    in_stock = models.BooleanField(default=True)
+    is_available = models.BooleanField(default=True)
+    category_slug = models.SlugField(max_length=100)
+    created_date = models.DateTimeField(db_index=True)
+
+    class Meta:
+        verbose_name = 'ProductCard'
+        verbose_name_plural = 'product_cards'
+
+    def __str__(self):
+        return self.product_name
+
+
+class ProductCooccurrence(models.Model):
+    """ Sparse product x product matrix: how many paid baskets contained both products. """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'ProductCooccurrence'
+        verbose_name_plural = 'product_cooccurrences'
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'related'], name='unique_product_cooccurrence'),
+        ]
+
+
+class RelatedProduct(models.Model):
+    """ Top-K "frequently bought together" neighbours per product, rebuilt by store.recommendations. """
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="related_products")
+    related = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="+")
+    score = models.PositiveIntegerField()
+    rank = models.PositiveSmallIntegerField()
+
+    class Meta:
+        verbose_name = 'RelatedProduct'
+        verbose_name_plural = 'related_products'
+        ordering = ['rank']
+        constraints = [
+            models.UniqueConstraint(fields=['product', 'rank'], name='unique_related_product_rank'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} -> {self.related_id} ({self.score})"
+
+
+class RecommendationCheckpoint(models.Model):
+    """ Payments made before `processed_until` are folded into the co-occurrence matrix, so batch runs are incremental. """
+    name = models.CharField(max_length=50, unique=True)
+    processed_until = models.DateTimeField(blank=True, null=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name}: {self.processed_until}"
+
+
+class VariationMatrix(models.Model):
+    """ Precomputed product page data (active variation values, gallery images), rebuilt by store.signals. """
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name="variation_matrix")
+    # {'variations': [[category, [values...]], ...], 'gallery': [{'url': ..., 'srcset': ...}, ...]}
+    data = models.JSONField(default=dict)
+    version = models.PositiveIntegerField(default=1)
+    format = models.PositiveSmallIntegerField(default=1)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'VariationMatrix'
+        verbose_name_plural = 'variation_matrices'
+
+    def __str__(self):
+        return f"{self.product_id} v{self.version}"
+
+
+class Counter(models.Model):
+    """ Shared counter that never expires (cache versions, listing cache statistics); see smkpro.cache. """
+    key = models.CharField(max_length=100, primary_key=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.key} = {self.value}"
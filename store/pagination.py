@@ -0,0 +1,183 @@
+import json
+
+from django.core import signing
+from django.db import connections
+from django.db.models import Q
+
+CURSOR_SALT = 'store.pagination.cursor'
+# Non-PostgreSQL databases count at most this many rows when an estimate is requested.
+APPROXIMATE_COUNT_CAP = 1000
+
+
+def encode_cursor(key, number, direction):
+    """ Opaque, tamper-proof token for the row `key` = (order value, id). """
+    return signing.dumps({'k': key, 'n': number, 'd': direction}, salt=CURSOR_SALT, compress=True)
+
+
+def decode_cursor(token):
+    try:
+        data = signing.loads(token, salt=CURSOR_SALT)
+        return data['k'], int(data['n']), data['d']
+    except (signing.BadSignature, KeyError, TypeError, ValueError):
+        return None
+
+
+class CursorPage:
+    """ Page of results with the same template surface as django.core.paginator.Page, minus page_range. """
+
+    is_cursor = True
+
+    def __init__(self, object_list, number, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.number = number
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.number > 1
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+    def previous_page_query(self):
+        # Page 1 is simply the listing without a cursor.
+        if self.number == 2 or self.previous_cursor is None:
+            return ''
+        return f'cursor={self.previous_cursor}'
+
+    def next_page_query(self):
+        return f'cursor={self.next_cursor}' if self.next_cursor else ''
+
+    @property
+    def page_links(self):
+        """ Cursor equivalent of paginator.page_range: first, previous, current and next page. """
+        links = []
+        if self.number > 2:
+            links.append({'number': 1, 'query': '', 'is_current': False})
+        if self.has_previous():
+            links.append({'number': self.number - 1, 'query': self.previous_page_query(), 'is_current': False})
+        links.append({'number': self.number, 'query': '', 'is_current': True})
+        if self.has_next():
+            links.append({'number': self.number + 1, 'query': self.next_page_query(), 'is_current': False})
+        return links
+
+
+class CursorPaginator:
+    """
+    Keyset pagination over (order_field, id). Never counts or OFFSETs: each page is
+    one indexed range query that fetches per_page + 1 rows to learn whether more exist.
+    """
+
+    def __init__(self, queryset, per_page, order_field='id'):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.descending = order_field.startswith('-')
+        self.field_name = order_field.lstrip('-')
+        self.field = queryset.model._meta.get_field(self.field_name)
+
+    def _key(self, obj):
+        value = getattr(obj, self.field.attname)
+        return [None if value is None else str(value), obj.pk]
+
+    def _ordering(self, reverse=False):
+        descending = self.descending != reverse
+        prefix = '-' if descending else ''
+        if self.field_name == 'id':
+            return [f'{prefix}id']
+        return [f'{prefix}{self.field_name}', f'{prefix}id']
+
+    def _after(self, key, reverse=False):
+        """ Rows strictly after `key` in the (possibly reversed) ordering. """
+        value, pk = self.field.to_python(key[0]), int(key[1])
+        op = 'lt' if self.descending != reverse else 'gt'
+        if self.field_name == 'id':
+            return Q(**{f'id__{op}': pk})
+        return Q(**{f'{self.field_name}__{op}': value}) | Q(**{self.field_name: value, f'id__{op}': pk})
+
+    def get_page(self, token=None):
+        cursor = decode_cursor(token) if token else None
+        if cursor is None:
+            rows = list(self.queryset.order_by(*self._ordering())[:self.per_page + 1])
+            number, backwards = 1, False
+        else:
+            key, number, direction = cursor
+            backwards = direction == 'p'
+            rows = list(
+                self.queryset.filter(self._after(key, reverse=backwards))
+                .order_by(*self._ordering(reverse=backwards))[:self.per_page + 1]
+            )
+
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backwards:
+            rows.reverse()
+            has_next = True
+            number = number if has_more else 1
+        else:
+            has_next = has_more
+        if not rows:
+            return CursorPage([], number)
+
+        next_cursor = encode_cursor(self._key(rows[-1]), number + 1, 'n') if has_next else None
+        previous_cursor = encode_cursor(self._key(rows[0]), number - 1, 'p') if number > 1 else None
+        return CursorPage(rows, number, next_cursor, previous_cursor)
+
+
+def approximate_count(queryset):
+    """
+    Cheap row-count estimate as (count, is_exact). PostgreSQL reads the planner's estimate
+    from EXPLAIN; other databases count up to APPROXIMATE_COUNT_CAP rows.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        sql, params = queryset.order_by().query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+            plan = cursor.fetchone()[0]
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+        return int(plan[0]['Plan']['Plan Rows']), False
+
+    count = queryset.order_by()[:APPROXIMATE_COUNT_CAP].count()
+    return count, count < APPROXIMATE_COUNT_CAP
+
+
+class IdListPaginator:
+    """
+    Cursor pagination over an already ordered list of primary keys (e.g. a cached result set).
+    Only the ids of the requested page are hydrated, with one `id__in` query.
+    """
+
+    def __init__(self, ids, per_page, hydrate):
+        self.ids = ids
+        self.per_page = per_page
+        self.hydrate = hydrate
+
+    def get_page(self, token=None):
+        cursor = decode_cursor(token) if token else None
+        positions = {pk: index for index, pk in enumerate(self.ids)}
+        start = 0
+        if cursor is not None:
+            key, _, direction = cursor
+            anchor = positions.get(key[1])
+            if anchor is not None:
+                start = max(anchor - self.per_page, 0) if direction == 'p' else anchor + 1
+
+        page_ids = self.ids[start:start + self.per_page]
+        number = start // self.per_page + 1
+        if not page_ids:
+            return CursorPage([], number)
+
+        has_next = start + self.per_page < len(self.ids)
+        next_cursor = encode_cursor([None, page_ids[-1]], number + 1, 'n') if has_next else None
+        previous_cursor = encode_cursor([None, page_ids[0]], number - 1, 'p') if start > 0 else None
+        return CursorPage(self.hydrate(page_ids), number, next_cursor, previous_cursor)
@@ -0,0 +1,135 @@
+from collections import Counter, defaultdict
+from datetime import timedelta
+from itertools import permutations
+
+from django.apps import apps
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import ProductCooccurrence, RecommendationCheckpoint, RelatedProduct
+
+TOP_K = 8
+CHECKPOINT_NAME = 'cooccurrence'
+# Orders folded into the matrix per database round trip.
+ORDERS_PER_BATCH = 5000
+# Pairs per INSERT ... ON CONFLICT statement (three parameters each, within SQLite's limit).
+UPSERT_BATCH = 300
+# Longer than any checkout transaction stays open.
+COMMIT_MARGIN = timedelta(minutes=10)
+
+
+def _iter_payment_batches(since, until, batch_size):
+    """
+    Yields (payment ids, watermark) for payments made in [since, until), oldest first, about
+    batch_size at a time. A batch never splits payments sharing a timestamp, so everything
+    before its watermark has been yielded once the batch is folded in.
+    """
+    Payment = apps.get_model('orders', 'Payment')
+    payments = Payment.objects.filter(created_at__lt=until)
+    if since is not None:
+        payments = payments.filter(created_at__gte=since)
+    batch, previous = [], None
+    for payment_id, created_at in payments.order_by('created_at', 'id').values_list('id', 'created_at').iterator(
+        chunk_size=batch_size
+    ):
+        if len(batch) >= batch_size and created_at != previous:
+            yield batch, created_at
+            batch = []
+        batch.append(payment_id)
+        previous = created_at
+    yield batch, until
+
+
+def _baskets(payment_ids):
+    """
+    Product ids per placed order for the given payments, grouped by order. Cancelled orders
+    and failed payments are left out (a full rebuild drops them if they fail later).
+    """
+    OrderProduct = apps.get_model('orders', 'OrderProduct')
+    lines = (
+        OrderProduct.objects
+        .filter(payment_id__in=payment_ids, ordered=True, order__is_ordered=True)
+        .exclude(order__status='Cancelled')
+        .exclude(payment__status='Failed')
+    )
+    baskets = defaultdict(set)
+    for order_id, product_id in lines.values_list('order_id', 'product_id'):
+        baskets[order_id].add(product_id)
+    return baskets.values()
+
+
+def _apply_counts(pair_counts):
+    """
+    Adds a {(product, related): count} batch onto the stored matrix. Each pair is upserted
+    with count = count + n in the database, so runs that overlap add up instead of one
+    overwriting the other's counts.
+    """
+    quote = connection.ops.quote_name
+    table = quote(ProductCooccurrence._meta.db_table)
+    count = quote('count')
+    rows = [(product_id, related_id, n) for (product_id, related_id), n in pair_counts.items()]
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), UPSERT_BATCH):
+            chunk = rows[start:start + UPSERT_BATCH]
+            cursor.execute(
+                f"INSERT INTO {table} ({quote('product_id')}, {quote('related_id')}, {count}) "
+                f"VALUES {', '.join(['(%s, %s, %s)'] * len(chunk))} "
+                f"ON CONFLICT ({quote('product_id')}, {quote('related_id')}) "
+                f"DO UPDATE SET {count} = {table}.{count} + excluded.{count}",
+                [value for row in chunk for value in row],
+            )
+
+
+def rebuild_top_k(product_ids, top_k=TOP_K):
+    """ Re-ranks the stored neighbours of the given products from the co-occurrence matrix. """
+    product_ids = list(product_ids)
+    for start in range(0, len(product_ids), 500):
+        chunk = product_ids[start:start + 500]
+        rows = (
+            ProductCooccurrence.objects
+            .filter(product_id__in=chunk)
+            .order_by('product_id', '-count', 'related_id')
+            .values_list('product_id', 'related_id', 'count')
+        )
+        ranked, neighbours = [], Counter()
+        for product_id, related_id, count in rows:
+            if neighbours[product_id] < top_k:
+                neighbours[product_id] += 1
+                ranked.append(RelatedProduct(
+                    product_id=product_id, related_id=related_id, score=count, rank=neighbours[product_id],
+                ))
+        with transaction.atomic():
+            RelatedProduct.objects.filter(product_id__in=chunk).delete()
+            RelatedProduct.objects.bulk_create(ranked)
+
+
+def update_cooccurrence(full=False, top_k=TOP_K, orders_per_batch=ORDERS_PER_BATCH, commit_margin=COMMIT_MARGIN):
+    """
+    Folds orders paid since the checkpoint into the co-occurrence matrix, then re-ranks the
+    products whose neighbours changed. Returns (orders processed, products re-ranked).
+
+    Payments newer than `commit_margin` are left for the next run: their timestamp is taken
+    when the transaction starts, so one that is still open could commit behind the watermark.
+    """
+    checkpoint, _ = RecommendationCheckpoint.objects.get_or_create(name=CHECKPOINT_NAME)
+    if full:
+        ProductCooccurrence.objects.all().delete()
+        RelatedProduct.objects.all().delete()
+        checkpoint.processed_until = None
+
+    until = timezone.now() - commit_margin
+    touched, orders = set(), 0
+    for payment_ids, watermark in _iter_payment_batches(checkpoint.processed_until, until, orders_per_batch):
+        pair_counts = Counter()
+        for basket in _baskets(payment_ids):
+            orders += 1
+            if len(basket) > 1:
+                pair_counts.update(permutations(basket, 2))
+                touched.update(basket)
+        with transaction.atomic():
+            _apply_counts(pair_counts)
+            checkpoint.processed_until = watermark
+            checkpoint.save(update_fields=['processed_until', 'updated_at'])
+
+    rebuild_top_k(touched, top_k)
+    return orders, len(touched)
@@ -0,0 +1,78 @@
+import difflib
+
+from django.db import connections
+from django.db.models import Case, F, IntegerField, Q, Value, When
+
+from .models import Product
+
+# Minimum pg_trgm similarity for a product name to count as a typo match.
+TRIGRAM_THRESHOLD = 0.3
+
+
+def _is_postgres(using='default'):
+    return connections[using].vendor == 'postgresql'
+
+
+def _search_vector():
+    from django.contrib.postgres.search import SearchVector
+    return SearchVector('product_name', weight='A') + SearchVector('description', weight='B')
+
+
+def update_search_vector(product_ids):
+    """ Refreshes the stored tsvector of the given products (no-op outside PostgreSQL). """
+    if _is_postgres():
+        Product.objects.filter(pk__in=product_ids).update(search_vector=_search_vector())
+
+
+def search_products(products, keyword):
+    """ Narrows `products` down to `keyword` matches, ordered by relevance. """
+    if _is_postgres(products.db):
+        return _postgres_search(products, keyword)
+    return _fallback_search(products, keyword)
+
+
+def _postgres_search(products, keyword):
+    from django.contrib.postgres.search import SearchQuery, SearchRank, TrigramSimilarity
+
+    # Both branches are served by GIN indexes (store_product_search_vector_gin / store_product_name_trgm).
+    query = SearchQuery(keyword, search_type='websearch')
+    return (
+        products
+        .filter(Q(search_vector=query) | Q(product_name__trigram_similar=keyword))
+        .annotate(
+            rank=SearchRank(F('search_vector'), query),
+            similarity=TrigramSimilarity('product_name', keyword),
+        )
+        .order_by('-rank', '-similarity', 'id')
+    )
+
+
+def _fallback_search(products, keyword):
+    """ Portable path used by SQLite (local development and tests). """
+    matches = products
+    for term in keyword.split():
+        matches = matches.filter(Q(product_name__icontains=term) | Q(description__icontains=term))
+    return _rank(matches, keyword)
+
+
+def typo_matches(products, keyword):
+    """
+    Products of `products` whose names are close to `keyword`, for searches that match nothing.
+    None on PostgreSQL, where search_products() already covers typos with trigram similarity.
+    """
+    if _is_postgres(products.db):
+        return None
+    # Compare against product names the way trigram similarity would.
+    names = dict(products.values_list('product_name', 'id'))
+    close = difflib.get_close_matches(keyword, names, n=20, cutoff=0.6)
+    return _rank(products.filter(id__in=[names[name] for name in close]), keyword)
+
+
+def _rank(matches, keyword):
+    return matches.annotate(
+        rank=Case(
+            When(product_name__icontains=keyword, then=Value(1)),
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+    ).order_by('-rank', 'id')
@@ -0,0 +1,94 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from category.models import Category
+from .cards import refresh_card_images, refresh_cards, refresh_category_cards
+from .facets import schedule_facet_rebuild, schedule_product_facet_rebuild
+from .listing_cache import bump_catalog_version
+from .matrix import rebuild_matrix, schedule_matrix_rebuild
+from .images import schedule_derivatives
+from .models import Product, ProductGallery, Variation, VariationCategory
+from .search import update_search_vector
+
+
+@receiver(pre_save, sender=Product)
+def remember_previous_product(sender, instance, **kwargs):
+    """
+    Keeps the category a product is moved away from so its facets get rebuilt too, and the
+    image it had so derivatives are only generated for a new upload.
+    """
+    previous = None
+    if instance.pk:
+        previous = Product.objects.filter(pk=instance.pk).values_list('category_id', 'product_image').first()
+    instance._previous_category_id, instance._previous_image_name = previous or (None, None)
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or {'product_name', 'description'} & set(update_fields):
+        update_search_vector([instance.pk])
+    refresh_cards([instance])
+    product_id, name = instance.pk, instance.product_image.name
+    # Uploads get unique names, so an unchanged name means the derivatives already exist.
+    image_saved = update_fields is None or 'product_image' in update_fields
+    if image_saved and name != getattr(instance, '_previous_image_name', None):
+        schedule_derivatives(name, on_done=lambda widths: refresh_card_images(name, widths, product_id))
+    schedule_facet_rebuild(instance.category_id, getattr(instance, '_previous_category_id', None))
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    schedule_facet_rebuild(instance.category_id)
+
+
+@receiver(post_save, sender=Category)
+def category_saved(sender, instance, created, **kwargs):
+    # Card urls embed the category slug.
+    if not created:
+        refresh_category_cards(instance)
+
+
+@receiver(post_save, sender=ProductGallery)
+def gallery_image_saved(sender, instance, **kwargs):
+    product_id, name = instance.product_id, instance.image.name
+    schedule_matrix_rebuild(product_id)
+
+    def record_widths(widths):
+        ProductGallery.objects.filter(pk=instance.pk, image=name).update(derivative_widths=list(widths))
+        # Again now that the srcset files exist.
+        rebuild_matrix(product_id)
+
+    schedule_derivatives(name, on_done=record_widths)
+
+
+@receiver(post_delete, sender=ProductGallery)
+def gallery_image_deleted(sender, instance, **kwargs):
+    schedule_matrix_rebuild(instance.product_id)
+
+
+@receiver(post_save, sender=VariationCategory)
+def variation_category_saved(sender, instance, created, **kwargs):
+    # A rename changes the labels stored in the product matrices.
+    if not created:
+        schedule_matrix_rebuild(*Variation.objects.filter(category=instance).values_list('product_id', flat=True).distinct())
+
+
+@receiver(post_save, sender=Variation)
+@receiver(post_delete, sender=Variation)
+def variation_changed(sender, instance, **kwargs):
+    # Deleting a VariationCategory cascades to its variations (and facet rows), which lands here
+    # once per variation; each category's facets and product's matrix are still rebuilt once, on commit.
+    schedule_product_facet_rebuild(instance.product_id)
+    schedule_matrix_rebuild(instance.product_id)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Variation)
+@receiver(post_delete, sender=Variation)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+def catalog_changed(sender, **kwargs):
+    # Bumped after commit so a concurrent reader can't cache pre-commit rows under the new version.
+    transaction.on_commit(bump_catalog_version)
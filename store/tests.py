@@ -1,3 +1,695 @@
-from django.test import TestCase
+import difflib
+import shutil
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from io import BytesIO
+from unittest import mock
+
+from django.contrib import admin
+from django.core.cache import cache
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import transaction
+from django.db.models import F
+from django.test import RequestFactory, TestCase, override_settings
+from django.utils import timezone
+from django.utils.text import slugify
+from PIL import Image
+
+from accounts.models import Account
+from category.models import Category
+from orders.models import Order, OrderProduct, Payment
+from . import images, listing_cache, recommendations
+from .admin import ProductAdmin
+from .cards import refresh_all_cards, refresh_cards
+from .facets import get_facets, rebuild_facets
+from .filters import filter_by_variations, legacy_filter_by_variations
+from .inventory import InsufficientStock, adjust_stock, release_stock, reserve_stock
+from .matrix import MATRIX_FORMAT, get_matrix, rebuild_matrix
+from .models import (
+    Counter, Product, ProductCard, ProductCooccurrence, ProductFacet, ProductGallery, RelatedProduct, Variation,
+    VariationCategory, VariationMatrix,
+)
+from .pagination import CursorPaginator, IdListPaginator, approximate_count
+from .recommendations import update_cooccurrence
+from .search import search_products, typo_matches
 
 # Create your tests here.
+
+def make_image(width=800, height=600, name='shirt.jpg'):
+    buffer = BytesIO()
+    Image.new('RGB', (width, height), 'red').save(buffer, 'JPEG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+def make_product(category, name, price='100.00', stock=5, **fields):
+    return Product.objects.create(
+        product_name=name, slug=slugify(name), product_price=Decimal(price), stock=stock, category=category,
+        product_image='photos/products/test.jpg', **fields
+    )
+
+
+class FacetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.shirts = Category.objects.create(category_name='Shirts', slug='shirts')
+        cls.color = VariationCategory.objects.create(name='Color')
+        cls.size = VariationCategory.objects.create(name='Size')
+        cls.red_shirt = make_product(cls.shirts, 'Red Shirt')
+        cls.blue_shirt = make_product(cls.shirts, 'Blue Shirt')
+        cls.hidden_shirt = make_product(cls.shirts, 'Hidden Shirt', is_available=False)
+        for product, color in ((cls.red_shirt, 'Red'), (cls.blue_shirt, 'Blue'), (cls.hidden_shirt, 'Red')):
+            Variation.objects.create(product=product, category=cls.color, value=color)
+            Variation.objects.create(product=product, category=cls.size, value='XL')
+
+    def test_rebuild_counts_available_products_per_value(self):
+        rebuild_facets(self.shirts.id)
+        self.assertEqual(get_facets(self.shirts), {
+            'color': [('Blue', 1), ('Red', 1)],
+            'size': [('XL', 2)],
+        })
+
+    def test_variations_saved_together_rebuild_their_category_once(self):
+        with mock.patch('store.facets.rebuild_facets') as rebuild:
+            with self.captureOnCommitCallbacks(execute=True):
+                for value in ('S', 'M', 'L'):
+                    Variation.objects.create(product=self.red_shirt, category=self.size, value=value)
+                    Variation.objects.create(product=self.blue_shirt, category=self.size, value=value)
+        rebuild.assert_called_once_with(self.shirts.id)
+
+    def test_deleting_a_variation_category_rebuilds_once(self):
+        rebuild_facets(self.shirts.id)
+        with mock.patch('store.facets.rebuild_facets', wraps=rebuild_facets) as rebuild:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.size.delete()
+        rebuild.assert_called_once_with(self.shirts.id)
+        self.assertEqual(set(ProductFacet.objects.values_list('variation_category__name', flat=True)), {'Color'})
+
+    def test_facets_are_rebuilt_again_after_a_rolled_back_batch(self):
+        with mock.patch('store.facets.rebuild_facets') as rebuild:
+            with self.captureOnCommitCallbacks(execute=True):
+                try:
+                    with transaction.atomic():
+                        Variation.objects.create(product=self.red_shirt, category=self.size, value='S')
+                        raise RuntimeError
+                except RuntimeError:
+                    pass
+                Variation.objects.create(product=self.red_shirt, category=self.size, value='M')
+        rebuild.assert_called_once_with(self.shirts.id)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        shirts = Category.objects.create(category_name='Shirts', slug='shirts')
+        cls.linen = make_product(shirts, 'Linen Shirt', description='Breathable summer shirt')
+        cls.cotton = make_product(shirts, 'Cotton Tee', description='Soft linen blend')
+        cls.boots = make_product(shirts, 'Leather Boots', description='Waterproof')
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, keyword):
+        return list(search_products(Product.objects.all(), keyword))
+
+    def test_every_term_must_match_name_or_description(self):
+        self.assertEqual(self.search('summer shirt'), [self.linen])
+        self.assertEqual(self.search('waterproof'), [self.boots])
+
+    def test_name_matches_rank_first(self):
+        self.assertEqual(self.search('linen'), [self.linen, self.cotton])
+
+    def test_typos_fall_back_to_close_product_names(self):
+        self.assertEqual(self.search('Lether Boots'), [])
+        self.assertEqual(list(typo_matches(Product.objects.all(), 'Lether Boots')), [self.boots])
+
+    def test_store_view_searches_by_keyword(self):
+        response = self.client.get('/store/', {'keyword': 'boots'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([card.product_id for card in response.context['products']], [self.boots.id])
+
+    def test_store_view_looks_up_close_names_only_when_rebuilding_an_empty_listing(self):
+        with mock.patch('store.search.difflib.get_close_matches', wraps=difflib.get_close_matches) as close:
+            self.client.get('/store/', {'keyword': 'boots'})
+            self.assertFalse(close.called)
+
+            for _ in range(2):
+                response = self.client.get('/store/', {'keyword': 'Lether Boots'})
+                self.assertEqual([card.product_id for card in response.context['products']], [self.boots.id])
+        # The second request was served from the cached ids
+        self.assertEqual(close.call_count, 1)
+
+
+class CursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        shirts = Category.objects.create(category_name='Shirts', slug='shirts')
+        # Prices repeat so the id tie-breaker is exercised
+        cls.products = [make_product(shirts, f'Shirt {i}', price=str(100 + i // 2)) for i in range(5)]
+
+    def walk(self, paginator):
+        pages, token = [], None
+        while True:
+            page = paginator.get_page(token)
+            pages.append((page.number, [product.id for product in page]))
+            if not page.has_next():
+                return pages, page
+            token = page.next_cursor
+
+    def test_pages_follow_id_order(self):
+        ids = [product.id for product in self.products]
+        pages, _ = self.walk(CursorPaginator(Product.objects.all(), 2))
+        self.assertEqual(pages, [(1, ids[:2]), (2, ids[2:4]), (3, ids[4:])])
+
+    def test_descending_order_with_ties(self):
+        expected = [p.id for p in sorted(self.products, key=lambda p: (p.product_price, p.id), reverse=True)]
+        pages, _ = self.walk(CursorPaginator(Product.objects.all(), 2, order_field='-product_price'))
+        self.assertEqual([pk for _, page_ids in pages for pk in page_ids], expected)
+
+    def test_previous_cursor_returns_the_previous_page(self):
+        paginator = CursorPaginator(Product.objects.all(), 2)
+        second = paginator.get_page(paginator.get_page().next_cursor)
+        third = paginator.get_page(second.next_cursor)
+        back = paginator.get_page(third.previous_cursor)
+        self.assertEqual((back.number, [p.id for p in back]), (2, [p.id for p in second]))
+        self.assertTrue(back.has_next())
+
+    def test_tampered_cursor_falls_back_to_the_first_page(self):
+        page = CursorPaginator(Product.objects.all(), 2).get_page('not-a-cursor')
+        self.assertEqual(page.number, 1)
+        self.assertEqual([p.id for p in page], [p.id for p in self.products[:2]])
+
+    def test_id_list_paginator_hydrates_only_the_page(self):
+        hydrated = []
+
+        def hydrate(ids):
+            hydrated.append(list(ids))
+            return ids
+
+        paginator = IdListPaginator([5, 4, 3, 2, 1], 2, hydrate)
+        first = paginator.get_page()
+        second = paginator.get_page(first.next_cursor)
+        self.assertEqual((list(first), list(second)), ([5, 4], [3, 2]))
+        self.assertEqual(hydrated, [[5, 4], [3, 2]])
+        self.assertEqual(list(paginator.get_page(second.previous_cursor)), [5, 4])
+
+    def test_store_listing_pages_with_cursors(self):
+        cache.clear()
+        first = self.client.get('/store/').context['products']
+        second = self.client.get('/store/', {'cursor': first.next_cursor}).context['products']
+        self.assertEqual(
+            [card.product_id for card in first] + [card.product_id for card in second],
+            [product.id for product in self.products],
+        )
+        self.assertFalse(second.has_next())
+
+    def test_approximate_count_is_exact_below_the_cap(self):
+        self.assertEqual(approximate_count(Product.objects.all()), (5, True))
+
+
+class ListingCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.shirts = Category.objects.create(category_name='Shirts', slug='shirts')
+        cls.products = [make_product(cls.shirts, f'Shirt {i}') for i in range(3)]
+
+    def setUp(self):
+        cache.clear()
+
+    def listing_ids(self):
+        key = listing_cache.listing_key('shirts')
+        return listing_cache.get_listing_ids(key, Product.objects.filter(is_available=True).order_by('id'))
+
+    def test_key_ignores_filter_order_and_case(self):
+        self.assertEqual(
+            listing_cache.listing_key('shirts', {'Color': ['Red', 'Blue'], 'size': ['XL']}, keyword=' Linen '),
+            listing_cache.listing_key('shirts', {'size': ['XL'], 'color': ['Blue', 'Red']}, keyword='linen'),
+        )
+        self.assertNotEqual(listing_cache.listing_key('shirts'), listing_cache.listing_key('shoes'))
+
+    def test_ids_are_cached_until_the_catalog_version_changes(self):
+        ids = [product.id for product in self.products]
+        self.assertEqual(self.listing_ids(), ids)
+        # A raw UPDATE sends no signal: the cached list is still served
+        Product.objects.filter(pk=ids[0]).update(is_available=False)
+        self.assertEqual(self.listing_ids(), ids)
+
+        listing_cache.bump_catalog_version()
+        self.assertEqual(self.listing_ids(), ids[1:])
+
+    def test_hits_and_misses_are_sampled(self):
+        with mock.patch.object(listing_cache, 'STATS_SAMPLE', 1):
+            self.listing_ids()
+            self.listing_ids()
+        self.assertEqual(listing_cache.cache_stats()['hits'], 1)
+        with mock.patch('store.listing_cache.random.randrange', side_effect=[0, 1, 1]):
+            # A hit picked for the sample is counted STATS_SAMPLE times; the others write nothing
+            self.listing_ids()
+            with self.assertNumQueries(2):
+                self.listing_ids()
+        self.assertEqual(listing_cache.cache_stats()['hits'], 1 + listing_cache.STATS_SAMPLE)
+        listing_cache.reset_cache_stats()
+        self.assertEqual(listing_cache.cache_stats()['hits'], 0)
+
+    def test_saving_a_product_bumps_the_version_after_commit(self):
+        version = listing_cache.catalog_version()
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.products[0].save(update_fields=['product_price'])
+        self.assertEqual(listing_cache.catalog_version(), version)
+        for callback in callbacks:
+            callback()
+        self.assertGreater(listing_cache.catalog_version(), version)
+
+    def test_the_version_is_shared_with_other_workers(self):
+        version = listing_cache.catalog_version()
+        # Another process bumping the shared counter row
+        Counter.objects.filter(key=listing_cache.CATALOG_VERSION_KEY).update(value=F('value') + 1)
+        self.assertEqual(listing_cache.catalog_version(), version + 1)
+
+    def test_withdrawn_products_are_dropped_from_cached_listings(self):
+        self.client.get('/store/')
+        Product.objects.filter(pk=self.products[0].pk).update(is_available=False)
+        ProductCard.objects.filter(pk=self.products[0].pk).update(is_available=False)
+        response = self.client.get('/store/')
+        self.assertNotIn(self.products[0].id, [card.product_id for card in response.context['products']])
+
+    def test_large_result_sets_are_not_cached(self):
+        with mock.patch.object(listing_cache, 'MAX_CACHED_IDS', 2):
+            self.assertIsNone(self.listing_ids())
+
+
+class ProductCardTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.shirts = Category.objects.create(category_name='Shirts', slug='shirts')
+        cls.shirt = make_product(cls.shirts, 'Linen Shirt', price='120.00', stock=0)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_saving_a_product_writes_its_card(self):
+        card = ProductCard.objects.get(product=self.shirt)
+        self.assertEqual(
+            (card.product_name, card.url, card.product_price, card.in_stock, card.category_slug),
+            ('Linen Shirt', '/store/category/shirts/linen-shirt/', Decimal('120.00'), False, 'shirts'),
+        )
+
+    def test_renaming_a_category_updates_card_urls(self):
+        self.shirts.slug = 'tops'
+        self.shirts.save()
+        self.assertEqual(ProductCard.objects.get(product=self.shirt).url, '/store/category/tops/linen-shirt/')
+
+    def test_listing_skips_products_without_a_card(self):
+        ProductCard.objects.all().delete()
+        response = self.client.get('/store/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['products']), [])
+
+    def test_refresh_all_cards_covers_bulk_created_products(self):
+        Product.objects.bulk_create([
+            Product(product_name='Bulk Tee', slug='bulk-tee', product_price=10, stock=1, category=self.shirts)
+        ])
+        refresh_all_cards()
+        self.assertEqual(ProductCard.objects.count(), 2)
+
+
+@override_settings(IMAGE_DERIVATIVE_WORKERS=0)
+class ImageDerivativeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.shirts = Category.objects.create(category_name='Shirts', slug='shirts')
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.storage = FileSystemStorage(location=media_root)
+
+    def test_derivatives_are_generated_once_and_never_upscaled(self):
+        name = self.storage.save('photos/products/shirt.jpg', make_image(width=800))
+        self.assertEqual(images.generate_derivatives(name, storage=self.storage), (4, (320, 640)))
+        self.assertTrue(self.storage.exists('photos/products/derivatives/shirt-640w.webp'))
+        self.assertFalse(self.storage.exists('photos/products/derivatives/shirt-1024w.jpg'))
+        # Up to date, 1024 included as the original is narrower: nothing is decoded or written again
+        with mock.patch('store.images.ImageOps.exif_transpose') as transpose:
+            self.assertEqual(images.generate_derivatives(name, storage=self.storage), (0, (320, 640)))
+        transpose.assert_not_called()
+
+    def test_images_narrower_than_every_width_are_left_alone(self):
+        name = self.storage.save('photos/products/badge.jpg', make_image(width=200))
+        with mock.patch('store.images.ImageOps.exif_transpose') as transpose:
+            self.assertEqual(images.generate_derivatives(name, storage=self.storage), (0, ()))
+        transpose.assert_not_called()
+
+    def test_widths_follow_the_exif_orientation(self):
+        exif = Image.Exif()
+        exif[images.ORIENTATION_TAG] = 6
+        buffer = BytesIO()
+        Image.new('RGB', (1200, 500), 'red').save(buffer, 'JPEG', exif=exif)
+        name = self.storage.save('photos/products/portrait.jpg', SimpleUploadedFile('portrait.jpg', buffer.getvalue()))
+        self.assertEqual(images.generate_derivatives(name, storage=self.storage), (2, (320,)))
+
+    def test_derivatives_are_only_scheduled_for_a_new_image(self):
+        with mock.patch('store.signals.schedule_derivatives') as schedule:
+            product = make_product(self.shirts, 'Linen Shirt')
+            self.assertEqual(schedule.call_count, 1)
+            product.product_price = 90
+            product.save()
+            self.assertEqual(schedule.call_count, 1)
+            product.product_image = 'photos/products/other.jpg'
+            product.save()
+            self.assertEqual(schedule.call_args[0][0], 'photos/products/other.jpg')
+            self.shirts.category_image = 'photos/categories/shirts.jpg'
+            self.shirts.save()
+        self.assertEqual(schedule.call_count, 2)
+
+    def test_srcset_is_built_from_the_recorded_widths(self):
+        with mock.patch.object(FileSystemStorage, 'exists') as exists:
+            value = images.srcset('photos/products/shirt.jpg', (640, 320), 'webp', storage=self.storage)
+        exists.assert_not_called()
+        self.assertEqual(value, (
+            '/media/photos/products/derivatives/shirt-320w.webp 320w, '
+            '/media/photos/products/derivatives/shirt-640w.webp 640w'
+        ))
+        self.assertEqual(images.srcset('photos/products/shirt.jpg', ()), '')
+
+    def test_card_srcsets_are_recorded_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(
+                product_name='Linen Shirt', slug='linen-shirt', product_price=100, stock=1, category=self.shirts,
+                product_image=make_image(width=700),
+            )
+        card = ProductCard.objects.get(product=product)
+        self.assertEqual(card.image_srcset.count('w, '), 1)
+        self.assertIn('-640w.webp 640w', card.image_webp_srcset)
+
+        # Saving the product again keeps the recorded srcsets and never asks the storage
+        with mock.patch.object(FileSystemStorage, 'exists') as exists:
+            refresh_cards([product])
+        exists.assert_not_called()
+        self.assertEqual(ProductCard.objects.get(product=product).image_srcset, card.image_srcset)
+
+    def test_gallery_widths_are_recorded_for_the_product_page(self):
+        product = make_product(self.shirts, 'Linen Shirt')
+        with self.captureOnCommitCallbacks(execute=True):
+            image = ProductGallery.objects.create(product=product, image=make_image(width=400))
+        image.refresh_from_db()
+        self.assertEqual(image.derivative_widths, [320])
+        product = Product.objects.select_related('variation_matrix').get(pk=product.pk)
+        self.assertIn('-320w.jpg 320w', get_matrix(product)['gallery'][0]['srcset'])
+
+    def test_a_missing_upload_is_logged_instead_of_failing_the_save(self):
+        with self.assertLogs('store.images', 'ERROR'):
+            with self.captureOnCommitCallbacks(execute=True):
+                product = make_product(self.shirts, 'Linen Shirt')
+        self.assertEqual(ProductCard.objects.get(product=product).image_srcset, '')
+
+
+class VariationFilterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        shirts = Category.objects.create(category_name='Shirts', slug='shirts')
+        color = VariationCategory.objects.create(name='Color')
+        size = VariationCategory.objects.create(name='Size')
+        cls.products = {}
+        for name, colors, sizes in (
+            ('Red XL', ['Red'], ['XL']),
+            ('Red Blue L', ['Red', 'Blue'], ['L', 'M']),
+            ('Green XL', ['Green'], ['XL']),
+        ):
+            product = cls.products[name] = make_product(shirts, name)
+            for value in colors:
+                Variation.objects.create(product=product, category=color, value=value)
+            for value in sizes:
+                Variation.objects.create(product=product, category=size, value=value)
+
+    def names(self, products):
+        return sorted(product.product_name for product in products)
+
+    def test_values_are_ored_and_facets_anded(self):
+        products = Product.objects.all()
+        self.assertEqual(self.names(filter_by_variations(products, {'color': ['Red', 'Green']})), ['Green XL', 'Red Blue L', 'Red XL'])
+        self.assertEqual(self.names(filter_by_variations(products, {'color': ['Red'], 'size': ['XL']})), ['Red XL'])
+
+    def test_matching_several_values_returns_a_product_once(self):
+        products = filter_by_variations(Product.objects.all(), {'Color': ['Red', 'Blue'], 'size': ['L', 'M']})
+        self.assertEqual(self.names(products), ['Red Blue L'])
+        self.assertEqual(products.count(), 1)
+        self.assertNotIn('DISTINCT', str(products.query))
+
+    def test_same_results_as_the_join_based_filter(self):
+        selected = {'color': ['Red', 'Blue'], 'size': ['L', 'M', 'XL']}
+        self.assertEqual(
+            self.names(filter_by_variations(Product.objects.all(), selected)),
+            self.names(legacy_filter_by_variations(Product.objects.all(), selected)),
+        )
+
+    def test_store_view_applies_the_selected_filters(self):
+        cache.clear()
+        rebuild_facets(self.products['Red XL'].category_id)
+        response = self.client.get('/store/', {'color': 'Red', 'size': 'XL'})
+        self.assertEqual([card.product_name for card in response.context['products']], ['Red XL'])
+
+
+class InventoryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        shirts = Category.objects.create(category_name='Shirts', slug='shirts')
+        cls.shirt = make_product(shirts, 'Linen Shirt', stock=3)
+        cls.tee = make_product(shirts, 'Cotton Tee', stock=5)
+
+    def stock(self):
+        return dict(Product.objects.values_list('product_name', 'stock'))
+
+    def test_lines_of_one_product_are_reserved_together(self):
+        reserve_stock([(self.shirt.id, 1), (self.tee.id, 2), (self.shirt.id, 1)])
+        self.assertEqual(self.stock(), {'Linen Shirt': 1, 'Cotton Tee': 3})
+
+    def test_a_short_line_reserves_nothing(self):
+        with self.assertRaises(InsufficientStock) as raised:
+            reserve_stock([(self.shirt.id, 2), (self.shirt.id, 2), (self.tee.id, 1)])
+        self.assertEqual(raised.exception.shortages, {self.shirt.id: (4, 3)})
+        self.assertEqual(raised.exception.describe(), 'Linen Shirt (only 3 left)')
+        self.assertEqual(self.stock(), {'Linen Shirt': 3, 'Cotton Tee': 5})
+
+    def test_release_and_adjust_are_relative(self):
+        release_stock([(self.shirt.id, 2)])
+        adjust_stock(self.tee.id, -4)
+        self.assertEqual(self.stock(), {'Linen Shirt': 5, 'Cotton Tee': 1})
+
+    def test_catalog_version_only_moves_when_a_product_sells_out_or_returns(self):
+        with mock.patch('store.inventory.bump_catalog_version') as bump:
+            with self.captureOnCommitCallbacks(execute=True):
+                reserve_stock([(self.shirt.id, 1)])
+            bump.assert_not_called()
+
+            with self.captureOnCommitCallbacks(execute=True):
+                reserve_stock([(self.shirt.id, 2)])
+            self.assertFalse(ProductCard.objects.get(product=self.shirt).in_stock)
+            self.assertEqual(bump.call_count, 1)
+
+            with self.captureOnCommitCallbacks(execute=True):
+                release_stock([(self.shirt.id, 1)])
+            self.assertTrue(ProductCard.objects.get(product=self.shirt).in_stock)
+            self.assertEqual(bump.call_count, 2)
+
+    def admin_save(self, product, **changes):
+        """ Saves `product` through the admin change form as loaded before `changes` were typed in. """
+        model_admin = ProductAdmin(Product, admin.site)
+        request = RequestFactory().post('/')
+        request.user = mock.Mock(has_perm=mock.Mock(return_value=True))
+        form_class = model_admin.get_form(request, product, change=True)
+        data = {**form_class(instance=product).initial, **changes}
+        form = form_class(data, instance=product, initial={'stock': product.stock})
+        self.assertTrue(form.is_valid(), form.errors)
+        model_admin.save_model(request, form.save(commit=False), form, change=True)
+
+    def test_admin_stock_edits_are_relative_to_concurrent_checkouts(self):
+        shirt = Product.objects.get(pk=self.shirt.pk)
+        reserve_stock([(self.shirt.id, 3)])
+        # The admin loaded 3 and typed 4 while the last three sold: one comes back in stock
+        self.admin_save(shirt, stock=4)
+        self.assertEqual(self.stock()['Linen Shirt'], 1)
+        self.assertTrue(ProductCard.objects.get(product=self.shirt).in_stock)
+
+    def test_admin_writes_only_the_changed_columns(self):
+        shirt = Product.objects.get(pk=self.shirt.pk)
+        Product.objects.filter(pk=self.shirt.pk).update(description='Edited elsewhere')
+        reserve_stock([(self.shirt.id, 3)])
+        self.admin_save(shirt, product_price='80.00')
+
+        shirt.refresh_from_db()
+        self.assertEqual((shirt.product_price, shirt.description, shirt.stock), (Decimal('80.00'), 'Edited elsewhere', 0))
+        # The card follows the sold-out row, not the 3 the form was loaded with
+        card = ProductCard.objects.get(product=self.shirt)
+        self.assertEqual((card.product_price, card.in_stock), (Decimal('80.00'), False))
+
+
+class RecommendationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = Account.objects.create_user(
+            email='shopper@example.com', username='shopper', first_name='Sam', last_name='Shopper', password='secret'
+        )
+        shirts = Category.objects.create(category_name='Shirts', slug='shirts')
+        cls.shirt, cls.tee, cls.cap = (make_product(shirts, name) for name in ('Linen Shirt', 'Cotton Tee', 'Wool Cap'))
+
+    def pay(self, paid_at=None):
+        payment = Payment.objects.create(
+            user=self.user, payment_id='COD-1', payment_method='COD', amount_paid=0, status='Pending'
+        )
+        if paid_at is not None:
+            Payment.objects.filter(pk=payment.pk).update(created_at=paid_at)
+        order = Order.objects.create(
+            user=self.user, payment=payment, order_number='1', first_name='Sam', last_name='Shopper', phone='1',
+            email=self.user.email, address_line_1='1 Main St', country='India', state='Kerala', city='Kochi',
+            order_total=0, is_ordered=True,
+        )
+        return order, payment
+
+    def add_line(self, order, payment, product):
+        OrderProduct.objects.create(
+            order=order, payment=payment, user=self.user, product=product, quantity=1,
+            product_unit_price=product.product_price, product_line_price=product.product_price, ordered=True,
+        )
+
+    def pairs(self):
+        return dict(
+            ((row.product_id, row.related_id), row.count) for row in ProductCooccurrence.objects.all()
+        )
+
+    def test_baskets_are_grouped_by_order_not_by_line_order(self):
+        first, second = self.pay(), self.pay()
+        # Interleaved lines: consecutive grouping would split both baskets
+        self.add_line(*first, self.shirt)
+        self.add_line(*second, self.shirt)
+        self.add_line(*first, self.tee)
+        self.add_line(*second, self.cap)
+
+        self.assertEqual(update_cooccurrence(commit_margin=timedelta(0)), (2, 3))
+        self.assertEqual(self.pairs(), {
+            (self.shirt.id, self.tee.id): 1, (self.tee.id, self.shirt.id): 1,
+            (self.shirt.id, self.cap.id): 1, (self.cap.id, self.shirt.id): 1,
+        })
+
+    def test_cancelled_and_failed_orders_are_left_out(self):
+        cancelled, failed, placed = self.pay(), self.pay(), self.pay()
+        Order.objects.filter(pk=cancelled[0].pk).update(status='Cancelled')
+        Payment.objects.filter(pk=failed[1].pk).update(status='Failed')
+        for order_payment in (cancelled, failed, placed):
+            self.add_line(*order_payment, self.shirt)
+            self.add_line(*order_payment, self.tee)
+
+        self.assertEqual(update_cooccurrence(commit_margin=timedelta(0)), (1, 2))
+        self.assertEqual(self.pairs()[(self.shirt.id, self.tee.id)], 1)
+
+    def test_counts_are_added_onto_rows_written_meanwhile(self):
+        self.add_line(*self.pay(), self.shirt)
+        order_payment = self.pay()
+        self.add_line(*order_payment, self.shirt)
+        self.add_line(*order_payment, self.tee)
+        # A concurrent run already stored this pair after ours read the matrix
+        ProductCooccurrence.objects.create(product=self.shirt, related=self.tee, count=4)
+
+        with mock.patch.object(recommendations, 'UPSERT_BATCH', 1):
+            update_cooccurrence(commit_margin=timedelta(0))
+        self.assertEqual(self.pairs(), {(self.shirt.id, self.tee.id): 5, (self.tee.id, self.shirt.id): 1})
+
+    def test_payments_inside_the_commit_margin_wait_for_the_next_run(self):
+        now = timezone.now()
+        settled = self.pay(paid_at=now - timedelta(hours=1))
+        in_flight = self.pay(paid_at=now - timedelta(minutes=1))
+        for order_payment in (settled, in_flight):
+            self.add_line(*order_payment, self.shirt)
+            self.add_line(*order_payment, self.tee)
+
+        self.assertEqual(update_cooccurrence()[0], 1)
+        # Committed after the first run but stamped before the oldest open transaction would be
+        late = self.pay(paid_at=now - timedelta(minutes=5))
+        self.add_line(*late, self.shirt)
+        self.add_line(*late, self.tee)
+        with mock.patch('store.recommendations.timezone.now', return_value=now + timedelta(minutes=15)):
+            self.assertEqual(update_cooccurrence()[0], 2)
+        self.assertEqual(update_cooccurrence()[0], 0)
+        self.assertEqual(self.pairs()[(self.shirt.id, self.tee.id)], 3)
+
+    def test_small_batches_do_not_split_or_repeat_orders(self):
+        paid_at = timezone.now() - timedelta(hours=1)
+        for _ in range(3):
+            order_payment = self.pay(paid_at=paid_at)
+            self.add_line(*order_payment, self.shirt)
+            self.add_line(*order_payment, self.cap)
+
+        self.assertEqual(update_cooccurrence(orders_per_batch=1), (3, 2))
+        self.assertEqual(self.pairs()[(self.cap.id, self.shirt.id)], 3)
+        self.assertEqual(
+            list(RelatedProduct.objects.filter(product=self.shirt).values_list('related_id', 'score')), [(self.cap.id, 3)]
+        )
+
+    def test_product_page_skips_related_products_without_a_card(self):
+        RelatedProduct.objects.create(product=self.shirt, related=self.tee, score=2, rank=1)
+        RelatedProduct.objects.create(product=self.shirt, related=self.cap, score=1, rank=2)
+        ProductCard.objects.filter(product=self.tee).delete()
+
+        response = self.client.get(f'/store/category/shirts/{self.shirt.slug}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([card.product_id for card in response.context['related_products']], [self.cap.id])
+
+
+class VariationMatrixTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        shirts = Category.objects.create(category_name='Shirts', slug='shirts')
+        cls.shirt = make_product(shirts, 'Linen Shirt')
+        cls.size = VariationCategory.objects.create(name='Size')
+        cls.colour = VariationCategory.objects.create(name='Colour')
+
+    def matrix(self):
+        return VariationMatrix.objects.get(product=self.shirt)
+
+    def test_saves_in_one_transaction_rebuild_once(self):
+        with mock.patch('store.matrix.rebuild_matrix', wraps=rebuild_matrix) as rebuild:
+            with self.captureOnCommitCallbacks(execute=True):
+                for value in ('S', 'M', 'L'):
+                    Variation.objects.create(product=self.shirt, category=self.size, value=value)
+                Variation.objects.create(product=self.shirt, category=self.colour, value='Blue')
+                Variation.objects.create(product=self.shirt, category=self.colour, value='Red', is_active=False)
+        rebuild.assert_called_once_with(self.shirt.id)
+        self.assertEqual(self.matrix().data['variations'], [['Size', ['S', 'M', 'L']], ['Colour', ['Blue']]])
+
+    def test_category_rename_relabels_the_matrix(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Variation.objects.create(product=self.shirt, category=self.size, value='S')
+        version = self.matrix().version
+
+        self.size.name = 'Fit'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.size.save()
+        self.assertEqual(self.matrix().data['variations'], [['Fit', ['S']]])
+        self.assertEqual(self.matrix().version, version + 1)
+
+    def test_outdated_or_missing_matrix_is_rebuilt_on_read(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Variation.objects.create(product=self.shirt, category=self.size, value='S')
+        self.assertEqual(VariationMatrix.objects.filter(product=self.shirt).update(data={}, format=MATRIX_FORMAT - 1), 1)
+        product = Product.objects.select_related('variation_matrix').get(pk=self.shirt.pk)
+        self.assertEqual(get_matrix(product)['variations'], [['Size', ['S']]])
+
+        VariationMatrix.objects.all().delete()
+        product = Product.objects.select_related('variation_matrix').get(pk=self.shirt.pk)
+        self.assertEqual(get_matrix(product)['variations'], [['Size', ['S']]])
+        self.assertEqual(self.matrix().format, MATRIX_FORMAT)
+
+    def test_product_page_renders_from_the_matrix(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Variation.objects.create(product=self.shirt, category=self.size, value='S')
+            Variation.objects.create(product=self.shirt, category=self.size, value='M')
+        with mock.patch('store.views.get_matrix', wraps=get_matrix) as read, \
+                mock.patch('store.matrix.build_matrix_data') as build:
+            response = self.client.get(f'/store/category/shirts/{self.shirt.slug}/')
+        self.assertEqual(response.status_code, 200)
+        read.assert_called_once()
+        build.assert_not_called()
+        self.assertEqual(response.context['variations_by_category'], {'Size': ['S', 'M']})
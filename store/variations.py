@@ -0,0 +1,32 @@
+import hashlib
+
+from django.db.models import Q
+
+from .models import Variation
+
+
+def variation_signature(variation_ids):
+    """ Canonical key of a variation combination: sha1 of the sorted ids, '' for none. """
+    ids = sorted({int(variation_id) for variation_id in variation_ids})
+    if not ids:
+        return ''
+    return hashlib.sha1(','.join(map(str, ids)).encode()).hexdigest()
+
+
+def resolve_posted_variations(product, data):
+    """ Resolves every `variation_<category>=<value>` field of a form with a single query. """
+    wanted = {
+        (key[len('variation_'):].lower(), value.lower())
+        for key, value in data.items()
+        if key.startswith('variation_') and value
+    }
+    if not wanted:
+        return []
+    condition = Q()
+    for category_name, value in wanted:
+        condition |= Q(category__name__iexact=category_name, value__iexact=value)
+
+    variations = {}
+    for variation in Variation.objects.filter(condition, product=product).select_related('category').order_by('id'):
+        variations.setdefault((variation.category.name.lower(), variation.value.lower()), variation)
+    return list(variations.values())
@@ -1,96 +1,126 @@
+from functools import partial
+
 from django.http import Http404, HttpResponse
 from django.shortcuts import render, get_object_or_404
 from django.db.models import Q
 from django.contrib import messages
 
-from carts.models import CartItem
-from carts.views import _cart_id
+from carts.backends import get_cart
 from category.models import Category
-from .models import Product, ProductGallery, Variation
+from .facets import get_facets, live_facets
+from .filters import filter_by_variations
+from .models import Product, ProductCard, ProductGallery, RelatedProduct, Variation
+from .listing_cache import get_listing_ids, listing_key
+from .matrix import get_matrix
+from .pagination import CursorPaginator, IdListPaginator, approximate_count
+from .search import search_products, typo_matches
 from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
-from wishlist.models import Wishlist, WishlistItem
-from wishlist.views import _wishlist_id
+from django.conf import settings
+
+PRODUCTS_PER_PAGE = 3
+
+def _hydrate(product_ids):
+    """
+    Loads the cards of the given products with one query, keeping the order of `product_ids`.
+    Cached id lists may predate a product being withdrawn, so only available cards are kept.
+    """
+    cards = ProductCard.objects.filter(is_available=True).in_bulk(product_ids)
+    return [cards[pk] for pk in product_ids if pk in cards]
 
 def store(request, category_slug=None):
     category = None
+    keyword = request.GET.get('keyword')
     
     # 1. Start with a base queryset of all available products
-    products = Product.objects.filter(is_available=True).select_related('category')
-
-    # 2. Apply search filter if a keyword is provided
-    if 'keyword' in request.GET:
-        keyword = request.GET['keyword']
-        if keyword:
-            # This line narrows down the 'products' queryset
-            products = products.filter(Q(description__icontains=keyword) | Q(product_name__icontains=keyword))
+    products = Product.objects.filter(is_available=True)
 
-    # 3. Apply category filter if a category_slug is provided
+    # 2. Apply category filter if a category_slug is provided
     if category_slug:
         category = get_object_or_404(Category, slug=category_slug)
-        # This line further narrows down the 'products' queryset
-        products = products.filter(category=category)
+        # The whole department: one indexed prefix match on the category path
+        products = products.filter(category__path__startswith=category.path)
 
-    # 4. Apply variation and price filters from GET parameters
+    # 3. Apply variation and price filters from GET parameters
     query_params = request.GET.copy()
-    available_filters = {}
-    # Build filters based on the already narrowed-down products
-    variation_values = Variation.objects.filter(product__in=products).values_list('category__name', 'value').distinct()
-    
-    for category_name, value in variation_values:
-        cat_name_lower = category_name.lower()
-        if cat_name_lower not in available_filters:
-            available_filters[cat_name_lower] = []
-        if value not in available_filters[cat_name_lower]:
-            available_filters[cat_name_lower].append(value)
-
-    for category_name, values in query_params.lists():
-        if category_name in available_filters and values:
-            products = products.filter(
-                variations__category__name__iexact=category_name, 
-                variations__value__in=values
-            )
-
-    if min_price := query_params.get('min_price'):
-        if min_price.isdigit():
-            products = products.filter(product_price__gte=min_price)
-    if max_price := query_params.get('max_price'):
-        if max_price.isdigit():
-            products = products.filter(product_price__lte=max_price)
-    
-    products = products.distinct().order_by('id')
-
-    # 5. ✅ Calculate the count AFTER all filtering is complete
-    product_count = products.count()
+    # Filters come from the precomputed facet index; search results are an ad-hoc set, so count them live.
+    if keyword:
+        available_filters = live_facets(search_products(products, keyword))
+    else:
+        available_filters = get_facets(category)
 
-    # 6. Paginate the final, filtered queryset
-    paginator = Paginator(products, 3)
-    page_number = request.GET.get('page')
-    paged_products = paginator.get_page(page_number)
+    selected_filters = {
+        category_name: values
+        for category_name, values in query_params.lists()
+        if category_name in available_filters and values
+    }
+    # ✅ One EXISTS per facet instead of a join per facet, so no DISTINCT is needed
+    products = filter_by_variations(products, selected_filters)
 
-    # 7. Prepare the rest of the context
-    wishlist_ids = []
-    if request.user.is_authenticated:
-        wishlist_ids = list(WishlistItem.objects.filter(user=request.user).values_list('product_id', flat=True))
+    min_price = query_params.get('min_price')
+    if min_price and min_price.isdigit():
+        products = products.filter(product_price__gte=min_price)
+    else:
+        min_price = None
+    max_price = query_params.get('max_price')
+    if max_price and max_price.isdigit():
+        products = products.filter(product_price__lte=max_price)
     else:
-        try:
-            wishlist = Wishlist.objects.get(wishlist_id=_wishlist_id(request))
-            wishlist_ids = list(WishlistItem.objects.filter(wishlist=wishlist).values_list('product_id', flat=True))
-        except Wishlist.DoesNotExist:
-            pass
+        max_price = None
+
+    # 4. Apply search filter if a keyword is provided
+    typo_fallback = None
+    if keyword:
+        # Ranked full-text search, see store.search; close product names are only looked up
+        # when nothing matches and the listing is not cached yet.
+        typo_fallback = partial(typo_matches, products, keyword)
+        products = search_products(products, keyword)
+    else:
+        products = products.order_by('id')
+
+    # 5. ✅ The ordered ids of the whole result set are cached per normalized query and catalog version
+    cache_key = listing_key(category_slug, selected_filters, min_price, max_price, keyword)
+    product_ids = get_listing_ids(cache_key, products, fallback=typo_fallback)
+
+    # 6. Paginate. Cursor mode never runs a full COUNT or OFFSET; with cached ids only the
+    # requested page is hydrated. Uncached relevance-ordered searches keep classic page numbers.
+    cursor_mode = settings.STORE_PAGINATION == 'cursor'
+    if product_ids is not None:
+        product_count, product_count_is_exact = len(product_ids), True
+        if cursor_mode:
+            paged_products = IdListPaginator(product_ids, PRODUCTS_PER_PAGE, _hydrate).get_page(request.GET.get('cursor'))
+        else:
+            paged_products = Paginator(product_ids, PRODUCTS_PER_PAGE).get_page(request.GET.get('page'))
+            paged_products.object_list = _hydrate(paged_products.object_list)
+    elif keyword or not cursor_mode:
+        paginator = Paginator(products.only('id'), PRODUCTS_PER_PAGE)
+        paged_products = paginator.get_page(request.GET.get('page'))
+        paged_products.object_list = _hydrate([product.id for product in paged_products])
+        product_count, product_count_is_exact = paginator.count, True
+    else:
+        paged_products = CursorPaginator(products.only('id'), PRODUCTS_PER_PAGE).get_page(request.GET.get('cursor'))
+        paged_products.object_list = _hydrate([product.id for product in paged_products])
+        product_count, product_count_is_exact = None, True
+        if settings.STORE_APPROXIMATE_COUNT:
+            product_count, product_count_is_exact = approximate_count(products)
 
+    # 7. Prepare the rest of the context (wishlist ids come from the shared `shopper` state)
     processed_filters = {}
     for category_name, available_values in available_filters.items():
         selected_values = request.GET.getlist(category_name)
-        options = [{'value': value, 'is_selected': value in selected_values} for value in available_values]
+        options = [
+            {'value': value, 'count': count, 'is_selected': value in selected_values}
+            for value, count in available_values
+        ]
         processed_filters[category_name] = options
 
-    if 'page' in query_params:
-        del query_params['page']
+    for param in ('page', 'cursor'):
+        if param in query_params:
+            del query_params[param]
 
     context = {
         'products': paged_products,
-        'product_count': product_count, # This count is now correct
-        'wishlist_products': wishlist_ids,
+        'product_count': product_count,
+        'product_count_is_exact': product_count_is_exact,
         'processed_filters': processed_filters,
         'query_params': query_params.urlencode(),
         'category': category,
@@ -99,31 +129,32 @@ def store(request, category_slug=None):
 
 def product_detail(request, category_slug, product_slug):
     try:
-        single_product = Product.objects.prefetch_related(
-            'variations__category', 
-            'gallery'
-        ).get(category__slug=category_slug, slug=product_slug, is_available=True)
-
-        in_cart = CartItem.objects.filter(cart__cart_id=_cart_id(request), product=single_product).exists()
-        
-        # Get variations grouped by category
-        variations_by_category = {}
-        for variation in single_product.variations.filter(is_active=True):
-            category = variation.category.name
-            if category not in variations_by_category:
-                variations_by_category[category] = []
-            variations_by_category[category].append(variation.value)
-
+        # ✅ Product, card and precomputed variation matrix in a single query
+        single_product = Product.objects.select_related('card', 'variation_matrix').get(
+            category__slug=category_slug, slug=product_slug, is_available=True
+        )
     except Product.DoesNotExist:
         raise Http404("Product not found")
         # return render(request, 'store/product_not_found.html')
     
-    product_gallery = single_product.gallery.all()
+    in_cart = get_cart(request).contains(single_product)
+
+    matrix = get_matrix(single_product)
+    variations_by_category = dict(matrix['variations'])
+    product_gallery = matrix['gallery']
+    # Precomputed by `manage.py build_recommendations`, one indexed query
+    related_products = [
+        related.related.card
+        for related in RelatedProduct.objects.filter(
+            product=single_product, related__is_available=True, related__card__isnull=False
+        ).select_related('related__card')
+    ]
 
     context = {
         'single_product': single_product,
         'in_cart': in_cart,
         'variations_by_category': variations_by_category,
         'product_gallery': product_gallery,
+        'related_products': related_products,
     }
     return render(request, 'store/product_detail.html', context)
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('wishlist', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='wishlist',
+            name='wishlist_id',
+            field=models.CharField(blank=True, db_index=True, max_length=250),
+        ),
+    ]
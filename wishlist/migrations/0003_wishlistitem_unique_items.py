@@ -0,0 +1,41 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def remove_duplicate_items(apps, schema_editor):
+    """ Keeps the oldest item per (user, product) and (guest wishlist, product). """
+    WishlistItem = apps.get_model('wishlist', 'WishlistItem')
+    seen, duplicates = set(), []
+    for item_id, user_id, wishlist_id, product_id in WishlistItem.objects.order_by('id').values_list(
+        'id', 'user_id', 'wishlist_id', 'product_id'
+    ).iterator():
+        key = ('user', user_id, product_id) if user_id else ('wishlist', wishlist_id, product_id)
+        if key in seen:
+            duplicates.append(item_id)
+        else:
+            seen.add(key)
+    for start in range(0, len(duplicates), 1000):
+        WishlistItem.objects.filter(id__in=duplicates[start:start + 1000]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0009_variationmatrix'),
+        ('wishlist', '0002_alter_wishlist_wishlist_id'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_items, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='wishlistitem',
+            constraint=models.UniqueConstraint(condition=models.Q(('user__isnull', False)), fields=('user', 'product'), name='unique_user_wishlist_item'),
+        ),
+        migrations.AddConstraint(
+            model_name='wishlistitem',
+            constraint=models.UniqueConstraint(condition=models.Q(('user__isnull', True)), fields=('wishlist', 'product'), name='unique_guest_wishlist_item'),
+        ),
+    ]
@@ -6,7 +6,7 @@ from store.models import Product
 # Create your models here.
 
 class Wishlist(models.Model):
-    wishlist_id = models.CharField(max_length=250, blank=True)
+    wishlist_id = models.CharField(max_length=250, blank=True, db_index=True)
     date_added = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -18,5 +18,20 @@ class WishlistItem(models.Model):
     wishlist = models.ForeignKey(Wishlist, on_delete=models.CASCADE, null=True)
     is_active = models.BooleanField(default=True)
 
+    class Meta:
+        # A product is on a wishlist at most once; lets the toggle insert with ON CONFLICT DO NOTHING
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'product'],
+                condition=models.Q(user__isnull=False),
+                name='unique_user_wishlist_item',
+            ),
+            models.UniqueConstraint(
+                fields=['wishlist', 'product'],
+                condition=models.Q(user__isnull=True),
+                name='unique_guest_wishlist_item',
+            ),
+        ]
+
     def __str__(self):
         return self.product.product_name
\ No newline at end of file
@@ -1,3 +1,71 @@
+from decimal import Decimal
+
+from django.contrib.sessions.models import Session
 from django.test import TestCase
 
+from accounts.models import Account
+from category.models import Category
+from store.models import Product
+from .models import Wishlist, WishlistItem
+
 # Create your tests here.
+
+
+class ToggleWishlistTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = Account.objects.create_user(
+            email='shopper@example.com', username='shopper', first_name='Sam', last_name='Shopper', password='secret'
+        )
+        cls.user.is_active = True
+        cls.user.save()
+        category = Category.objects.create(category_name='Shirts', slug='shirts')
+        cls.shirt = Product.objects.create(
+            product_name='Linen Shirt', slug='linen-shirt', product_price=Decimal('100.00'), stock=5,
+            category=category, product_image='photos/products/test.jpg',
+        )
+
+    def toggle(self, product_id=None):
+        return self.client.post(
+            f'/wishlist/toggle/{product_id or self.shirt.id}/', HTTP_ACCEPT='application/json'
+        )
+
+    def test_toggling_adds_then_removes(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.toggle().json(), {'status': 'success', 'in_wishlist': True, 'wishlist_count': 1})
+        self.assertEqual(self.toggle().json(), {'status': 'success', 'in_wishlist': False, 'wishlist_count': 0})
+        self.assertFalse(WishlistItem.objects.exists())
+
+    def test_a_toggle_is_at_most_two_queries(self):
+        self.client.force_login(self.user)
+        url = f'/wishlist/toggle/{self.shirt.id}/'
+        # Besides the session and user reads: DELETE then INSERT ... SELECT, or only the DELETE
+        with self.assertNumQueries(4):
+            self.client.post(url)
+        with self.assertNumQueries(3):
+            self.client.post(url)
+        self.assertFalse(WishlistItem.objects.exists())
+
+    def test_plain_form_posts_redirect_back(self):
+        response = self.client.post(f'/wishlist/toggle/{self.shirt.id}/', HTTP_REFERER='/store/')
+        self.assertRedirects(response, '/store/', fetch_redirect_response=False)
+        session_key = self.client.cookies['sessionid'].value
+        self.assertTrue(WishlistItem.objects.filter(wishlist__wishlist_id=session_key, product=self.shirt).exists())
+        self.assertEqual(self.toggle().json()['in_wishlist'], False)
+        self.assertEqual(Wishlist.objects.count(), 1)
+
+    def test_only_posts_can_toggle(self):
+        self.assertEqual(self.client.get(f'/wishlist/toggle/{self.shirt.id}/').status_code, 405)
+        self.assertFalse(WishlistItem.objects.exists())
+
+    def test_an_unknown_product_is_404_and_writes_nothing(self):
+        # Runs inside the test's transaction, like a view under ATOMIC_REQUESTS
+        self.assertEqual(self.toggle(self.shirt.id + 100).status_code, 404)
+        self.assertFalse(Session.objects.exists())
+        self.assertFalse(Wishlist.objects.exists())
+        self.assertEqual(self.toggle().status_code, 200)
+        # With a wishlist (and signed in) an unknown product is still a 404 that writes nothing
+        self.assertEqual(self.toggle(self.shirt.id + 100).status_code, 404)
+        self.client.force_login(self.user)
+        self.assertEqual(self.toggle(self.shirt.id + 100).status_code, 404)
+        self.assertEqual(WishlistItem.objects.count(), 1)
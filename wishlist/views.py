@@ -1,11 +1,16 @@
-from django.shortcuts import render, redirect, get_object_or_404
+from django.db import connection
+from django.http import Http404, JsonResponse
+from django.shortcuts import render, redirect
+from smkpro.shopper import get_shopper
 from store.models import Product
 from wishlist.models import Wishlist, WishlistItem
 from django.contrib import messages
+from django.views.decorators.http import require_POST
 
-def _wishlist_id(request):
+def _wishlist_id(request, create=False):
+    """ The guest wishlist id (session key). Only writes create a session; reads get None without one. """
     wishlist = request.session.session_key
-    if not wishlist:
+    if not wishlist and create:
         request.session.create()   # ensure a new session is created
         wishlist = request.session.session_key
     return wishlist
@@ -13,20 +18,22 @@ def _wishlist_id(request):
 # ✅ Show wishlist page
 def wishlist(request):
     if request.user.is_authenticated:
-        items = WishlistItem.objects.filter(user=request.user, is_active=True)
+        items = WishlistItem.objects.filter(user=request.user, is_active=True).select_related('product__card')
+    elif _wishlist_id(request):
+        # Plain GETs never create a session or a Wishlist row
+        items = WishlistItem.objects.filter(
+            wishlist__wishlist_id=_wishlist_id(request), user=None, is_active=True
+        ).select_related('product__card')
     else:
-        wishlist_obj, _ = Wishlist.objects.get_or_create(wishlist_id=_wishlist_id(request))
-        items = WishlistItem.objects.filter(wishlist=wishlist_obj, is_active=True)
+        items = WishlistItem.objects.none()
 
     context = {
         'wishlist_items': items,
-        'wishlist_count': items.count(),
+        'wishlist_count': len(items),
     }
     return render(request, 'store/wishlist.html', context)
 
 # ❌ Remove item from wishlist
-from django.views.decorators.http import require_POST
-
 @require_POST
 def remove_from_wishlist(request, item_id):
     try:
@@ -41,19 +48,60 @@ def remove_from_wishlist(request, item_id):
 
     return redirect(request.META.get('HTTP_REFERER', 'store'))
 
+def _add_item(product_id, user_id=None, wishlist_id=None):
+    """
+    INSERT ... SELECT from the product row with ON CONFLICT DO NOTHING: a double click can
+    neither fail nor create a duplicate, and an unknown product inserts nothing. Returns
+    whether a row was inserted.
+    """
+    quote = connection.ops.quote_name
+    meta = WishlistItem._meta
+    columns = ', '.join(quote(meta.get_field(name).column) for name in ('user', 'wishlist', 'product', 'is_active'))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {quote(meta.db_table)} ({columns}) "
+            f"SELECT %s, %s, {quote(Product._meta.pk.column)}, %s FROM {quote(Product._meta.db_table)} "
+            f"WHERE {quote(Product._meta.pk.column)} = %s ON CONFLICT DO NOTHING",
+            [user_id, wishlist_id, True, product_id],
+        )
+        return cursor.rowcount > 0
+
+
 # 🔁 Toggle wishlist (add if not in, remove if already in)
+@require_POST
 def toggle_wishlist(request, product_id):
-    print("Toggling wishlist for product ID:", product_id)
-    product = get_object_or_404(Product, id=product_id)
-    
+    """
+    One DELETE decides the direction; if it removed nothing, one INSERT ... SELECT adds the
+    item (see _add_item). Only when that inserts nothing either is the product looked up,
+    to tell an unknown product (404) from a double click.
+    Answers fetch() calls with JSON; plain form posts still redirect back.
+    """
+    owner, items = {}, WishlistItem.objects.none()
     if request.user.is_authenticated:
-        item, created = WishlistItem.objects.get_or_create(product=product, user=request.user, is_active=True)
+        owner = {'user_id': request.user.id}
+        items = WishlistItem.objects.filter(user=request.user)
     else:
-        wishlist_obj, _ = Wishlist.objects.get_or_create(wishlist_id=_wishlist_id(request))
-        item, created = WishlistItem.objects.get_or_create(product=product, wishlist=wishlist_obj, is_active=True)
+        session_key = _wishlist_id(request)
+        wishlist_obj = Wishlist.objects.filter(wishlist_id=session_key).first() if session_key else None
+        if wishlist_obj is not None:
+            owner = {'wishlist_id': wishlist_obj.id}
+            items = WishlistItem.objects.filter(wishlist=wishlist_obj, user=None)
 
-    if not created:
-        item.delete()
+    deleted, _ = items.filter(product_id=product_id).delete()
+    in_wishlist = not deleted
+    if in_wishlist:
+        if not owner:
+            # A first-time guest: no session or wishlist is created for an unknown product
+            if not Product.objects.filter(id=product_id).exists():
+                raise Http404("Product not found")
+            owner = {'wishlist_id': Wishlist.objects.create(wishlist_id=_wishlist_id(request, create=True)).id}
+        if not _add_item(product_id, **owner) and not Product.objects.filter(id=product_id).exists():
+            raise Http404("Product not found")
 
+    if 'application/json' in request.headers.get('Accept', ''):
+        return JsonResponse({
+            'status': 'success',
+            'in_wishlist': in_wishlist,
+            'wishlist_count': get_shopper(request).wishlist_count,
+        })
     return redirect(request.META.get('HTTP_REFERER', 'store'))
-